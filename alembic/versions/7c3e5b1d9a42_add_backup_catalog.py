@@ -0,0 +1,63 @@
+"""add backup catalog
+
+Revision ID: 7c3e5b1d9a42
+Revises: 01be29afe5a3_totp_reset
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e5b1d9a42'
+down_revision: Union[str, Sequence[str], None] = '01be29afe5a3_totp_reset'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'backups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('server', sa.String(length=150), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('format', sa.String(length=20), nullable=True),
+        sa.Column('codec', sa.String(length=20), nullable=True),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('stored_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('parent', sa.String(length=255), nullable=True),
+        sa.Column('checksum', sa.String(length=64), nullable=True),
+        sa.Column('file_count', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_backups_id', 'backups', ['id'])
+    op.create_index('ix_backups_name', 'backups', ['name'], unique=True)
+    op.create_index('ix_backups_server', 'backups', ['server'])
+    op.create_index('ix_backups_created_at', 'backups', ['created_at'])
+    op.create_index('ix_backups_format', 'backups', ['format'])
+    op.create_table(
+        'backup_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('backup_id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(length=1024), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('mtime', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['backup_id'], ['backups.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_backup_files_backup_id', 'backup_files', ['backup_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_backup_files_backup_id', table_name='backup_files')
+    op.drop_table('backup_files')
+    op.drop_index('ix_backups_format', table_name='backups')
+    op.drop_index('ix_backups_created_at', table_name='backups')
+    op.drop_index('ix_backups_server', table_name='backups')
+    op.drop_index('ix_backups_name', table_name='backups')
+    op.drop_index('ix_backups_id', table_name='backups')
+    op.drop_table('backups')
@@ -1,8 +1,12 @@
 from flask import Blueprint, redirect, render_template, request, jsonify, session, abort
 from core.auth import login_required, admin_required
 from core.docker_installer import is_docker_installed, install_docker_async
+from core.cgroups import get_cgroup_reader
+from core.docker_api import compute_cpu_percent, get_docker_client, memory_usage_bytes
+from core.docker_events import OWNER_LABEL
 import subprocess
 import os
+import re
 import json
 import logging
 
@@ -15,33 +19,111 @@ def dashboard():
     # simply redirect into the SPA; data will be fetched client‑side if needed
     return redirect("/?section=docker-dashboard")
 
+# Dernier échantillon CPU (total_usage, system_cpu_usage) par conteneur (stats one-shot)
+_cpu_samples = {}
+_CLI_UNITS = {"b": 1, "kb": 1000, "kib": 1024, "mb": 1000 ** 2, "mib": 1024 ** 2,
+              "gb": 1000 ** 3, "gib": 1024 ** 3, "tb": 1000 ** 4, "tib": 1024 ** 4}
+
+
+def _stats_payload(server_name, cpu, memory, memory_limit=None, memory_events=None, io=None):
+    """Schéma commun aux trois sources: CPU en % (100 = un cœur), mémoire en octets."""
+    return {
+        "cpu": cpu,
+        "memory": memory,
+        "memory_limit": memory_limit,
+        "memory_percent": round(memory / memory_limit * 100.0, 2) if memory_limit else None,
+        "memory_events": memory_events,
+        "io": io,
+        "server": server_name,
+    }
+
+
+def _api_stats(client, server_name):
+    container = f"mc-{server_name}"
+    stats = client.container_stats(container)
+    if not stats:
+        return None
+    cpu = stats.get("cpu_stats") or {}
+    cpu_percent = compute_cpu_percent(stats, _cpu_samples.get(container))
+    _cpu_samples[container] = ((cpu.get("cpu_usage") or {}).get("total_usage", 0), cpu.get("system_cpu_usage", 0))
+    io = {"read_bytes": 0, "write_bytes": 0, "read_ops": 0, "write_ops": 0}
+    blkio = stats.get("blkio_stats") or {}
+    for key, unit in (("io_service_bytes_recursive", "bytes"), ("io_serviced_recursive", "ops")):
+        for item in blkio.get(key) or []:
+            op = (item.get("op") or "").lower()
+            if op in ("read", "write"):
+                io[f"{op}_{unit}"] += item.get("value", 0)
+    return _stats_payload(server_name, cpu_percent, memory_usage_bytes(stats),
+                          (stats.get("memory_stats") or {}).get("limit"), io=io)
+
+
+def _parse_cli_bytes(value):
+    """"512MiB" / "1.5GB" (format de `docker stats`) en octets."""
+    match = re.match(r"^([\d.]+)\s*([a-zA-Z]*)$", value.strip())
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _CLI_UNITS.get(match.group(2).lower() or "b", 1))
+
+
+def _cli_stats(server_name):
+    """Repli sans socket Docker: `docker stats --no-stream`, ramené au même schéma."""
+    cmd = ["docker", "stats", f"mc-{server_name}", "--no-stream", "--format", "{{.CPUPerc}}|{{.MemUsage}}"]
+    out = subprocess.run(cmd, stdout=subprocess.PIPE, text=True).stdout.strip()
+    if not out:
+        return None
+    cpu, mem = out.split("|")
+    used, _, limit = mem.partition("/")
+    return _stats_payload(server_name, float(cpu.strip().rstrip("%") or 0), _parse_cli_bytes(used),
+                          _parse_cli_bytes(limit) if limit.strip() else None)
+
+
+def _container_owner(client, server_name):
+    """Label propriétaire du conteneur; False si le conteneur n'existe pas."""
+    if client is not None:
+        info = client.inspect_container(f"mc-{server_name}")
+        if info is None:
+            return False
+        return ((info.get("Config") or {}).get("Labels") or {}).get(OWNER_LABEL)
+    cmd = ["docker", "inspect", f"mc-{server_name}", "--format", '{{index .Config.Labels "com.mcpanel.owner"}}']
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    return res.stdout.strip() if res.returncode == 0 else False
+
+
 @app_docker.route('/api/docker/stats/<server_name>')
 @login_required
 def stats(server_name):
-    # Security Check: Ensure user owns this server (via label or config)
+    # Security Check: Ensure user owns this server (via label)
     current_user = session.get("user", {}).get("username")
     is_admin = session.get("user", {}).get("role") == "admin"
     
     try:
-        # Check ownership via docker inspect
-        cmd_inspect = ["docker", "inspect", f"mc-{server_name}", "--format", '{{index .Config.Labels "com.mcpanel.owner"}}']
-        res_inspect = subprocess.run(cmd_inspect, stdout=subprocess.PIPE, text=True)
-        owner = res_inspect.stdout.strip()
-        
+        client = get_docker_client()
+        if client is not None and not client.available():
+            client = None  # socket présent mais démon muet: repli sur la CLI
+        owner = _container_owner(client, server_name)
+        if owner is False:
+            return jsonify({"error": "No stats"}), 404
         if not is_admin and owner != current_user:
              return jsonify({"error": "Forbidden"}), 403
-             
-        cmd = ["docker", "stats", f"mc-{server_name}", "--no-stream", "--format", "{{.CPUPerc}}|{{.MemUsage}}"]
-        res = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
-        out = res.stdout.strip()
-        if not out: return jsonify({"error": "No stats"}), 404
         
-        cpu, mem = out.split("|")
-        return jsonify({
-            "cpu": cpu,
-            "memory": mem,
-            "server": server_name
-        })
+        # cgroup v2: valeurs numériques sans échantillonnage bloquant
+        cg = get_cgroup_reader().read(f"mc-{server_name}")
+        if cg:
+            return jsonify(_stats_payload(
+                server_name, cg["cpu_percent"], cg["memory_used"], cg["memory_limit"],
+                memory_events=cg["memory_events"],
+                io={
+                    "read_bytes": cg["io_read_bytes"],
+                    "write_bytes": cg["io_write_bytes"],
+                    "read_ops": cg["io_read_ops"],
+                    "write_ops": cg["io_write_ops"],
+                },
+            ))
+        
+        result = _api_stats(client, server_name) if client is not None else _cli_stats(server_name)
+        if not result:
+            return jsonify({"error": "No stats"}), 404
+        return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -12129,14 +12129,41 @@ async function batchAction(action) {
     const data = await res.json();
 
     if (data.status === "success") {
-      showToast("success", `Action effectuée sur ${servers.length} serveurs`);
-      loadServers();
+      showToast("info", `${action} lancé sur ${servers.length} serveur(s)`);
+      followBatchJob(data.job_id, servers.length);
+    } else {
+      showToast("error", data.message || "Erreur action par lot");
     }
   } catch (e) {
     showToast("error", "Erreur action par lot");
   }
 }
 
+// L'action par lot tourne en tâche de fond: suivi de sa progression (SSE) jusqu'à la fin
+function followBatchJob(jobId, total) {
+  const source = new EventSource(`/api/jobs/${jobId}/stream`);
+  source.onmessage = (event) => {
+    const job = JSON.parse(event.data);
+    if (!["completed", "failed", "cancelled"].includes(job.status)) return;
+    source.close();
+    const failed = (job.result && job.result.summary && job.result.summary.failed) || 0;
+    if (job.status === "cancelled") {
+      showToast("warning", "Action par lot annulée");
+    } else if (job.status === "failed") {
+      showToast("error", "Action par lot échouée");
+    } else if (failed > 0) {
+      showToast("error", `Action par lot: ${failed}/${total} serveur(s) en échec`);
+    } else {
+      showToast("success", `Action effectuée sur ${total} serveurs`);
+    }
+    loadServers();
+  };
+  source.onerror = () => {
+    source.close();
+    loadServers();
+  };
+}
+
 // Amélioration 51: Arrêt planifié
 async function scheduleShutdown(delay = 60) {
   if (!currentServer) return;
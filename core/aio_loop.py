@@ -0,0 +1,48 @@
+"""
+Boucle asyncio partagée, exécutée dans un thread dédié.
+
+Flask et les collecteurs tournent dans des threads synchrones: plutôt que de
+créer une boucle par appel (asyncio.run), les coroutines longues durées
+(connexions RCON persistantes, pings de flotte, fan-out) sont soumises à
+cette boucle unique via `run()`.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def _run_forever(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Boucle partagée (démarrée au premier appel)."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_run_forever, args=(_loop,), daemon=True, name="aio-loop").start()
+            logger.debug("[AIO] Boucle asyncio partagée démarrée")
+        return _loop
+
+
+def run(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Exécute *coro* sur la boucle partagée et attend son résultat.
+
+    Ne pas appeler depuis la boucle elle-même (interblocage): utiliser
+    directement `await` dans ce cas.
+    """
+    loop = get_loop()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
@@ -0,0 +1,71 @@
+"""
+Lecture et écriture des fichiers de région Anvil (.mca).
+
+Format: un en-tête de 8 Kio puis des secteurs de 4 Kio.
+    0x0000  1024 entrées de localisation: offset en secteurs (u24 BE) puis
+            nombre de secteurs (u8); 0 = chunk absent
+    0x1000  1024 horodatages de dernière modification (u32 BE, secondes)
+    0x2000  données: pour chaque chunk, longueur (u32 BE, octet de
+            compression inclus), type de compression (u8) puis les données,
+            complétées jusqu'au secteur suivant
+
+Un chunk trop grand est stocké à part (c.<x>.<z>.mcc): son type de
+compression a alors le bit 128 et le secteur ne contient que ce type.
+"""
+import struct
+from typing import List, Tuple
+
+SECTOR = 4096
+HEADER_SIZE = 2 * SECTOR
+CHUNKS_PER_REGION = 1024
+_TABLE = struct.Struct(">1024I")
+_LENGTH = struct.Struct(">I")
+
+
+def read_header(f) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """Retourne (localisations, horodatages) de la région ouverte *f*."""
+    f.seek(0)
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("En-tête de région tronqué")
+    return _TABLE.unpack_from(header, 0), _TABLE.unpack_from(header, SECTOR)
+
+
+def read_chunk(f, location: int, file_size: int) -> bytes:
+    """Lit le chunk à *location*: longueur (4 octets) + compression + données."""
+    offset, sectors = location >> 8, location & 0xFF
+    if offset < 2 or sectors == 0 or (offset + sectors) * SECTOR > file_size:
+        raise ValueError(f"Localisation de chunk invalide: {offset}/{sectors}")
+    f.seek(offset * SECTOR)
+    raw = f.read(sectors * SECTOR)
+    length = _LENGTH.unpack_from(raw, 0)[0]
+    if length == 0 or length + 4 > len(raw):
+        raise ValueError(f"Longueur de chunk invalide: {length}")
+    return raw[:length + 4]
+
+
+def write_region(path: str, chunks: List[Tuple[int, int, bytes]]):
+    """Écrit une région valide depuis [(index, horodatage, données)].
+
+    Les chunks sont rangés à la suite à partir du secteur 2 (l'agencement
+    d'origine n'est pas conservé, ce qui n'a pas d'effet pour le serveur).
+    """
+    locations = [0] * CHUNKS_PER_REGION
+    timestamps = [0] * CHUNKS_PER_REGION
+    ordered = sorted(chunks, key=lambda c: c[0])
+    sector = 2
+    for index, timestamp, data in ordered:
+        sectors = -(-len(data) // SECTOR)
+        if sectors > 0xFF:
+            raise ValueError(f"Chunk {index} trop grand pour la région ({sectors} secteurs)")
+        locations[index] = (sector << 8) | sectors
+        timestamps[index] = timestamp
+        sector += sectors
+    with open(path, "wb") as f:
+        f.write(_TABLE.pack(*locations))
+        f.write(_TABLE.pack(*timestamps))
+        for _, _, data in ordered:
+            f.write(data)
+            padding = -len(data) % SECTOR
+            if padding:
+                f.write(b"\0" * padding)
@@ -0,0 +1,266 @@
+"""
+Archives de sauvegarde compressées en parallèle (format .mcpa).
+
+Chaque fichier est découpé en blocs de 1 Mio compressés indépendamment par
+un pool de threads (zstd et zlib relâchent le GIL): l'écriture reste
+séquentielle et en flux, dans l'ordre, pendant que les blocs suivants se
+compressent. Les formats déjà compressés (régions .mca, jars, png, archives,
+NBT gzippé...) sont stockés tels quels: les recompresser coûte un cœur pour
+un gain nul.
+
+Format (gros-boutiste):
+    en-tête   b"MCPA", version u8, codec par défaut u8
+    entrée    longueur du chemin u16, chemin UTF-8, mode u32, mtime_ns u64,
+              codec u8, puis des trames [taille compressée u32, taille
+              brute u32, données] terminées par une trame de taille 0, puis
+              le CRC32 du fichier u32
+    fin       longueur de chemin 0
+"""
+import logging
+import os
+import struct
+import time
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MCPA"
+VERSION = 1
+BLOCK_SIZE = 1024 * 1024
+DEFAULT_LEVEL = int(os.getenv("MC_ARCHIVE_LEVEL", "3"))
+MAX_LEVEL = 22
+DEFAULT_WORKERS = int(os.getenv("MC_ARCHIVE_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+
+CODEC_STORE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {CODEC_STORE: "store", CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd"}
+
+# Déjà compressés: stockés sans recompression
+STORED_EXTENSIONS = (".mca", ".mcc", ".jar", ".zip", ".gz", ".tgz", ".xz", ".zst", ".7z", ".mcpa",
+                     ".png", ".jpg", ".jpeg", ".webp", ".ogg", ".mp3")
+# En-têtes gzip / zip / png / zstd (level.dat et playerdata sont en NBT gzippé)
+_COMPRESSED_MAGICS = (b"\x1f\x8b", b"PK\x03\x04", b"\x89PNG", b"\x28\xb5\x2f\xfd")
+
+_HEADER = struct.Struct(">4sBB")
+_ENTRY = struct.Struct(">IQB")
+_FRAME = struct.Struct(">II")
+_PATH_LEN = struct.Struct(">H")
+_CRC = struct.Struct(">I")
+
+
+def is_precompressed(rel_path: str, head: bytes = b"") -> bool:
+    """Vrai si le fichier est déjà compressé (extension ou signature)."""
+    return rel_path.lower().endswith(STORED_EXTENSIONS) or head.startswith(_COMPRESSED_MAGICS)
+
+
+def parse_level(level) -> Optional[int]:
+    """Niveau de compression demandé (1 à 22, None: défaut); ValueError s'il est invalide."""
+    if level is None or level == "":
+        return None
+    try:
+        value = int(level)
+    except (TypeError, ValueError):
+        raise ValueError(f"Niveau de compression invalide: {level}")
+    if isinstance(level, bool) or not 1 <= value <= MAX_LEVEL:
+        raise ValueError(f"Niveau de compression invalide: {level} (1 à {MAX_LEVEL})")
+    return value
+
+
+def zip_compress_type(abs_path: str, rel_path: Optional[str] = None) -> int:
+    """Méthode zipfile pour ce fichier: ZIP_STORED s'il est déjà compressé."""
+    try:
+        with open(abs_path, "rb") as f:
+            head = f.read(4)
+    except OSError:
+        head = b""
+    return zipfile.ZIP_STORED if is_precompressed(rel_path or abs_path, head) else zipfile.ZIP_DEFLATED
+
+
+def write_zip(files: Iterable[Tuple[str, str]], dest: str) -> dict:
+    """ZIP classique, sans redéfler les fichiers déjà compressés."""
+    started = time.monotonic()
+    count, bytes_in = 0, 0
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zf:
+        for abs_path, rel_path in files:
+            zf.write(abs_path, arcname=rel_path, compress_type=zip_compress_type(abs_path, rel_path))
+            count += 1
+            bytes_in += os.path.getsize(abs_path)
+    return _report(dest, "deflate", count, bytes_in, os.path.getsize(dest), time.monotonic() - started)
+
+
+def _report(dest, codec, files, bytes_in, bytes_out, elapsed) -> dict:
+    stats = {
+        "files": files,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "ratio": round(bytes_in / bytes_out, 2) if bytes_out else None,
+        "elapsed": round(elapsed, 2),
+        "mb_per_s": round(bytes_in / 1024 / 1024 / elapsed, 1) if elapsed > 0 else None,
+        "codec": codec,
+    }
+    logger.info(f"[ARCHIVE] {os.path.basename(dest)}: {files} fichiers, "
+                f"{bytes_in / 1024 / 1024:.1f} -> {bytes_out / 1024 / 1024:.1f} Mo "
+                f"en {stats['elapsed']}s ({stats['mb_per_s']} Mo/s, {codec})")
+    return stats
+
+
+class Archiver:
+    def __init__(self, level: int = DEFAULT_LEVEL, workers: int = DEFAULT_WORKERS,
+                 block_size: int = BLOCK_SIZE):
+        self.level = level
+        self.workers = max(1, workers)
+        self.block_size = block_size
+        self.codec = CODEC_ZSTD if HAS_ZSTD else CODEC_ZLIB
+
+    def _compress(self, codec: int, data: bytes) -> bytes:
+        if codec == CODEC_ZSTD:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        if codec == CODEC_ZLIB:
+            return zlib.compress(data, max(1, min(9, self.level)))
+        return data
+
+    @staticmethod
+    def _decompress(codec: int, data: bytes, size: int) -> bytes:
+        if codec == CODEC_ZSTD:
+            if not HAS_ZSTD:
+                raise Exception("Archive compressée en zstd: module zstandard requis")
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_STORE:
+            return data
+        raise Exception(f"Codec d'archive inconnu: {codec}")
+
+    def write(self, files: Iterable[Tuple[str, str]], dest: str) -> dict:
+        """Écrit l'archive *dest* depuis [(chemin absolu, chemin relatif)]; retourne le débit."""
+        started = time.monotonic()
+        count, stored, bytes_in = 0, 0, 0
+        window = self.workers * 4
+        tmp = f"{dest}.tmp"
+        try:
+            with open(tmp, "wb") as out, \
+                    ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="archiver") as pool:
+                out.write(_HEADER.pack(MAGIC, VERSION, self.codec))
+                for abs_path, rel_path in files:
+                    try:
+                        src = open(abs_path, "rb")
+                    except FileNotFoundError:
+                        continue  # Supprimé pendant le parcours
+                    with src:
+                        st = os.fstat(src.fileno())
+                        block = src.read(self.block_size)
+                        codec = CODEC_STORE if is_precompressed(rel_path, block[:4]) else self.codec
+                        stored += codec == CODEC_STORE
+                        path_bytes = rel_path.replace(os.sep, "/").encode("utf-8")
+                        out.write(_PATH_LEN.pack(len(path_bytes)) + path_bytes)
+                        out.write(_ENTRY.pack(st.st_mode & 0o7777, st.st_mtime_ns, codec))
+
+                        # Compression en avance sur l'écriture, dans l'ordre des blocs
+                        pending = deque()
+                        crc = 0
+                        while block:
+                            crc = zlib.crc32(block, crc)
+                            bytes_in += len(block)
+                            pending.append((len(block), pool.submit(self._compress, codec, block)))
+                            if len(pending) >= window:
+                                self._write_frame(out, *pending.popleft())
+                            block = src.read(self.block_size)
+                        while pending:
+                            self._write_frame(out, *pending.popleft())
+                        out.write(_FRAME.pack(0, 0) + _CRC.pack(crc))
+                    count += 1
+                out.write(_PATH_LEN.pack(0))
+            os.replace(tmp, dest)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        stats = _report(dest, CODEC_NAMES[self.codec], count, bytes_in, os.path.getsize(dest),
+                        time.monotonic() - started)
+        stats["stored_files"] = stored
+        return stats
+
+    @staticmethod
+    def _write_frame(out, size: int, future):
+        data = future.result()
+        out.write(_FRAME.pack(len(data), size))
+        out.write(data)
+
+    def extract(self, src: str, dest: str) -> dict:
+        """Extrait l'archive *src* dans *dest* en vérifiant les CRC."""
+        started = time.monotonic()
+        count, bytes_out = 0, 0
+        root = os.path.abspath(dest)
+        with open(src, "rb") as f:
+            magic, version, _ = _HEADER.unpack(_read(f, _HEADER.size))
+            if magic != MAGIC or version > VERSION:
+                raise Exception("Archive .mcpa invalide ou version non supportée")
+            while True:
+                (length,) = _PATH_LEN.unpack(_read(f, _PATH_LEN.size))
+                if length == 0:
+                    break
+                rel_path = _read(f, length).decode("utf-8")
+                mode, mtime_ns, codec = _ENTRY.unpack(_read(f, _ENTRY.size))
+                target = os.path.abspath(os.path.join(root, rel_path))
+                if os.path.commonpath([target, root]) != root:
+                    raise Exception(f"Chemin invalide dans l'archive: {rel_path}")
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                crc = 0
+                with open(target, "wb") as out:
+                    while True:
+                        packed, size = _FRAME.unpack(_read(f, _FRAME.size))
+                        if packed == 0 and size == 0:
+                            break
+                        data = self._decompress(codec, _read(f, packed), size)
+                        crc = zlib.crc32(data, crc)
+                        out.write(data)
+                        bytes_out += len(data)
+                if _CRC.unpack(_read(f, _CRC.size))[0] != crc:
+                    raise Exception(f"CRC invalide pour {rel_path}")
+                os.chmod(target, mode or 0o644)
+                os.utime(target, ns=(mtime_ns, mtime_ns))
+                count += 1
+        return _report(src, "extract", count, bytes_out, os.path.getsize(src), time.monotonic() - started)
+
+    @staticmethod
+    def entries(src: str) -> List[Tuple[str, int, int]]:
+        """Contenu de l'archive [(chemin, taille, mtime_ns)] sans décompresser."""
+        result = []
+        with open(src, "rb") as f:
+            magic, version, _ = _HEADER.unpack(_read(f, _HEADER.size))
+            if magic != MAGIC or version > VERSION:
+                raise Exception("Archive .mcpa invalide ou version non supportée")
+            while True:
+                (length,) = _PATH_LEN.unpack(_read(f, _PATH_LEN.size))
+                if length == 0:
+                    break
+                rel_path = _read(f, length).decode("utf-8")
+                _, mtime_ns, _ = _ENTRY.unpack(_read(f, _ENTRY.size))
+                size = 0
+                while True:
+                    packed, raw = _FRAME.unpack(_read(f, _FRAME.size))
+                    if packed == 0 and raw == 0:
+                        break
+                    f.seek(packed, os.SEEK_CUR)
+                    size += raw
+                f.seek(_CRC.size, os.SEEK_CUR)
+                result.append((rel_path, size, mtime_ns))
+        return result
+
+
+def _read(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise Exception("Archive .mcpa tronquée")
+    return data
@@ -0,0 +1,352 @@
+"""
+Catalogue indexé des sauvegardes (tables `backups` / `backup_files`).
+
+Chaque sauvegarde y est enregistrée au moment où elle est écrite: serveur,
+date, format et codec, taille restaurée et octets ajoutés sur disque,
+snapshot parent, SHA-256 de l'archive (ou du manifeste) et liste des
+fichiers. Lister, filtrer, totaliser ou afficher le contenu d'une sauvegarde
+ne touche donc plus au disque.
+
+Les sauvegardes antérieures au catalogue (ou écrites hors du panel) sont
+indexées une fois par `sync()`, dans un thread lancé au démarrage (jamais
+dans une requête: il faut hacher chaque archive); les entrées dont le
+fichier a disparu sont retirées.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from core.archiver import Archiver
+from core.backup_store import HAS_ZSTD, STORE_DIR, iter_backup_files
+from core.db import BackupFile, BackupRecord, get_session
+
+logger = logging.getLogger(__name__)
+
+# Délai avant de relancer une indexation qui a échoué (secondes)
+SYNC_RETRY_AFTER = 60
+
+_BACKUP_NAME = re.compile(r"^(?P<server>.+)_(?P<ts>\d{8}_\d{6})(?P<ext>\.zip|\.mcpa)?$")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestRecorder:
+    """Enveloppe un itérateur (chemin absolu, chemin relatif) et note chaque fichier."""
+
+    def __init__(self, files: Iterable[Tuple[str, str]]):
+        self._files = files
+        self.entries: List[Tuple[str, int, int]] = []
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for abs_path, rel_path in self._files:
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                continue
+            self.entries.append((rel_path, st.st_size, st.st_mtime_ns))
+            yield abs_path, rel_path
+
+
+def _mtime(mtime_ns: Optional[int]) -> Optional[datetime]:
+    return datetime.fromtimestamp(mtime_ns / 1e9) if mtime_ns else None
+
+
+class BackupCatalog:
+    def __init__(self, srv_mgr):
+        self.srv_mgr = srv_mgr
+        self.backup_dir = os.path.join(srv_mgr.base_dir, "_backups")
+        self._synced = False
+        self._sync_lock = threading.Lock()
+        self._sync_thread: Optional[threading.Thread] = None
+        self._sync_failed_at: Optional[float] = None
+        self._resync = False
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def record(self, server: str, name: str, format: str, entries: Iterable[Tuple[str, int, int]],
+               codec: Optional[str] = None, stored_bytes: int = 0, parent: Optional[str] = None,
+               checksum: Optional[str] = None, created_at: Optional[datetime] = None):
+        """Enregistre (ou remplace) une sauvegarde et son manifeste [(chemin, taille, mtime_ns)]."""
+        entries = list(entries)
+        session = get_session()
+        try:
+            existing = session.query(BackupRecord).filter_by(name=name).first()
+            if existing:
+                session.query(BackupFile).filter_by(backup_id=existing.id).delete()
+                session.delete(existing)
+                session.flush()
+            record = BackupRecord(
+                name=name,
+                server=server,
+                created_at=created_at or datetime.now(),
+                format=format,
+                codec=codec,
+                size_bytes=sum(size for _, size, _ in entries),
+                stored_bytes=stored_bytes,
+                parent=parent,
+                checksum=checksum,
+                file_count=len(entries),
+            )
+            session.add(record)
+            session.flush()
+            if entries:
+                session.execute(BackupFile.__table__.insert(), [
+                    {"backup_id": record.id, "path": path.replace(os.sep, "/"), "size": size,
+                     "mtime": _mtime(mtime_ns)}
+                    for path, size, mtime_ns in entries
+                ])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def remove(self, name: str) -> bool:
+        session = get_session()
+        try:
+            record = session.query(BackupRecord).filter_by(name=name).first()
+            if not record:
+                return False
+            # SQLite n'applique pas ON DELETE CASCADE sans PRAGMA foreign_keys
+            session.query(BackupFile).filter_by(backup_id=record.id).delete()
+            session.delete(record)
+            session.commit()
+            return True
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _to_dict(record: BackupRecord) -> dict:
+        return {
+            "name": record.name,
+            "server": record.server,
+            "date": record.created_at.isoformat() if record.created_at else None,
+            "size_mb": round((record.size_bytes or 0) / 1024 / 1024, 1),
+            "stored_mb": round((record.stored_bytes or 0) / 1024 / 1024, 1),
+            "format": record.format,
+            "codec": record.codec,
+            "parent": record.parent,
+            "checksum": record.checksum,
+            "files": record.file_count,
+        }
+
+    def list(self, server: Optional[str] = None, format: Optional[str] = None,
+             since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[dict]:
+        self.ensure_synced()
+        session = get_session()
+        try:
+            query = session.query(BackupRecord)
+            if server:
+                query = query.filter(BackupRecord.server == server)
+            if format:
+                query = query.filter(BackupRecord.format == format)
+            if since:
+                query = query.filter(BackupRecord.created_at >= since)
+            if until:
+                query = query.filter(BackupRecord.created_at <= until)
+            return [self._to_dict(r) for r in query.order_by(BackupRecord.created_at.desc()).all()]
+        finally:
+            session.close()
+
+    def get(self, name: str) -> Optional[dict]:
+        self.ensure_synced()
+        session = get_session()
+        try:
+            record = session.query(BackupRecord).filter_by(name=name).first()
+            return self._to_dict(record) if record else None
+        finally:
+            session.close()
+
+    def manifest(self, name: str, prefix: Optional[str] = None, limit: int = 10000) -> Optional[List[dict]]:
+        """Fichiers contenus dans la sauvegarde *name* (None si inconnue)."""
+        self.ensure_synced()
+        session = get_session()
+        try:
+            record = session.query(BackupRecord).filter_by(name=name).first()
+            if not record:
+                return None
+            query = session.query(BackupFile).filter(BackupFile.backup_id == record.id)
+            if prefix:
+                query = query.filter(BackupFile.path.startswith(prefix.replace(os.sep, "/"), autoescape=True))
+            return [{"path": f.path, "size": f.size, "mtime": f.mtime.isoformat() if f.mtime else None}
+                    for f in query.order_by(BackupFile.path).limit(limit).all()]
+        finally:
+            session.close()
+
+    def totals(self, server: Optional[str] = None) -> dict:
+        """Totaux de stockage: archives exactes, dépôt dédupliqué mesuré par son index."""
+        self.ensure_synced()
+        session = get_session()
+        try:
+            query = session.query(BackupRecord.format, func.count(BackupRecord.id),
+                                  func.coalesce(func.sum(BackupRecord.size_bytes), 0),
+                                  func.coalesce(func.sum(BackupRecord.stored_bytes), 0))
+            if server:
+                query = query.filter(BackupRecord.server == server)
+            by_format = {fmt: {"count": count, "logical_bytes": int(logical), "stored_bytes": int(stored)}
+                         for fmt, count, logical, stored in query.group_by(BackupRecord.format).all()}
+        finally:
+            session.close()
+        totals = {
+            "count": sum(f["count"] for f in by_format.values()),
+            "logical_bytes": sum(f["logical_bytes"] for f in by_format.values()),
+            "stored_bytes": sum(f["stored_bytes"] for f in by_format.values()),
+            "by_format": by_format,
+        }
+        if not server:
+            # Les blocs partagés rendent la somme par snapshot approximative: taille réelle du dépôt
+            store = self.srv_mgr.backup_store.stats()
+            dedup = sum(f["stored_bytes"] for k, f in by_format.items() if k in ("dedup", "chunked"))
+            totals["stored_bytes"] += store["stored_bytes"] - dedup
+            totals["store_bytes"] = store["stored_bytes"]
+        return totals
+
+    # ------------------------------------------------------------------
+    # Indexation des sauvegardes existantes
+    # ------------------------------------------------------------------
+    def ensure_synced(self):
+        """Lance l'indexation en arrière-plan si elle n'a pas encore abouti; ne bloque pas.
+
+        Tant qu'elle tourne, les lectures ne voient que les sauvegardes déjà
+        indexées. Après un échec, elle est relancée au plus tôt
+        SYNC_RETRY_AFTER secondes plus tard.
+        """
+        if self._synced:
+            return
+        with self._sync_lock:
+            if self._synced or (self._sync_thread and self._sync_thread.is_alive()):
+                return
+            if self._sync_failed_at and time.monotonic() - self._sync_failed_at < SYNC_RETRY_AFTER:
+                return
+            self._sync_thread = threading.Thread(target=self._background_sync, name="backup-catalog-sync",
+                                                 daemon=True)
+            self._sync_thread.start()
+
+    def request_sync(self):
+        """Relance l'indexation, même déjà faite (enregistrement direct d'une sauvegarde raté).
+
+        Une indexation en cours a pu lister le dossier avant l'écriture de la
+        sauvegarde: elle est alors rejouée une fois terminée.
+        """
+        with self._sync_lock:
+            self._synced = False
+            self._sync_failed_at = None
+            self._resync = True
+        self.ensure_synced()
+
+    def _background_sync(self):
+        while True:
+            with self._sync_lock:
+                self._resync = False
+            try:
+                self.sync()
+            except Exception as e:
+                self._sync_failed_at = time.monotonic()
+                logger.warning(f"[BACKUP] Indexation du catalogue impossible: {e}")
+                return
+            with self._sync_lock:
+                if not self._resync:
+                    self._synced = True
+                    return
+
+    def sync(self) -> dict:
+        """Indexe les sauvegardes présentes sur disque et oublie celles disparues."""
+        if not os.path.isdir(self.backup_dir):
+            return {"added": 0, "removed": 0}
+        store = self.srv_mgr.backup_store
+        # Une sauvegarde enregistrée pendant le parcours est absente de la liste
+        # du disque: seuls les enregistrements antérieurs au parcours sont retirables
+        scan_started = datetime.now()
+        on_disk = {}
+        for item in os.listdir(self.backup_dir):
+            if item == STORE_DIR or item.startswith(".") or item.endswith(".tmp"):
+                continue
+            match = _BACKUP_NAME.match(item)
+            if match:
+                on_disk[item] = match
+        snapshots = {s["id"]: s for s in store.list_snapshots()}
+
+        session = get_session()
+        try:
+            known = dict(session.query(BackupRecord.name, BackupRecord.created_at).all())
+        finally:
+            session.close()
+
+        removed = 0
+        for name in set(known) - set(on_disk) - set(snapshots):
+            created_at = known[name]
+            if created_at is not None and created_at < scan_started:
+                removed += self.remove(name)
+        added = 0
+        for name, snap in snapshots.items():
+            if name not in known:
+                self.record_snapshot(snap["server"], name)
+                added += 1
+        for name, match in on_disk.items():
+            if name in known or name in snapshots:
+                continue
+            try:
+                self._index_file(name, match)
+                added += 1
+            except Exception as e:
+                logger.warning(f"[BACKUP] {name} non indexé: {e}")
+        if added or removed:
+            logger.info(f"[BACKUP] Catalogue synchronisé: {added} ajoutées, {removed} retirées")
+        return {"added": added, "removed": removed}
+
+    def _index_file(self, name: str, match):
+        path = os.path.join(self.backup_dir, name)
+        created_at = datetime.strptime(match.group("ts"), "%Y%m%d_%H%M%S")
+        ext = match.group("ext")
+        if ext == ".mcpa":
+            entries, fmt, codec = Archiver.entries(path), "mcpa", None
+        elif ext == ".zip":
+            with zipfile.ZipFile(path) as zf:
+                entries = [(i.filename, i.file_size, int(datetime(*i.date_time).timestamp() * 1e9))
+                           for i in zf.infolist() if not i.is_dir()]
+            fmt, codec = "zip", "deflate"
+        elif os.path.isdir(path):
+            entries = [(rel, os.path.getsize(abs_path), os.stat(abs_path).st_mtime_ns)
+                       for abs_path, rel in iter_backup_files(path)]
+            fmt, codec = "dir", None
+        else:
+            return
+        is_file = os.path.isfile(path)
+        self.record(match.group("server"), name, fmt, entries, codec=codec,
+                    stored_bytes=os.path.getsize(path) if is_file else sum(e[1] for e in entries),
+                    checksum=file_sha256(path) if is_file else None, created_at=created_at)
+
+    def record_snapshot(self, server: str, snapshot_id: str, new_bytes: Optional[int] = None):
+        """Enregistre un snapshot du dépôt dédupliqué depuis son manifeste."""
+        store = self.srv_mgr.backup_store
+        manifest = store.load_manifest(snapshot_id)
+        if new_bytes is None:
+            info = next((s for s in store.list_snapshots(server) if s["id"] == snapshot_id), {})
+            new_bytes = info.get("new_bytes", 0)
+        entries = [(path, e["size"], e["mtime_ns"]) for path, e in manifest["files"].items()]
+        self.record(server, snapshot_id, "chunked" if manifest.get("split_regions") else "dedup", entries,
+                    codec="zstd" if HAS_ZSTD else "zlib", stored_bytes=new_bytes, parent=manifest.get("parent"),
+                    checksum=file_sha256(store.manifest_path(snapshot_id)),
+                    created_at=datetime.fromtimestamp(manifest["created"]))
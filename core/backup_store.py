@@ -0,0 +1,553 @@
+"""
+Dépôt de sauvegardes dédupliqué (stockage adressé par contenu).
+
+Les fichiers d'un serveur sont découpés en blocs de taille fixe, identifiés
+par leur SHA-256 et stockés une seule fois dans servers/_backups/store,
+quel que soit le nombre de snapshots ou de serveurs qui les référencent (les
+jars et librairies d'une même version sont ainsi partagés par tout le parc).
+Un snapshot n'est qu'un petit manifeste JSON: pour chaque fichier, sa taille,
+sa date de modification, ses droits et la liste de ses blocs.
+
+Sauvegarde incrémentale: un fichier dont la taille et la date de
+modification n'ont pas changé depuis le snapshot parent (le dernier du
+serveur) reprend ses blocs sans être relu; seuls les fichiers modifiés sont
+hachés, et seuls les blocs inconnus du dépôt sont compressés et écrits.
+
+Mode « chunked »: les fichiers de région Anvil (.mca) sont découpés par
+chunk plutôt qu'en blocs fixes. L'en-tête de chaque région (localisation et
+horodatage des 1024 chunks) est comparé à celui du snapshot parent: seuls les
+chunks dont l'horodatage ou les secteurs ont changé sont relus et stockés, les
+autres reprennent le bloc du parent. Chaque manifeste référençant tous ses
+chunks, la restauration reconstruit des régions valides sans rejouer la
+chaîne des parents.
+
+Rétention par comptage de références: l'index SQLite compte, pour chaque
+bloc, les manifestes qui le citent. Supprimer un snapshot décrémente ces
+compteurs; `gc()` efface les blocs qui ne sont plus référencés.
+
+Arborescence:
+    store/index.db             - index SQLite (blocs, snapshots)
+    store/snapshots/<id>.json  - manifestes
+    store/objects/ab/<sha256>  - blocs: 1 octet de codec puis les données
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+from core.anvil import read_chunk, read_header, write_region
+from core.clone import SKIP_DIRS, SKIP_NAMES
+from core.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "store"
+CHUNK_SIZE = 4 * 1024 * 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+BACKUP_FORMATS = ("zip", "mcpa", "dedup", "chunked")
+REGION_EXTENSIONS = (".mca",)
+
+# Codecs des blocs (premier octet de l'objet)
+CODEC_RAW = b"r"
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+
+
+def iter_backup_files(path: str) -> Iterator[Tuple[str, str]]:
+    """Fichiers d'un serveur à sauvegarder: (chemin absolu, chemin relatif).
+
+    Exclut les sous-dossiers de logs, les archives .zip à la racine et les
+    logs archivés.
+    """
+    for root, dirs, files in os.walk(path):
+        rel_root = os.path.relpath(root, path)
+        if "logs" in rel_root.split(os.sep) and rel_root != "logs":
+            continue
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".zip") and root == path:
+                continue
+            if file.endswith(".log.gz"):
+                continue
+            abs_path = os.path.join(root, file)
+            yield abs_path, os.path.relpath(abs_path, start=path)
+
+
+def iter_prunable_files(path: str) -> Iterator[Tuple[str, str]]:
+    """Fichiers qu'une restauration peut supprimer s'ils sont absents de la sauvegarde.
+
+    Ceux de `iter_backup_files`, moins ce que la copie figée d'un serveur en
+    marche ne contient jamais (logs, crash-reports, debug, session.lock...):
+    leur absence de la sauvegarde ne signifie pas qu'ils sont apparus après.
+    """
+    for abs_path, rel_path in iter_backup_files(path):
+        parts = rel_path.split(os.sep)
+        if parts[-1] in SKIP_NAMES or any(p in SKIP_DIRS for p in parts[:-1]):
+            continue
+        yield abs_path, rel_path
+
+
+class BackupStore:
+    def __init__(self, backup_dir: str, chunk_size: int = CHUNK_SIZE, max_workers: int = 4):
+        self.root = os.path.join(backup_dir, STORE_DIR)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # Blocs cités par un snapshot en cours: jamais collectés par gc()
+        self._pending: Counter = Counter()
+        self._db = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored INTEGER NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id TEXT PRIMARY KEY,
+                server TEXT NOT NULL,
+                created REAL NOT NULL,
+                parent TEXT,
+                files INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                new_bytes INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_server ON snapshots (server, created);
+        """)
+        self._db.commit()
+
+    # ------------------------------------------------------------------
+    # Blocs
+    # ------------------------------------------------------------------
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    @staticmethod
+    def _encode(data: bytes) -> bytes:
+        if HAS_ZSTD:
+            packed, codec = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), CODEC_ZSTD
+        else:
+            packed, codec = zlib.compress(data, ZLIB_LEVEL), CODEC_ZLIB
+        # Données déjà compressées (jars, png...): stockées telles quelles
+        if len(packed) >= len(data):
+            return CODEC_RAW + data
+        return codec + packed
+
+    @staticmethod
+    def _decode(raw: bytes) -> bytes:
+        codec, data = raw[:1], raw[1:]
+        if codec == CODEC_RAW:
+            return data
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_ZSTD:
+            if not HAS_ZSTD:
+                raise Exception("Bloc compressé en zstd: module zstandard requis")
+            return zstandard.ZstdDecompressor().decompress(data)
+        raise Exception(f"Codec de bloc inconnu: {codec!r}")
+
+    def _has_blob(self, digest: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        return row is not None
+
+    def put_blob(self, data: bytes) -> Tuple[str, int]:
+        """Stocke *data* s'il est inconnu; retourne (hash, octets écrits).
+
+        Le bloc est marqué « en cours » jusqu'à `_release_pending()`.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._pending[digest] += 1
+        if self._has_blob(digest):
+            return digest, 0
+        encoded = self._encode(data)
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp, path)
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO blobs (hash, size, stored, refs) VALUES (?, ?, ?, 0)",
+                             (digest, len(data), len(encoded)))
+            self._db.commit()
+        return digest, len(encoded)
+
+    def get_blob(self, digest: str) -> bytes:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                data = self._decode(f.read())
+        except FileNotFoundError:
+            raise Exception(f"Bloc manquant dans le dépôt: {digest}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise Exception(f"Bloc corrompu: {digest}")
+        return data
+
+    def _release_pending(self, digests):
+        with self._lock:
+            for digest in digests:
+                self._pending[digest] -= 1
+                if self._pending[digest] <= 0:
+                    del self._pending[digest]
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+    def manifest_path(self, snapshot_id: str) -> str:
+        if not snapshot_id or "/" in snapshot_id or "\\" in snapshot_id or snapshot_id.startswith("."):
+            raise Exception(f"Identifiant de snapshot invalide: {snapshot_id}")
+        return os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+
+    def load_manifest(self, snapshot_id: str) -> dict:
+        path = self.manifest_path(snapshot_id)
+        if not os.path.exists(path):
+            raise Exception(f"Snapshot introuvable: {snapshot_id}")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def has_snapshot(self, snapshot_id: str) -> bool:
+        return os.path.exists(self.manifest_path(snapshot_id))
+
+    def latest(self, server: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT id FROM snapshots WHERE server = ? ORDER BY created DESC LIMIT 1",
+                                   (server,)).fetchone()
+        return row[0] if row else None
+
+    def list_snapshots(self, server: Optional[str] = None) -> List[dict]:
+        query = "SELECT id, server, created, parent, files, size, new_bytes FROM snapshots"
+        params = ()
+        if server:
+            query += " WHERE server = ?"
+            params = (server,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created DESC", params).fetchall()
+        return [{"id": r[0], "server": r[1], "created": r[2], "parent": r[3],
+                 "files": r[4], "size": r[5], "new_bytes": r[6]} for r in rows]
+
+    @staticmethod
+    def _entry_blobs(entry: dict) -> List[str]:
+        if "region" in entry:
+            return [chunk[3] for chunk in entry["region"]]
+        return entry.get("blobs", [])
+
+    @classmethod
+    def _blobs_of(cls, manifest: dict) -> Counter:
+        refs = Counter()
+        for entry in manifest["files"].values():
+            refs.update(cls._entry_blobs(entry))
+        return refs
+
+    def _store_blobs(self, abs_path: str) -> Tuple[dict, List[str], int]:
+        blobs, written = [], 0
+        try:
+            with open(abs_path, "rb") as f:
+                while True:
+                    data = f.read(self.chunk_size)
+                    if not data:
+                        break
+                    digest, n = self.put_blob(data)
+                    blobs.append(digest)
+                    written += n
+        except Exception:
+            self._release_pending(blobs)
+            raise
+        return {"blobs": blobs}, blobs, written
+
+    def _store_region(self, abs_path: str, previous: Optional[dict]) -> Tuple[dict, List[str], int]:
+        """Stocke une région chunk par chunk; les chunks inchangés reprennent le bloc parent.
+
+        Entrée du manifeste: {"region": [[index, localisation, horodatage, hash], ...]}
+        """
+        parent_chunks = {c[0]: c for c in (previous or {}).get("region", ())}
+        chunks, digests, written = [], [], 0
+        try:
+            with open(abs_path, "rb") as f:
+                file_size = os.fstat(f.fileno()).st_size
+                locations, timestamps = read_header(f)
+                for index, location in enumerate(locations):
+                    if not location:
+                        continue
+                    timestamp = timestamps[index]
+                    parent = parent_chunks.get(index)
+                    if parent and parent[1] == location and parent[2] == timestamp:
+                        digest = parent[3]
+                        with self._lock:
+                            self._pending[digest] += 1
+                    else:
+                        digest, n = self.put_blob(read_chunk(f, location, file_size))
+                        written += n
+                    digests.append(digest)
+                    chunks.append([index, location, timestamp, digest])
+        except ValueError as e:
+            # Région vide, tronquée ou corrompue: sauvegardée telle quelle
+            self._release_pending(digests)
+            logger.debug(f"[BACKUP] Région {abs_path} non découpée ({e})")
+            return self._store_blobs(abs_path)
+        except Exception:
+            self._release_pending(digests)
+            raise
+        return {"region": chunks}, digests, written
+
+    def snapshot(self, server: str, path: str, snapshot_id: Optional[str] = None,
+                 files: Optional[Iterator[Tuple[str, str]]] = None, split_regions: bool = False,
+                 reuse: Optional[Dict[str, dict]] = None) -> dict:
+        """Crée un snapshot de *path*; retourne ses métadonnées.
+
+        *files* (chemin absolu, chemin relatif) remplace le parcours par
+        défaut `iter_backup_files(path)`. *split_regions* active le
+        découpage des régions .mca par chunk. *reuse* {chemin relatif:
+        entrée de manifeste} ajoute tels quels des fichiers déjà stockés,
+        absents de *path* (copie figée partielle, voir `freeze_server`).
+        """
+        started = time.monotonic()
+        snapshot_id = snapshot_id or f"{server}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if self.has_snapshot(snapshot_id):
+            raise Exception(f"Snapshot déjà existant: {snapshot_id}")
+        parent_id = self.latest(server)
+        parent_files = self.load_manifest(parent_id)["files"] if parent_id else {}
+
+        manifest_files: Dict[str, dict] = {}
+        to_store = []
+        reused = Counter()
+        for rel_path, previous in (reuse or {}).items():
+            manifest_files[rel_path] = dict(previous)
+            reused.update(self._entry_blobs(previous))
+        for abs_path, rel_path in (files if files is not None else iter_backup_files(path)):
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                continue  # Supprimé pendant le parcours
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": stat.S_IMODE(st.st_mode)}
+            previous = parent_files.get(rel_path)
+            if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+                key = "region" if "region" in previous else "blobs"
+                entry[key] = previous[key]
+                reused.update(self._entry_blobs(entry))
+            else:
+                to_store.append((abs_path, rel_path, previous))
+            manifest_files[rel_path] = entry
+
+        with self._lock:
+            # Les blocs repris du parent ne doivent pas disparaître avant le commit
+            self._pending.update(reused)
+        stored_digests: List[str] = []
+        new_bytes = 0
+        try:
+            # Entrées reprises hors parcours: leur snapshot d'origine a pu être collecté entre-temps
+            missing = [digest for digest in {d for e in (reuse or {}).values() for d in self._entry_blobs(e)}
+                       if not self._has_blob(digest)]
+            if missing:
+                raise Exception(f"{len(missing)} blocs repris absents du dépôt")
+
+            def store(job):
+                abs_path, rel_path, previous = job
+                try:
+                    if split_regions and rel_path.endswith(REGION_EXTENSIONS):
+                        return rel_path, self._store_region(abs_path, previous)
+                    return rel_path, self._store_blobs(abs_path)
+                except FileNotFoundError:
+                    return rel_path, None
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backup-store") as pool:
+                for rel_path, result in pool.map(store, to_store):
+                    if result is None:
+                        del manifest_files[rel_path]
+                        continue
+                    fields, digests, written = result
+                    manifest_files[rel_path].update(fields)
+                    stored_digests.extend(digests)
+                    new_bytes += written
+
+            manifest = {
+                "id": snapshot_id,
+                "server": server,
+                "created": time.time(),
+                "parent": parent_id,
+                "chunk_size": self.chunk_size,
+                "split_regions": split_regions,
+                "files": manifest_files,
+            }
+            self._commit(manifest, new_bytes)
+        finally:
+            self._release_pending(list(reused.elements()) + stored_digests)
+
+        size = sum(e["size"] for e in manifest_files.values())
+        elapsed = time.monotonic() - started
+        logger.info(f"[BACKUP] Snapshot {snapshot_id}: {len(manifest_files)} fichiers, "
+                    f"{len(to_store)} modifiés, {new_bytes / 1024 / 1024:.1f} Mo écrits "
+                    f"sur {size / 1024 / 1024:.1f} Mo en {elapsed:.1f}s")
+        return {"id": snapshot_id, "server": server, "parent": parent_id, "files": len(manifest_files),
+                "changed_files": len(to_store), "size": size, "new_bytes": new_bytes,
+                "elapsed": round(elapsed, 2)}
+
+    def _commit(self, manifest: dict, new_bytes: int):
+        refs = self._blobs_of(manifest)
+        atomic_write(self.manifest_path(manifest["id"]), json.dumps(manifest, separators=(",", ":")))
+        with self._lock:
+            self._db.executemany("UPDATE blobs SET refs = refs + ? WHERE hash = ?",
+                                 [(n, digest) for digest, n in refs.items()])
+            self._db.execute(
+                "INSERT INTO snapshots (id, server, created, parent, files, size, new_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (manifest["id"], manifest["server"], manifest["created"], manifest["parent"],
+                 len(manifest["files"]), sum(e["size"] for e in manifest["files"].values()), new_bytes))
+            self._db.commit()
+
+    def delete(self, snapshot_id: str) -> bool:
+        """Supprime un snapshot et décrémente ses références (voir `gc()`)."""
+        if not self.has_snapshot(snapshot_id):
+            return False
+        refs = self._blobs_of(self.load_manifest(snapshot_id))
+        with self._lock:
+            self._db.executemany("UPDATE blobs SET refs = MAX(refs - ?, 0) WHERE hash = ?",
+                                 [(n, digest) for digest, n in refs.items()])
+            # Les enfants deviennent des snapshots complets: le parent n'est qu'indicatif
+            self._db.execute("UPDATE snapshots SET parent = NULL WHERE parent = ?", (snapshot_id,))
+            self._db.execute("DELETE FROM snapshots WHERE id = ?", (snapshot_id,))
+            self._db.commit()
+            os.remove(self.manifest_path(snapshot_id))
+        logger.info(f"[BACKUP] Snapshot supprimé: {snapshot_id}")
+        return True
+
+    def gc(self) -> dict:
+        """Efface les blocs qui ne sont plus référencés par aucun snapshot."""
+        removed, freed = 0, 0
+        with self._lock:
+            rows = self._db.execute("SELECT hash, stored FROM blobs WHERE refs <= 0").fetchall()
+            dead = [(digest, stored) for digest, stored in rows if digest not in self._pending]
+            for digest, stored in dead:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                freed += stored
+            self._db.executemany("DELETE FROM blobs WHERE hash = ?", [(d,) for d, _ in dead])
+            self._db.commit()
+        if removed:
+            logger.info(f"[BACKUP] GC: {removed} blocs supprimés, {freed / 1024 / 1024:.1f} Mo libérés")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def rebuild_refs(self) -> dict:
+        """Recalcule les références depuis les manifestes (marquage complet) puis collecte."""
+        with self._lock:
+            refs = Counter()
+            for file in os.listdir(self.snapshots_dir):
+                if file.endswith(".json"):
+                    refs.update(self._blobs_of(self.load_manifest(file[:-5])))
+            self._db.execute("UPDATE blobs SET refs = 0")
+            self._db.executemany("UPDATE blobs SET refs = ? WHERE hash = ?",
+                                 [(n, digest) for digest, n in refs.items()])
+            self._db.commit()
+            return self.gc()
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, size, stored = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored), 0) FROM blobs").fetchone()
+            snapshots, logical = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots").fetchone()
+        return {
+            "snapshots": snapshots,
+            "blobs": blobs,
+            "logical_bytes": logical,
+            "unique_bytes": size,
+            "stored_bytes": stored,
+            "dedup_ratio": round(logical / stored, 2) if stored else None,
+            "codec": "zstd" if HAS_ZSTD else "zlib",
+        }
+
+    # ------------------------------------------------------------------
+    # Restauration
+    # ------------------------------------------------------------------
+    def restore(self, snapshot_id: str, dest: str, prune: bool = True) -> dict:
+        """Restaure un snapshot dans *dest*.
+
+        Les fichiers inchangés (taille et date identiques) ne sont pas
+        réécrits. Avec *prune*, les fichiers qu'une sauvegarde aurait inclus
+        mais absents du snapshot sont supprimés (voir `iter_prunable_files`).
+        """
+        manifest = self.load_manifest(snapshot_id)
+        files = manifest["files"]
+        os.makedirs(dest, exist_ok=True)
+
+        def restore_file(item):
+            rel_path, entry = item
+            target = os.path.join(dest, rel_path)
+            if os.path.commonpath([os.path.abspath(target), os.path.abspath(dest)]) != os.path.abspath(dest):
+                raise Exception(f"Chemin invalide dans le manifeste: {rel_path}")
+            try:
+                st = os.stat(target)
+                if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                    return 0
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.restore-tmp"
+            if "region" in entry:
+                write_region(tmp, [(index, timestamp, self.get_blob(digest))
+                                   for index, _, timestamp, digest in entry["region"]])
+            else:
+                with open(tmp, "wb") as f:
+                    for digest in entry.get("blobs", ()):
+                        f.write(self.get_blob(digest))
+            os.chmod(tmp, entry.get("mode", 0o644))
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, target)
+            return 1
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backup-restore") as pool:
+            written = sum(pool.map(restore_file, files.items()))
+
+        removed = 0
+        if prune:
+            for abs_path, rel_path in list(iter_prunable_files(dest)):
+                if rel_path not in files:
+                    os.remove(abs_path)
+                    removed += 1
+        logger.info(f"[BACKUP] Snapshot {snapshot_id} restauré dans {dest}: "
+                    f"{written} fichiers écrits, {removed} supprimés")
+        return {"id": snapshot_id, "files": len(files), "written": written, "removed": removed}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_stores: Dict[str, BackupStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_backup_store(backup_dir: str) -> BackupStore:
+    """Dépôt partagé de *backup_dir* (une instance par processus)."""
+    key = os.path.abspath(backup_dir)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = BackupStore(backup_dir)
+        return _stores[key]
@@ -0,0 +1,206 @@
+"""
+Clonage copy-on-write de dossiers de serveurs.
+
+Par fichier, du moins coûteux au plus coûteux:
+
+1. reflink (ioctl FICLONE: btrfs, XFS, bcachefs, ZFS récent...): copie
+   instantanée, blocs partagés jusqu'à la première écriture, gérée par le
+   système de fichiers;
+2. lien physique pour les artefacts immuables (jars, librairies, hors
+   plugins/ et mods/) et les fichiers de région .mca. Les .mca étant réécrits sur place par le serveur,
+   un « copy-up » leur redonne un inode privé au démarrage du premier des deux
+   serveurs (`copy_up()`), l'autre récupère alors l'original pour lui seul;
+3. copie classique (copy_file_range / sendfile via shutil), en parallèle.
+
+Le mode reflink est sondé sur le premier fichier: s'il n'est pas supporté,
+il n'est plus tenté pour le reste de l'arborescence.
+"""
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409
+# Fichier marqueur: le dossier partage des inodes mutables avec un autre serveur
+COW_MARKER = ".mcpanel_cow"
+
+# Jamais réécrits sur place (remplacés par un nouveau fichier lors d'une mise à jour)
+IMMUTABLE_EXTENSIONS = (".jar", ".zip")
+IMMUTABLE_DIRS = ("libraries", "versions", "cache", ".fabric", "bundler")
+# Contenu déposé par l'utilisateur: les uploads et installations réécrivent les
+# jars sur place, un lien physique propagerait l'écriture au serveur source
+USER_DIRS = ("plugins", "mods")
+# Réécrits sur place par le serveur: liens physiques seulement avec copy-up
+COPY_UP_EXTENSIONS = (".mca", ".mcc")
+
+SKIP_NAMES = {"session.lock", COW_MARKER}
+SKIP_DIRS = {"logs", "crash-reports", "debug"}
+
+_REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                        getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+
+def reflink(src: str, dst: str):
+    """Copie *src* vers *dst* par partage de blocs; OSError si non supporté."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _is_immutable(rel_path: str) -> bool:
+    parts = rel_path.split(os.sep)[:-1]
+    if any(p in USER_DIRS for p in parts):
+        return False
+    return rel_path.endswith(IMMUTABLE_EXTENSIONS) or any(p in IMMUTABLE_DIRS for p in parts)
+
+
+class CloneEngine:
+    def __init__(self, max_workers: int = 8, use_reflink: bool = True, use_hardlinks: bool = True):
+        self.max_workers = max_workers
+        self.use_reflink = use_reflink
+        self.use_hardlinks = use_hardlinks
+
+    def clone_tree(self, src: str, dst: str, share_mutable: bool = True,
+                   skip: Optional[Callable[[str, os.stat_result], bool]] = None) -> Dict[str, int]:
+        """Clone *src* vers *dst* (inexistant); retourne les compteurs par méthode.
+
+        *share_mutable*=False interdit les liens physiques sur les .mca (source
+        en cours d'exécution: elle réécrirait les régions partagées). Les
+        fichiers pour lesquels *skip*(chemin relatif, stat) est vrai ne sont
+        pas clonés.
+        """
+        stats = {"reflinked": 0, "hardlinked": 0, "copied": 0, "skipped": 0,
+                 "bytes_copied": 0, "bytes_shared": 0}
+        lock = threading.Lock()
+        reflink_ok = [self.use_reflink]
+        needs_copy_up = [False]
+
+        def count(key, size):
+            with lock:
+                stats[key] += 1
+                stats["bytes_copied" if key == "copied" else "bytes_shared"] += size
+
+        def clone_file(job):
+            s, d, rel, size = job
+            if reflink_ok[0]:
+                try:
+                    reflink(s, d)
+                    count("reflinked", size)
+                    return
+                except OSError as e:
+                    if e.errno not in _REFLINK_UNSUPPORTED:
+                        raise
+                    reflink_ok[0] = False
+            mutable = rel.endswith(COPY_UP_EXTENSIONS)
+            if self.use_hardlinks and (_is_immutable(rel) or (mutable and share_mutable)):
+                try:
+                    os.link(s, d)
+                    if mutable:
+                        needs_copy_up[0] = True
+                    count("hardlinked", size)
+                    return
+                except OSError:
+                    pass
+            shutil.copy2(s, d)
+            count("copied", size)
+
+        # Arborescence (dossiers, liens symboliques) puis liste des fichiers
+        os.makedirs(dst)
+        jobs = []
+        for root, dirs, files in os.walk(src):
+            rel_root = os.path.relpath(root, src)
+            target_root = dst if rel_root == "." else os.path.join(dst, rel_root)
+            kept = []
+            for d in dirs:
+                s = os.path.join(root, d)
+                if d in SKIP_DIRS:
+                    continue
+                if os.path.islink(s):
+                    os.symlink(os.readlink(s), os.path.join(target_root, d))
+                    continue
+                os.makedirs(os.path.join(target_root, d), exist_ok=True)
+                kept.append(d)
+            dirs[:] = kept
+            for f in files:
+                if f in SKIP_NAMES:
+                    continue
+                s = os.path.join(root, f)
+                st = os.lstat(s)
+                if stat.S_ISLNK(st.st_mode):
+                    os.symlink(os.readlink(s), os.path.join(target_root, f))
+                elif stat.S_ISREG(st.st_mode):
+                    rel = f if rel_root == "." else os.path.join(rel_root, f)
+                    if skip and skip(rel, st):
+                        stats["skipped"] += 1
+                        continue
+                    jobs.append((s, os.path.join(target_root, f), rel, st.st_size))
+
+        if jobs:
+            # Le premier fichier sonde le support du reflink pour tous les autres
+            clone_file(jobs[0])
+            if not reflink_ok[0]:
+                logger.debug("[CLONE] Reflink non supporté, liens physiques / copie")
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="clone") as pool:
+                list(pool.map(clone_file, jobs[1:]))
+
+        if needs_copy_up[0]:
+            for path in (src, dst):
+                with open(os.path.join(path, COW_MARKER), "w", encoding="utf-8") as f:
+                    f.write("hardlinked region files pending copy-up\n")
+        return stats
+
+
+def copy_up(path: str, max_workers: int = 8) -> int:
+    """Donne un inode privé aux fichiers mutables encore partagés par lien physique.
+
+    À appeler avant le démarrage d'un serveur (sans effet sans marqueur COW).
+    Retourne le nombre de fichiers recopiés.
+    """
+    marker = os.path.join(path, COW_MARKER)
+    if not os.path.exists(marker):
+        return 0
+
+    shared = []
+    for root, _, files in os.walk(path):
+        for f in files:
+            if f.endswith(COPY_UP_EXTENSIONS):
+                full = os.path.join(root, f)
+                try:
+                    if os.lstat(full).st_nlink > 1:
+                        shared.append(full)
+                except OSError:
+                    continue
+
+    def private_copy(full):
+        tmp = full + ".cow-tmp"
+        shutil.copy2(full, tmp)
+        os.replace(tmp, full)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="copy-up") as pool:
+        list(pool.map(private_copy, shared))
+    os.remove(marker)
+    if shared:
+        logger.info(f"[CLONE] Copy-up de {len(shared)} fichier(s) de région dans {path}")
+    return len(shared)
+
+
+_engine: Optional[CloneEngine] = None
+
+
+def get_clone_engine() -> CloneEngine:
+    global _engine
+    if _engine is None:
+        _engine = CloneEngine()
+    return _engine
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, func
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, Text, ForeignKey, func
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.ext.declarative import declared_attr
 import os
@@ -54,6 +54,35 @@ class AuditLog(Base):
     details = Column(Text)
 
 
+class BackupRecord(Base):
+    """Sauvegarde écrite par le panel (archive ou snapshot dédupliqué)."""
+    __tablename__ = 'backups'
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), unique=True, index=True, nullable=False)
+    server = Column(String(150), index=True, nullable=False)
+    created_at = Column(DateTime, default=func.now(), index=True)
+    format = Column(String(20), index=True)  # zip | mcpa | dedup | chunked | dir
+    codec = Column(String(20))
+    # Taille restaurée / octets réellement ajoutés sur disque par cette sauvegarde
+    size_bytes = Column(BigInteger, default=0)
+    stored_bytes = Column(BigInteger, default=0)
+    parent = Column(String(255), nullable=True)
+    checksum = Column(String(64), nullable=True)  # SHA-256 de l'archive ou du manifeste
+    file_count = Column(Integer, default=0)
+    files = relationship('BackupFile', back_populates='backup', cascade='all, delete-orphan',
+                         passive_deletes=True)
+
+
+class BackupFile(Base):
+    __tablename__ = 'backup_files'
+    id = Column(Integer, primary_key=True)
+    backup_id = Column(Integer, ForeignKey('backups.id', ondelete='CASCADE'), index=True, nullable=False)
+    path = Column(String(1024), nullable=False)
+    size = Column(BigInteger, default=0)
+    mtime = Column(DateTime, nullable=True)
+    backup = relationship('BackupRecord', back_populates='files')
+
+
 def init_db():
     """Create tables if they do not exist."""
     Base.metadata.create_all(bind=engine)
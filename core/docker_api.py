@@ -0,0 +1,300 @@
+"""
+Client minimal de l'API Docker Engine via le socket unix.
+
+Remplace les appels `docker ...` / `docker compose ...` en sous-processus par
+des requêtes HTTP keep-alive sur /var/run/docker.sock, avec un petit pool de
+connexions réutilisables. Le CLI reste utilisé en repli par le ServerManager
+lorsque le socket n'est pas accessible.
+"""
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger(__name__)
+
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+API_VERSION = os.getenv("DOCKER_API_VERSION", "v1.41")
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection qui se connecte à un socket unix au lieu de TCP."""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def demux_stream(data: bytes) -> bytes:
+    """Décode le flux multiplexé stdout/stderr de Docker (conteneurs sans TTY).
+
+    Chaque trame: 1 octet de type, 3 octets nuls, taille big-endian sur 4 octets.
+    Les flux bruts (TTY) sont renvoyés tels quels.
+    """
+    if len(data) < 8 or data[0] not in (0, 1, 2) or data[1:4] != b"\x00\x00\x00":
+        return data
+    out = bytearray()
+    pos = 0
+    while pos + 8 <= len(data):
+        size = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+        out += data[pos + 8:pos + 8 + size]
+        pos += 8 + size
+    return bytes(out)
+
+
+def compute_cpu_percent(stats: dict, prev: Optional[Tuple[int, int]] = None) -> float:
+    """CPU% façon `docker stats` (100% = un cœur).
+
+    Utilise precpu_stats si présent, sinon l'échantillon précédent *prev*
+    (total_usage, system_cpu_usage) mémorisé par l'appelant (mode one-shot).
+    """
+    cpu = stats.get("cpu_stats") or {}
+    total = (cpu.get("cpu_usage") or {}).get("total_usage", 0)
+    system = cpu.get("system_cpu_usage", 0)
+    pre = stats.get("precpu_stats") or {}
+    pre_total = (pre.get("cpu_usage") or {}).get("total_usage", 0)
+    pre_system = pre.get("system_cpu_usage", 0)
+    if not pre_system and prev:
+        pre_total, pre_system = prev
+    online = cpu.get("online_cpus") or len((cpu.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+    cpu_delta = total - pre_total
+    system_delta = system - pre_system
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return round(cpu_delta / system_delta * online * 100.0, 2)
+
+
+def memory_usage_bytes(stats: dict) -> int:
+    """Mémoire utilisée hors cache de pages (même calcul que le CLI)."""
+    mem = stats.get("memory_stats") or {}
+    usage = mem.get("usage", 0)
+    detail = mem.get("stats") or {}
+    cache = detail.get("inactive_file", detail.get("total_inactive_file", detail.get("cache", 0)))
+    return max(usage - cache, 0)
+
+
+class DockerClient:
+    """Client HTTP poolé pour l'API Docker Engine."""
+
+    def __init__(self, socket_path: str = DOCKER_SOCKET, pool_size: int = 8, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[_UnixHTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._available: Optional[bool] = None
+        self._available_checked = 0.0
+
+    # ------------------------------------------------------------------
+    # Transport
+    # ------------------------------------------------------------------
+    def _acquire(self, timeout: Optional[float]) -> Tuple[_UnixHTTPConnection, bool]:
+        try:
+            conn = self._pool.get_nowait()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        except queue.Empty:
+            return _UnixHTTPConnection(self.socket_path, timeout=timeout), False
+
+    def _release(self, conn: _UnixHTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, params: Optional[dict] = None, body: Any = None,
+                timeout: Optional[float] = None, expect_json: bool = True):
+        """Exécute une requête et retourne le corps (JSON décodé ou bytes).
+
+        Les 404 renvoient None; les autres erreurs HTTP lèvent DockerAPIError.
+        Une connexion réutilisée fermée par le démon est retentée une fois.
+        """
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        headers = {"Host": "docker"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(2):
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+                    http.client.CannotSendRequest, http.client.ResponseNotReady):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            break
+
+        if resp.status == 404:
+            return None
+        if resp.status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except Exception:
+                message = data.decode(errors="replace")
+            raise DockerAPIError(resp.status, message)
+        if not expect_json:
+            return data
+        return json.loads(data) if data else {}
+
+    def stream(self, path: str, params: Optional[dict] = None) -> Iterator[bytes]:
+        """Itère sur les lignes d'une réponse en streaming (events, logs -f).
+
+        Utilise une connexion dédiée sans timeout, hors du pool.
+        """
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        conn = _UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            conn.request("GET", url, headers={"Host": "docker"})
+            resp = conn.getresponse()
+            if resp.status >= 400:
+                raise DockerAPIError(resp.status, resp.read().decode(errors="replace"))
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Disponibilité
+    # ------------------------------------------------------------------
+    def ping(self) -> bool:
+        try:
+            return self.request("GET", "/_ping", expect_json=False, timeout=2) == b"OK"
+        except Exception:
+            return False
+
+    def available(self, max_age: float = 30.0) -> bool:
+        """Indique si le démon répond (résultat mis en cache *max_age* secondes)."""
+        now = time.monotonic()
+        if self._available is None or now - self._available_checked > max_age:
+            self._available = os.path.exists(self.socket_path) and self.ping()
+            self._available_checked = now
+        return self._available
+
+    # ------------------------------------------------------------------
+    # Conteneurs
+    # ------------------------------------------------------------------
+    def inspect_container(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.request("GET", f"/containers/{quote(name)}/json")
+
+    def list_containers(self, all: bool = False, filters: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+        params = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return self.request("GET", "/containers/json", params=params) or []
+
+    def container_stats(self, name: str, one_shot: bool = True) -> Optional[dict]:
+        """Statistiques instantanées (one-shot: pas d'attente du second échantillon)."""
+        params = {"stream": "false"}
+        if one_shot:
+            params["one-shot"] = "true"
+        return self.request("GET", f"/containers/{quote(name)}/stats", params=params)
+
+    def logs(self, name: str, tail: int = 100, timestamps: bool = False) -> Optional[str]:
+        data = self.request("GET", f"/containers/{quote(name)}/logs", params={
+            "stdout": "1", "stderr": "1", "tail": str(tail), "timestamps": "1" if timestamps else "0",
+        }, expect_json=False)
+        if data is None:
+            return None
+        return demux_stream(data).decode("utf-8", errors="replace")
+
+    def exec_run(self, name: str, cmd: List[str], timeout: Optional[float] = None) -> Tuple[int, str]:
+        """Exécute *cmd* dans le conteneur et retourne (exit_code, sortie)."""
+        created = self.request("POST", f"/containers/{quote(name)}/exec", body={
+            "AttachStdout": True, "AttachStderr": True, "Tty": False, "Cmd": cmd,
+        })
+        if created is None:
+            raise DockerAPIError(404, f"Conteneur {name} introuvable")
+        exec_id = created["Id"]
+        output = self.request("POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False},
+                              timeout=timeout, expect_json=False) or b""
+        info = self.request("GET", f"/exec/{exec_id}/json") or {}
+        return info.get("ExitCode") or 0, demux_stream(output).decode("utf-8", errors="replace")
+
+    def start(self, name: str):
+        self._action(name, "start")
+
+    def stop(self, name: str, timeout: int = 10):
+        self._action(name, "stop", {"t": str(timeout)}, http_timeout=timeout + self.timeout)
+
+    def restart(self, name: str, timeout: int = 10):
+        self._action(name, "restart", {"t": str(timeout)}, http_timeout=timeout + self.timeout)
+
+    def kill(self, name: str, signal: str = "SIGKILL"):
+        self._action(name, "kill", {"signal": signal})
+
+    def _action(self, name: str, action: str, params: Optional[dict] = None, http_timeout: Optional[float] = None):
+        url = f"/containers/{quote(name)}/{action}"
+        # 304 (déjà démarré/arrêté) est renvoyé sans corps: pas une erreur
+        result = self.request("POST", url, params=params, timeout=http_timeout, expect_json=False)
+        if result is None:
+            raise DockerAPIError(404, f"Conteneur {name} introuvable")
+
+    def create_container(self, name: str, config: Dict[str, Any]) -> str:
+        created = self.request("POST", "/containers/create", params={"name": name}, body=config)
+        if created is None:
+            raise DockerAPIError(404, f"Image introuvable pour {name}")
+        return created["Id"]
+
+    def remove_container(self, name: str, force: bool = False, volumes: bool = False):
+        self.request("DELETE", f"/containers/{quote(name)}", params={
+            "force": "1" if force else "0", "v": "1" if volumes else "0",
+        }, expect_json=False)
+
+
+_client: Optional[DockerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_docker_client() -> Optional[DockerClient]:
+    """Client partagé, ou None si le socket Docker n'existe pas."""
+    global _client
+    if not os.path.exists(DOCKER_SOCKET):
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = DockerClient()
+        return _client
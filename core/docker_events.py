@@ -0,0 +1,272 @@
+"""
+Suivi en temps réel de l'état des conteneurs du panel via le flux
+d'événements Docker (/events).
+
+La table d'état est amorcée par un unique `GET /containers/json` au démarrage
+puis tenue à jour par les événements des conteneurs portant le label
+`com.mcpanel.server`. `ServerManager.is_running` devient une simple lecture
+en mémoire et les changements d'état sont observables (wait_for / subscribe)
+avec une latence inférieure à la seconde.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+
+from core.docker_api import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+SERVER_LABEL = "com.mcpanel.server"
+OWNER_LABEL = "com.mcpanel.owner"
+
+# "Up 3 minutes (healthy)" / "Exited (137) 2 hours ago"
+_HEALTH_RE = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+_EXIT_RE = re.compile(r"Exited \((-?\d+)\)")
+
+
+@dataclass
+class ContainerState:
+    name: str
+    server: Optional[str] = None
+    id: Optional[str] = None
+    running: bool = False
+    status: str = "unknown"        # created / running / exited / paused ...
+    health: Optional[str] = None   # healthy / unhealthy / starting
+    exit_code: Optional[int] = None
+    restart_count: int = 0
+    started_at: Optional[str] = None
+    updated: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ContainerStateWatcher:
+    """Abonné au flux d'événements Docker tenant une table d'état en mémoire."""
+
+    def __init__(self, client_factory: Callable = get_docker_client, reconnect_delay: float = 2.0):
+        self.client_factory = client_factory
+        self.reconnect_delay = reconnect_delay
+        self._states: Dict[str, ContainerState] = {}
+        self._cond = threading.Condition()
+        self._subscribers: List[Callable[[ContainerState, str], None]] = []
+        self._running = False
+        self._connected = False
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="docker-events")
+        self._thread.start()
+        logger.info("[EVENTS] Surveillance des événements Docker démarrée")
+
+    def stop(self):
+        self._running = False
+
+    @property
+    def connected(self) -> bool:
+        """True tant que la table est synchronisée avec le flux d'événements."""
+        return self._connected
+
+    def _loop(self):
+        while self._running:
+            client = self.client_factory()
+            if not client or not client.available():
+                self._set_connected(False)
+                time.sleep(self.reconnect_delay * 5)
+                continue
+            try:
+                since = int(time.time())
+                self._seed(client)
+                self._set_connected(True)
+                filters = {"type": ["container"], "label": [SERVER_LABEL]}
+                for line in client.stream("/events", params={"since": str(since), "filters": json.dumps(filters)}):
+                    if not self._running:
+                        break
+                    try:
+                        self._apply_event(client, json.loads(line))
+                    except Exception as e:
+                        logger.debug(f"[EVENTS] Événement ignoré: {e}")
+            except Exception as e:
+                logger.warning(f"[EVENTS] Flux d'événements interrompu: {e}")
+            self._set_connected(False)
+            time.sleep(self.reconnect_delay)
+
+    def _set_connected(self, value: bool):
+        with self._cond:
+            self._connected = value
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Mise à jour de la table
+    # ------------------------------------------------------------------
+    def _seed(self, client):
+        """Amorce la table avec un seul listing des conteneurs du panel."""
+        containers = client.list_containers(all=True, filters={"label": [SERVER_LABEL]})
+        states = {}
+        now = time.time()
+        for c in containers:
+            names = c.get("Names") or []
+            if not names:
+                continue
+            name = names[0].lstrip("/")
+            text = c.get("Status") or ""
+            health = _HEALTH_RE.search(text)
+            exited = _EXIT_RE.search(text)
+            state = ContainerState(
+                name=name,
+                server=(c.get("Labels") or {}).get(SERVER_LABEL),
+                id=c.get("Id"),
+                running=c.get("State") == "running",
+                status=c.get("State") or "unknown",
+                health=health.group(1).replace("health: ", "") if health else None,
+                exit_code=int(exited.group(1)) if exited else None,
+                updated=now,
+            )
+            if state.running:
+                # Le listing ne donne ni StartedAt ni RestartCount: un inspect par conteneur actif
+                self._refresh_from_inspect(client, state)
+            states[name] = state
+        with self._cond:
+            self._states = states
+            self._cond.notify_all()
+        logger.info(f"[EVENTS] {len(states)} conteneur(s) suivi(s)")
+
+    @staticmethod
+    def _refresh_from_inspect(client, state: ContainerState):
+        try:
+            info = client.inspect_container(state.name)
+        except Exception:
+            return
+        if not info:
+            return
+        st = info.get("State") or {}
+        state.running = bool(st.get("Running"))
+        state.status = st.get("Status", state.status)
+        state.exit_code = st.get("ExitCode")
+        state.started_at = st.get("StartedAt")
+        state.restart_count = info.get("RestartCount", 0)
+        health = st.get("Health") or {}
+        state.health = health.get("Status") or state.health
+
+    def _apply_event(self, client, event: dict):
+        action = event.get("Action") or event.get("status") or ""
+        actor = event.get("Actor") or {}
+        attrs = actor.get("Attributes") or {}
+        name = attrs.get("name")
+        if not name:
+            return
+        with self._cond:
+            state = self._states.get(name) or ContainerState(name=name)
+            # Copie: les lecteurs gardent une vue cohérente de l'ancien état
+            state = ContainerState(**state.to_dict())
+        state.server = attrs.get(SERVER_LABEL, state.server)
+        state.id = actor.get("ID", state.id)
+
+        if action == "start":
+            state.running = True
+            state.status = "running"
+            state.exit_code = None
+            self._refresh_from_inspect(client, state)
+        elif action == "die":
+            state.running = False
+            state.status = "exited"
+            try:
+                state.exit_code = int(attrs.get("exitCode"))
+            except (TypeError, ValueError):
+                pass
+        elif action == "restart":
+            self._refresh_from_inspect(client, state)
+        elif action.startswith("health_status"):
+            state.health = action.split(":", 1)[1].strip() if ":" in action else state.health
+        elif action == "create":
+            state.status = "created"
+        elif action == "pause":
+            state.status = "paused"
+        elif action == "unpause":
+            state.status = "running"
+        elif action == "destroy":
+            with self._cond:
+                self._states.pop(name, None)
+                self._cond.notify_all()
+            state.running = False
+            state.status = "removed"
+            self._notify(state, action)
+            return
+        else:
+            return
+
+        state.updated = time.time()
+        with self._cond:
+            self._states[name] = state
+            self._cond.notify_all()
+        self._notify(state, action)
+
+    def _notify(self, state: ContainerState, action: str):
+        for callback in list(self._subscribers):
+            try:
+                callback(state, action)
+            except Exception as e:
+                logger.debug(f"[EVENTS] Erreur abonné: {e}")
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def get(self, container: str) -> Optional[ContainerState]:
+        with self._cond:
+            return self._states.get(container)
+
+    def is_running(self, container: str) -> Optional[bool]:
+        """Lecture mémoire; None si la table n'est pas synchronisée."""
+        if not self._connected:
+            return None
+        state = self.get(container)
+        return bool(state and state.running)
+
+    def snapshot(self) -> Dict[str, ContainerState]:
+        with self._cond:
+            return dict(self._states)
+
+    def subscribe(self, callback: Callable[[ContainerState, str], None]):
+        """Appelle *callback(state, action)* à chaque changement d'état."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def wait_for(self, container: str, predicate: Callable[[Optional[ContainerState]], bool],
+                 timeout: float = 30.0) -> bool:
+        """Bloque jusqu'à ce que *predicate(state)* soit vrai ou expiration."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if predicate(self._states.get(container)):
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+
+_watcher: Optional[ContainerStateWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_state_watcher() -> ContainerStateWatcher:
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ContainerStateWatcher()
+        return _watcher
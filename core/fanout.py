@@ -0,0 +1,126 @@
+"""
+Exécution d'une commande (ou d'un court script) sur un ensemble de serveurs.
+
+Les serveurs sont sélectionnés par propriétaire, tag, type ou liste de noms;
+les commandes partent en parallèle sur le pool RCON persistant, avec un
+plafond de concurrence et une échéance globale. Le résultat regroupe, par
+serveur, les réponses et la latence: envoyer à 200 serveurs prend environ le
+temps de l'aller-retour RCON le plus lent.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from core import aio_loop
+from core.rcon import get_rcon_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_DEADLINE = 15.0
+
+# Appels bloquants (inspect Docker pour la cible RCON, console legacy): pool
+# dédié pour ne pas saturer l'exécuteur par défaut de la boucle partagée.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fanout")
+
+
+def select_servers(srv_mgr, owner: Optional[str] = None, tag: Optional[str] = None,
+                   server_type: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                   only_running: bool = True) -> List[str]:
+    """Noms des serveurs correspondant à tous les critères fournis."""
+    srv_mgr.registry.reconcile()
+    wanted = set(names) if names else None
+    selected = []
+    for entry in srv_mgr.registry.list(owner):
+        if wanted is not None and entry.name not in wanted:
+            continue
+        if server_type and (entry.server_type or "").lower() != server_type.lower():
+            continue
+        if tag:
+            tags = srv_mgr.get_server_config_view(entry.name).get("tags") or ()
+            if tag not in tags:
+                continue
+        if only_running and not srv_mgr.is_running(entry.name):
+            continue
+        selected.append(entry.name)
+    return sorted(set(selected))
+
+
+async def _run_one(srv_mgr, name, commands, semaphore, timeout):
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            # Résolution de la cible (inspect Docker) hors de la boucle
+            target = await loop.run_in_executor(_executor, srv_mgr.get_rcon_target, name)
+            if target and srv_mgr.rcon_recently_failed(name, target):
+                target = None
+            responses = []
+            via = "rcon"
+            if target:
+                pool = get_rcon_pool()
+                try:
+                    for cmd in commands:
+                        responses.append(await pool.command(*target, cmd, timeout=timeout))
+                    srv_mgr.note_rcon_result(name, target, True)
+                except (OSError, asyncio.TimeoutError) as e:
+                    # Cible injoignable depuis l'hôte: mémorisée, la suite passe par la console
+                    srv_mgr.note_rcon_result(name, target, False)
+                    logger.debug(f"[FANOUT] RCON injoignable pour {name}, repli console: {e}")
+                    target = None
+            if not target:
+                # Sans RCON: console (stdin legacy / docker exec), une commande à la fois
+                for cmd in commands[len(responses):]:
+                    responses.append(await loop.run_in_executor(_executor, srv_mgr.send_command, name, cmd))
+                via = "console"
+            return name, {
+                "status": "ok",
+                "via": via,
+                "responses": responses,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+        except Exception as e:
+            return name, {
+                "status": "error",
+                "error": str(e) or type(e).__name__,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+
+
+async def fanout_async(srv_mgr, servers: Iterable[str], commands: List[str],
+                       concurrency: int = DEFAULT_CONCURRENCY, deadline: float = DEFAULT_DEADLINE) -> dict:
+    servers = list(servers)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+    tasks = {asyncio.ensure_future(_run_one(srv_mgr, n, commands, semaphore, deadline)): n for n in servers}
+    results: Dict[str, dict] = {}
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in done:
+            name, result = task.result()
+            results[name] = result
+        for task in pending:
+            task.cancel()
+            results[tasks[task]] = {"status": "timeout", "error": f"Échéance de {deadline}s dépassée"}
+    summary = {"ok": 0, "error": 0, "timeout": 0}
+    for r in results.values():
+        summary[r["status"]] += 1
+    return {
+        "results": results,
+        "summary": summary,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def fanout(srv_mgr, servers: Iterable[str], commands, concurrency: int = DEFAULT_CONCURRENCY,
+           deadline: float = DEFAULT_DEADLINE) -> dict:
+    """Exécute *commands* (str ou liste) sur *servers*; bloque jusqu'à l'échéance au plus."""
+    if isinstance(commands, str):
+        commands = [commands]
+    commands = [c.strip() for c in commands if c and c.strip()]
+    if not commands:
+        raise ValueError("Aucune commande à exécuter")
+    return aio_loop.run(fanout_async(srv_mgr, servers, commands, concurrency, deadline),
+                        timeout=deadline + 5)
@@ -0,0 +1,300 @@
+"""
+Collecte périodique des statistiques de toute la flotte de serveurs.
+
+Un seul thread échantillonne en une passe tous les conteneurs en cours
+d'exécution (cgroup v2, sinon un unique `docker stats --no-stream` pour tous
+les conteneurs restants) ainsi que les processus legacy, pousse les valeurs
+dans le MetricsCollector et conserve le dernier instantané. Les endpoints de
+statut / performance / dashboard lisent cet instantané au lieu d'interroger
+Docker à chaque requête.
+"""
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import psutil
+
+from core.docker_api import get_docker_client
+from core.docker_events import OWNER_LABEL, SERVER_LABEL
+from core.mc_ping import ping_fleet
+
+logger = logging.getLogger(__name__)
+
+FLEET_STATS_INTERVAL = float(os.getenv("FLEET_STATS_INTERVAL", "5"))
+
+_SIZE_UNITS = {"b": 1, "kb": 1000, "kib": 1024, "mb": 1000 ** 2, "mib": 1024 ** 2,
+               "gb": 1000 ** 3, "gib": 1024 ** 3, "tb": 1000 ** 4, "tib": 1024 ** 4}
+_SIZE_RE = re.compile(r"([\d.]+)\s*([a-zA-Z]+)")
+
+
+def _parse_size(text: str) -> float:
+    """'512MiB' -> octets (format de `docker stats`)."""
+    m = _SIZE_RE.match(text.strip())
+    if not m:
+        return 0.0
+    return float(m.group(1)) * _SIZE_UNITS.get(m.group(2).lower(), 1)
+
+
+class FleetStatsCollector:
+    """Instantané {serveur: statut} rafraîchi toutes les *interval* secondes."""
+
+    def __init__(self, server_manager, metrics_collector, interval: float = FLEET_STATS_INTERVAL):
+        self.srv_mgr = server_manager
+        self.metrics = metrics_collector
+        self.interval = interval
+        self._snapshot: Dict[str, dict] = {}
+        self._snapshot_time = 0.0
+        # Source optionnelle des métriques en jeu (core.ingame_metrics.InGameMetricsScraper)
+        self.ingame = None
+        self._procs: Dict[int, psutil.Process] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="fleet-stats")
+        self._thread.start()
+        logger.info("[METRICS] Collecte des statistiques de la flotte démarrée")
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self):
+        while self._running:
+            started = time.monotonic()
+            try:
+                self.collect()
+            except Exception as e:
+                logger.error(f"[METRICS] Erreur collecte flotte: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0.5))
+
+    # ------------------------------------------------------------------
+    # Échantillonnage
+    # ------------------------------------------------------------------
+    def _running_containers(self) -> Dict[str, dict]:
+        """{conteneur: {"server", "owner"}} des conteneurs du panel actifs."""
+        watcher = getattr(self.srv_mgr, "state_watcher", None)
+        if watcher is not None and watcher.connected:
+            containers = {}
+            for c, st in watcher.snapshot().items():
+                if st.running:
+                    server = st.server or c[3:]
+                    entry = self.srv_mgr.registry.get(server)
+                    containers[c] = {"server": server, "owner": entry.owner if entry else None}
+            return containers
+
+        client = get_docker_client()
+        if client and client.available():
+            try:
+                containers = {}
+                for c in client.list_containers(filters={"label": [SERVER_LABEL]}):
+                    labels = c.get("Labels") or {}
+                    name = (c.get("Names") or ["/"])[0].lstrip("/")
+                    containers[name] = {"server": labels.get(SERVER_LABEL, name[3:]),
+                                        "owner": labels.get(OWNER_LABEL)}
+                return containers
+            except Exception as e:
+                logger.debug(f"[METRICS] Listing API Docker impossible: {e}")
+
+        containers = {}
+        try:
+            res = subprocess.run(
+                ["docker", "ps", "--filter", f"label={SERVER_LABEL}", "--format",
+                 f'{{{{.Names}}}}|{{{{.Label "{SERVER_LABEL}"}}}}|{{{{.Label "{OWNER_LABEL}"}}}}'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=10
+            )
+            for line in res.stdout.splitlines():
+                parts = line.split("|")
+                if len(parts) == 3:
+                    containers[parts[0]] = {"server": parts[1] or parts[0][3:], "owner": parts[2] or None}
+        except Exception:
+            pass
+        return containers
+
+    @staticmethod
+    def _bulk_docker_stats(containers) -> Dict[str, dict]:
+        """Un unique `docker stats --no-stream` pour tous les conteneurs donnés."""
+        if not containers:
+            return {}
+        stats = {}
+        try:
+            res = subprocess.run(
+                ["docker", "stats", "--no-stream", "--format",
+                 "{{.Name}}|{{.CPUPerc}}|{{.MemUsage}}|{{.MemPerc}}", *containers],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=30
+            )
+            for line in res.stdout.splitlines():
+                parts = line.split("|")
+                if len(parts) != 4:
+                    continue
+                used, _, limit = parts[2].partition("/")
+                stats[parts[0]] = {
+                    "cpu": float(parts[1].rstrip("%") or 0),
+                    "ram_bytes": _parse_size(used),
+                    "limit_bytes": _parse_size(limit) if limit else None,
+                    "ram_percent": float(parts[3].rstrip("%") or 0),
+                }
+        except Exception as e:
+            logger.debug(f"[METRICS] docker stats impossible: {e}")
+        return stats
+
+    def _legacy_stats(self, pid: int) -> Optional[dict]:
+        proc = self._procs.get(pid)
+        try:
+            if proc is None:
+                proc = psutil.Process(pid)
+                proc.cpu_percent(None)  # amorce: la première mesure vaut toujours 0
+                self._procs[pid] = proc
+            return {"cpu": round(proc.cpu_percent(None), 1), "ram_bytes": proc.memory_info().rss}
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self._procs.pop(pid, None)
+            return None
+
+    def collect(self) -> Dict[str, dict]:
+        """Échantillonne toute la flotte en une passe et publie l'instantané."""
+        snapshot: Dict[str, dict] = {}
+        total_mem = psutil.virtual_memory().total
+
+        containers = self._running_containers()
+        missing = []
+        for container, meta in containers.items():
+            cg = self.srv_mgr.cgroups.read(container)
+            if cg is None:
+                missing.append(container)
+                continue
+            limit = cg["memory_limit"] or total_mem
+            snapshot[meta["server"]] = self._entry(meta, cg["cpu_percent"], cg["memory_used"], limit)
+            snapshot[meta["server"]].update({
+                "io_read_bytes": cg["io_read_bytes"],
+                "io_write_bytes": cg["io_write_bytes"],
+                "oom_kills": cg["memory_events"]["oom_kill"],
+            })
+        for container, st in self._bulk_docker_stats(missing).items():
+            meta = containers.get(container)
+            if meta is None:
+                continue
+            entry = self._entry(meta, st["cpu"], st["ram_bytes"], st["limit_bytes"] or total_mem)
+            entry["ram_percent"] = st["ram_percent"]
+            snapshot[meta["server"]] = entry
+
+        alive = set()
+        for name, proc in list(self.srv_mgr.procs.items()):
+            if proc.poll() is not None:
+                continue
+            alive.add(proc.pid)
+            st = self._legacy_stats(proc.pid)
+            if st:
+                entry = self._entry({"owner": None}, st["cpu"], st["ram_bytes"], total_mem)
+                entry["pid"] = proc.pid
+                snapshot[name] = entry
+        for pid in [p for p in self._procs if p not in alive]:
+            self._procs.pop(pid, None)
+
+        self._ping(snapshot)
+        if self.ingame is not None:
+            for name, entry in snapshot.items():
+                ingame = self.ingame.latest(name)
+                if ingame:
+                    entry.update(ingame)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_time = time.time()
+
+        for name, entry in snapshot.items():
+            point = {
+                "cpu": entry["cpu"],
+                "ram": entry["ram_mb"],
+                "ram_mb": entry["ram_mb"],
+                "ram_percent": entry["ram_percent"],
+            }
+            for key in ("tps", "mspt", "loaded_chunks", "entities", "players_online"):
+                if key in entry:
+                    point[key] = entry[key]
+            self.metrics.update_server_metrics(name, point)
+        return snapshot
+
+    def _ping(self, snapshot: Dict[str, dict]):
+        """Joueurs / MOTD / latence de toute la flotte en une passe asyncio."""
+        targets = {}
+        for name in snapshot:
+            try:
+                host, port, _ = self.srv_mgr.get_ping_target(name)
+                targets[name] = (host, port)
+            except Exception:
+                continue
+        try:
+            results = ping_fleet(targets, timeout=min(self.interval / 2, 2.0))
+        except Exception as e:
+            logger.debug(f"[METRICS] Ping de la flotte impossible: {e}")
+            return
+        for name, res in results.items():
+            if not res.get("online"):
+                continue
+            snapshot[name].update({
+                "players_online": res["players_online"],
+                "max_players": res["players_max"],
+                "players_sample": res["sample"],
+                "motd": res["motd"],
+                "mc_version": res["version"],
+                "latency_ms": res["latency_ms"],
+            })
+
+    @staticmethod
+    def _entry(meta: dict, cpu: float, ram_bytes: float, limit_bytes: float) -> dict:
+        return {
+            "status": "online",
+            "running": True,
+            "cpu": round(cpu, 1),
+            "ram": round(ram_bytes / 1024 / 1024, 1),
+            "ram_mb": round(ram_bytes / 1024 / 1024, 1),
+            "ram_limit_mb": round(limit_bytes / 1024 / 1024, 1) if limit_bytes else None,
+            "ram_percent": round(ram_bytes / limit_bytes * 100, 1) if limit_bytes else 0,
+            "pid": "Docker",
+            "owner": meta.get("owner"),
+        }
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _fresh(self) -> bool:
+        return time.time() - self._snapshot_time <= self.interval * 3
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Dernier instantané {serveur: statut} des serveurs en ligne."""
+        with self._lock:
+            if not self._fresh():
+                return {}
+            return {k: dict(v) for k, v in self._snapshot.items()}
+
+    @property
+    def timestamp(self) -> Optional[str]:
+        if not self._snapshot_time:
+            return None
+        return datetime.fromtimestamp(self._snapshot_time).isoformat()
+
+    def get_status(self, name: str) -> dict:
+        """Statut d'un serveur depuis l'instantané.
+
+        L'état en ligne/hors ligne est relu (lecture mémoire des événements
+        Docker) pour ne pas annoncer un serveur arrêté entre deux passes; le
+        calcul synchrone n'est utilisé que pour un serveur fraîchement démarré.
+        """
+        with self._lock:
+            entry = self._snapshot.get(name) if self._fresh() else None
+            entry = dict(entry) if entry else None
+        running = self.srv_mgr.is_running(name)
+        if not running:
+            return {"status": "offline", "running": False, "cpu": 0, "ram": 0, "ram_mb": 0, "pid": None}
+        if entry:
+            entry["sampled_at"] = self.timestamp
+            return entry
+        return self.srv_mgr.get_status(name)
@@ -0,0 +1,295 @@
+"""
+Mise en veille des serveurs inactifs, avec réveil à la connexion.
+
+Un serveur dont la configuration active `hibernate_after` (minutes) est
+arrêté après autant de minutes à zéro joueur (mesuré par le Server List Ping
+du FleetStatsCollector). Un listener asyncio léger prend alors son port: il
+répond aux pings avec un MOTD « en veille » et l'icône du serveur, et démarre
+le serveur dès qu'un client tente de se connecter (handshake de login). Le
+port est rendu au serveur juste avant son démarrage.
+
+Les serveurs en veille sont persistés dans data/hibernation.json pour que
+les listeners soient recréés au redémarrage du panel.
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from core import aio_loop
+from core.mc_ping import decode_string, decode_varint, encode_string, packet, read_packet
+from core.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+HIBERNATION_INTERVAL = float(os.getenv("MC_HIBERNATION_INTERVAL", "60"))
+SLEEPING_MOTD = "§7Serveur en veille §8- §aconnectez-vous pour le réveiller"
+WAKING_MESSAGE = "Le serveur démarre, reconnectez-vous dans une trentaine de secondes."
+# Le port peut rester pris quelques instants après l'arrêt du conteneur
+BIND_ATTEMPTS = 5
+BIND_RETRY_DELAY = 1.0
+
+
+class SleepingListener:
+    """Écoute le port d'un serveur en veille (protocole de statut + login)."""
+
+    def __init__(self, name: str, port: int, on_wake, version: Optional[str] = None,
+                 max_players: int = 20, favicon: Optional[str] = None):
+        self.name = name
+        self.port = port
+        self.on_wake = on_wake
+        self.version = version or "Veille"
+        self.max_players = max_players
+        self.favicon = favicon
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "0.0.0.0", self.port, reuse_address=True)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _status_json(self, protocol: int) -> str:
+        data = {
+            # Protocole du client: le ping s'affiche comme compatible
+            "version": {"name": self.version, "protocol": protocol},
+            "players": {"max": self.max_players, "online": 0, "sample": []},
+            "description": {"text": SLEEPING_MOTD},
+        }
+        if self.favicon:
+            data["favicon"] = self.favicon
+        return json.dumps(data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            packet_id, payload = await asyncio.wait_for(read_packet(reader), 5)
+            if packet_id != 0x00:
+                return
+            protocol, offset = decode_varint(payload)
+            _, offset = decode_string(payload, offset)
+            next_state, _ = decode_varint(payload, offset + 2)
+
+            if next_state == 1:
+                packet_id, _ = await asyncio.wait_for(read_packet(reader), 5)
+                if packet_id != 0x00:
+                    return
+                writer.write(packet(0x00, encode_string(self._status_json(protocol))))
+                await writer.drain()
+                # Ping: renvoie le même payload (latence côté client)
+                try:
+                    packet_id, payload = await asyncio.wait_for(read_packet(reader), 5)
+                    if packet_id == 0x01:
+                        writer.write(packet(0x01, payload))
+                        await writer.drain()
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    pass
+            elif next_state in (2, 3):
+                # Login (3 = transfert): on déconnecte avec un message puis on réveille
+                writer.write(packet(0x00, encode_string(json.dumps({"text": WAKING_MESSAGE}))))
+                await writer.drain()
+                logger.info(f"[HIBERNATION] Connexion entrante sur {self.name}: réveil")
+                self.on_wake(self.name)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class HibernationManager:
+    def __init__(self, srv_mgr, fleet_stats, interval: float = HIBERNATION_INTERVAL,
+                 data_dir: str = "data"):
+        self.srv_mgr = srv_mgr
+        self.fleet_stats = fleet_stats
+        self.interval = interval
+        self.state_file = os.path.join(data_dir, "hibernation.json")
+        self._idle_since: Dict[str, float] = {}
+        self._listeners: Dict[str, SleepingListener] = {}
+        self._waking = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._restore()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="hibernation")
+        self._thread.start()
+        logger.info("[HIBERNATION] Surveillance de l'inactivité démarrée")
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self):
+        while self._running:
+            try:
+                self.check_idle()
+            except Exception as e:
+                logger.error(f"[HIBERNATION] Erreur: {e}")
+            time.sleep(self.interval)
+
+    # ------------------------------------------------------------------
+    # Détection de l'inactivité
+    # ------------------------------------------------------------------
+    def idle_minutes(self, name: str) -> int:
+        try:
+            return int(self.srv_mgr.get_server_config_view(name).get("hibernate_after") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def check_idle(self):
+        now = time.time()
+        snapshot = self.fleet_stats.snapshot()
+        for name, entry in snapshot.items():
+            minutes = self.idle_minutes(name)
+            if minutes <= 0 or self.is_hibernating(name):
+                self._idle_since.pop(name, None)
+                continue
+            # Sans réponse au ping, le nombre de joueurs est inconnu: pas de veille
+            players = entry.get("players_online")
+            if players is None or players > 0:
+                self._idle_since.pop(name, None)
+                continue
+            since = self._idle_since.setdefault(name, now)
+            if now - since >= minutes * 60:
+                try:
+                    self.hibernate(name, entry)
+                except Exception as e:
+                    logger.error(f"[HIBERNATION] Mise en veille de {name} impossible: {e}")
+        for gone in [n for n in self._idle_since if n not in snapshot]:
+            del self._idle_since[gone]
+
+    # ------------------------------------------------------------------
+    # Veille / réveil
+    # ------------------------------------------------------------------
+    def is_hibernating(self, name: str) -> bool:
+        with self._lock:
+            return name in self._listeners
+
+    def hibernating(self):
+        with self._lock:
+            return sorted(self._listeners)
+
+    def _favicon(self, name: str) -> Optional[str]:
+        path = self.srv_mgr._get_server_path(name)
+        for icon in (os.path.join(path, "data", "server-icon.png"), os.path.join(path, "server-icon.png")):
+            if os.path.exists(icon):
+                with open(icon, "rb") as f:
+                    return "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
+        return None
+
+    def hibernate(self, name: str, status: Optional[dict] = None):
+        """Arrête le serveur et prend son port avec un listener de veille."""
+        status = status or {}
+        _, port, _ = self.srv_mgr.get_ping_target(name)
+        logger.info(f"[HIBERNATION] {name} inactif: mise en veille (port {port})")
+        self.srv_mgr.stop(name)
+        self.srv_mgr._wait_port_free(name, timeout=15)
+        listener = SleepingListener(
+            name, port, self.wake,
+            version=status.get("mc_version"),
+            max_players=status.get("max_players") or 20,
+            favicon=self._favicon(name),
+        )
+        try:
+            self._bind(listener)
+        except Exception as e:
+            # Serveur arrêté et personne sur le port: on le relance plutôt que de le laisser injoignable
+            logger.error(f"[HIBERNATION] Port {port} de {name} non repris ({e}), redémarrage du serveur")
+            self._idle_since.pop(name, None)
+            self.srv_mgr.start(name)
+            raise
+        with self._lock:
+            self._listeners[name] = listener
+        self._idle_since.pop(name, None)
+        self._save()
+        self.srv_mgr.webhook_mgr.dispatch("server.hibernated", {"server": name})
+
+    @staticmethod
+    def _bind(listener: SleepingListener):
+        """Démarre le listener, en réessayant tant que le port n'est pas libéré."""
+        for attempt in range(BIND_ATTEMPTS):
+            try:
+                aio_loop.run(listener.start(), timeout=10)
+                return
+            except OSError:
+                if attempt + 1 == BIND_ATTEMPTS:
+                    raise
+                time.sleep(BIND_RETRY_DELAY)
+
+    def release(self, name: str) -> bool:
+        """Ferme le listener de veille et rend le port (sans démarrer le serveur)."""
+        with self._lock:
+            listener = self._listeners.pop(name, None)
+        if listener is None:
+            return False
+        try:
+            aio_loop.run(listener.close(), timeout=10)
+        finally:
+            self._save()
+        return True
+
+    def wake(self, name: str):
+        """Rend le port puis démarre le serveur (hors de la boucle asyncio).
+
+        Les handshakes suivants, tant que le démarrage est en cours, sont ignorés.
+        """
+        with self._lock:
+            if name not in self._listeners or name in self._waking:
+                return
+            self._waking.add(name)
+
+        def _start():
+            try:
+                # start() libère lui-même le port via release()
+                self.srv_mgr.start(name)
+                logger.info(f"[HIBERNATION] {name} réveillé")
+            except Exception as e:
+                logger.error(f"[HIBERNATION] Réveil de {name} impossible: {e}")
+            finally:
+                with self._lock:
+                    self._waking.discard(name)
+
+        threading.Thread(target=_start, daemon=True, name=f"wake-{name}").start()
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+    def _save(self):
+        with self._lock:
+            data = {name: {"port": l.port, "version": l.version, "max_players": l.max_players}
+                    for name, l in self._listeners.items()}
+        try:
+            atomic_write(self.state_file, json.dumps(data, indent=2))
+        except OSError as e:
+            logger.warning(f"[HIBERNATION] Sauvegarde de l'état impossible: {e}")
+
+    def _restore(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, info in data.items():
+            if self.srv_mgr.is_running(name):
+                continue
+            listener = SleepingListener(name, info["port"], self.wake, info.get("version"),
+                                        info.get("max_players") or 20, self._favicon(name))
+            try:
+                self._bind(listener)
+            except Exception as e:
+                logger.warning(f"[HIBERNATION] Listener de {name} non restauré: {e}")
+                continue
+            with self._lock:
+                self._listeners[name] = listener
+        self._save()
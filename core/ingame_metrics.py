@@ -0,0 +1,183 @@
+"""
+Collecte des métriques en jeu exposées par l'exporteur Prometheus des
+conteneurs (ENABLE_PROMETHEUS_EXPORTER, port 9225 par défaut).
+
+Les endpoints de tous les serveurs en ligne sont interrogés en parallèle à
+intervalle fixe, dans un budget de temps global: un serveur qui ne répond pas
+à temps est simplement ignoré pour ce tour. Les dernières valeurs (TPS, MSPT,
+chunks chargés, entités, joueurs) sont fusionnées par le FleetStatsCollector
+avec CPU / RAM dans le même point d'historique.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Optional
+
+import requests
+
+from core.docker_api import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+EXPORTER_PORT = int(os.getenv("MC_EXPORTER_PORT", "9225"))
+INGAME_INTERVAL = float(os.getenv("MC_EXPORTER_INTERVAL", "15"))
+INGAME_BUDGET = float(os.getenv("MC_EXPORTER_BUDGET", "5"))
+
+# mc_tps 19.98 / mc_entities_total{world="world",type="zombie",...} 12
+_LINE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+([-+0-9.eEinfNa]+)")
+
+
+def parse_exporter(text: str) -> dict:
+    """Extrait les métriques utiles du format texte Prometheus.
+
+    Les séries étiquetées (par monde, par type d'entité) sont sommées.
+    """
+    sums: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.group(1), m.group(2) or "", m.group(3)
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        if value != value:
+            continue
+        # mc_players_total compte aussi les joueurs déjà venus (state="offline")
+        if name == "mc_players_total" and 'state="offline"' in labels:
+            continue
+        sums[name] = sums.get(name, 0.0) + value
+
+    result = {}
+    if "mc_tps" in sums:
+        result["tps"] = round(min(sums["mc_tps"], 20.0), 2)
+    # Durée de tick exposée en nanosecondes
+    for key in ("mc_tick_duration_average", "mc_tick_duration_median"):
+        if key in sums:
+            result["mspt"] = round(sums[key] / 1_000_000, 2)
+            break
+    if "mc_loaded_chunks_total" in sums:
+        result["loaded_chunks"] = int(sums["mc_loaded_chunks_total"])
+    if "mc_entities_total" in sums:
+        result["entities"] = int(sums["mc_entities_total"])
+    for key in ("mc_players_online_total", "mc_players_total"):
+        if key in sums:
+            result["players_online"] = int(sums[key])
+            break
+    return result
+
+
+class InGameMetricsScraper:
+    """Interroge les exporteurs en jeu de toute la flotte en parallèle."""
+
+    def __init__(self, fleet_stats, interval: float = INGAME_INTERVAL, budget: float = INGAME_BUDGET,
+                 port: int = EXPORTER_PORT, max_workers: int = 16):
+        self.fleet_stats = fleet_stats
+        self.interval = interval
+        self.budget = budget
+        self.port = port
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingame-scrape")
+        self._session = requests.Session()
+        self._addresses: Dict[str, str] = {}
+        self._latest: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="ingame-metrics")
+        self._thread.start()
+        logger.info("[METRICS] Collecte des métriques en jeu démarrée")
+
+    def stop(self):
+        self._running = False
+
+    def _loop(self):
+        while self._running:
+            started = time.monotonic()
+            try:
+                self.scrape_all()
+            except Exception as e:
+                logger.error(f"[METRICS] Erreur collecte en jeu: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 1.0))
+
+    # ------------------------------------------------------------------
+    # Résolution et scrape
+    # ------------------------------------------------------------------
+    def _address(self, server: str) -> Optional[str]:
+        """IP du conteneur sur son réseau Docker (mise en cache)."""
+        addr = self._addresses.get(server)
+        if addr:
+            return addr
+        client = get_docker_client()
+        if not client or not client.available():
+            return None
+        try:
+            info = client.inspect_container(f"mc-{server}")
+        except Exception:
+            return None
+        if not info:
+            return None
+        networks = (info.get("NetworkSettings") or {}).get("Networks") or {}
+        for net in networks.values():
+            if net.get("IPAddress"):
+                self._addresses[server] = net["IPAddress"]
+                return net["IPAddress"]
+        return None
+
+    def _scrape(self, server: str, timeout: float) -> Optional[dict]:
+        addr = self._address(server)
+        if not addr:
+            return None
+        try:
+            resp = self._session.get(f"http://{addr}:{self.port}/metrics", timeout=timeout)
+            resp.raise_for_status()
+        except requests.RequestException:
+            # Le conteneur a pu changer d'IP (recréé): nouvelle résolution au prochain tour
+            self._addresses.pop(server, None)
+            return None
+        return parse_exporter(resp.text)
+
+    def scrape_all(self) -> Dict[str, dict]:
+        servers = list(self.fleet_stats.snapshot().keys())
+        if not servers:
+            return {}
+        deadline = time.monotonic() + self.budget
+        futures = {self._pool.submit(self._scrape, s, min(self.budget, 3.0)): s for s in servers}
+        done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        for f in not_done:
+            f.cancel()
+        now = time.time()
+        results = {}
+        for f in done:
+            try:
+                data = f.result()
+            except Exception:
+                data = None
+            if data:
+                data["scraped_at"] = now
+                results[futures[f]] = data
+        with self._lock:
+            self._latest.update(results)
+            for gone in [s for s in self._latest if s not in futures]:
+                del self._latest[gone]
+        if not_done:
+            logger.debug(f"[METRICS] {len(not_done)} exporteur(s) hors budget ({self.budget}s)")
+        return results
+
+    def latest(self, server: str) -> Optional[dict]:
+        """Dernières valeurs en jeu si elles datent de moins de 3 intervalles."""
+        with self._lock:
+            data = self._latest.get(server)
+        if not data or time.time() - data["scraped_at"] > self.interval * 3:
+            return None
+        return {k: v for k, v in data.items() if k != "scraped_at"}
@@ -23,7 +23,8 @@ class Job:
 class JobManager:
     def __init__(self):
         self.jobs: Dict[str, Job] = {}
-        self.lock = threading.Lock()
+        # Réentrant: cancel_job journalise en tenant le verrou
+        self.lock = threading.RLock()
 
     def create_job(self, job_type: str, target: Callable[..., Any], *args, **kwargs) -> Job:
         job_id = str(uuid.uuid4())
@@ -61,6 +62,9 @@ class JobManager:
             if len(job.logs) > 1000:
                 job.logs = job.logs[-1000:]
 
+    def log(self, job: Job, message: str):
+        self._append_log(job, message)
+
     def get_job(self, job_id: str) -> Optional[Job]:
         with self.lock:
             return self.jobs.get(job_id)
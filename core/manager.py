@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import platform
@@ -10,12 +11,17 @@ import tarfile
 import yaml
 import logging
 import uuid
+from collections.abc import Mapping
+from types import MappingProxyType
 from typing import List, Dict, Any
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 logger = logging.getLogger(__name__)
 
+# Délai avant de retenter une cible RCON qui n'a pas répondu (secondes)
+RCON_RETRY_AFTER = int(os.getenv("MC_RCON_RETRY_AFTER", "300"))
+
 # Templates de serveurs pré-configurés
 SERVER_TEMPLATES = {
     'vanilla_survival': {
@@ -74,8 +80,29 @@ from datetime import datetime
 import psutil
 import requests
 from core.webhooks import WebhookManager
+from core.registry import ServerRegistry
+from core.metadata_cache import (MetadataCache, parse_json, parse_yaml, parse_properties,
+                                 render_properties, thaw)
+from core.utils import atomic_write
+from core.docker_api import get_docker_client, compute_cpu_percent, memory_usage_bytes
+from core.docker_events import get_state_watcher
+from core.cgroups import get_cgroup_reader
+from core.prom_exporter import timed_backup, timed_lifecycle
+from core.rcon import pooled_command
+from core.clone import COW_MARKER, copy_up, get_clone_engine
+from core.archiver import Archiver, parse_level, write_zip, zip_compress_type
+from core.backup_catalog import BackupCatalog, ManifestRecorder, file_sha256
+from core.backup_store import BACKUP_FORMATS, get_backup_store, iter_backup_files, iter_prunable_files
 
 class ServerManager:
+    DEFAULT_CONFIG = {
+        "ram_min": "1G",
+        "ram_max": "2G",
+        "java_path": "java",
+        "extra_args": [],
+        "auto_restart": False
+    }
+
     def __init__(self, base_dir="servers"):
         # base_dir représente le dossier racine sous lequel seront créés
         # des sous-dossiers par utilisateur. Exemple :
@@ -88,6 +115,27 @@ class ServerManager:
         self.log_files = {}
         self.java_dir = os.path.join(self.base_dir, "_java")
         self.webhook_mgr = WebhookManager()
+        # Cache des fichiers de config parsés, validé par (taille, mtime_ns)
+        self.meta_cache = MetadataCache()
+        self._merged_configs = {}  # {path: (vue config brute, vue fusionnée)}
+        self._default_config_view = MappingProxyType(dict(self.DEFAULT_CONFIG))
+        # Index en mémoire des serveurs (évite de parcourir base_dir à chaque appel)
+        self.registry = ServerRegistry(self.base_dir, config_loader=self._registry_config)
+        self.registry.build()
+        # Dernier échantillon CPU (total_usage, system_cpu_usage) par conteneur
+        self._cpu_samples = {}
+        # Table d'état des conteneurs alimentée par les événements Docker (démarrée par main)
+        self.state_watcher = get_state_watcher()
+        self.cgroups = get_cgroup_reader()
+        # Veille des serveurs inactifs (HibernationManager, branché par main)
+        self.hibernation = None
+        # Pool de serveurs pré-chauffés (WarmPool, branché par main)
+        self.warm_pool = None
+        # Cibles RCON injoignables récemment: {nom: (cible, instant de l'échec)}
+        self._rcon_failures = {}
+        # Catalogue indexé des sauvegardes (base SQLite du panel)
+        self.backup_catalog = BackupCatalog(self)
+        self._cleanup_freeze_dirs()
 
     def set_user(self, username: str | None):
         """Indique au manager le nom d'utilisateur courant.
@@ -287,32 +335,17 @@ class ServerManager:
         """
         name = self._validate_name(name)
 
-        # Première tentative : dossier de l'utilisateur courant
         if self.current_user and self.current_user != "admin":
-            candidate = os.path.join(self.base_dir, self.current_user, name)
-            if os.path.exists(candidate):
-                path = candidate
-            else:
-                # si on est en cours de création, on utilisera ce chemin
-                path = candidate
+            # dossier de l'utilisateur courant (aussi utilisé en cours de création)
+            path = os.path.join(self.base_dir, self.current_user, name)
         else:
-            # admin ou pas d'utilisateur défini : chercher globalement
-            # vérifie d'abord à la racine
-            candidate = os.path.join(self.base_dir, name)
-            if os.path.exists(candidate):
-                path = candidate
-            else:
-                # rechercher dans tous les sous-dossiers
-                found = None
-                try:
-                    for u in os.listdir(self.base_dir):
-                        p = os.path.join(self.base_dir, u, name)
-                        if os.path.exists(p):
-                            found = p
-                            break
-                except Exception:
-                    pass
-                path = found if found else candidate
+            # admin ou pas d'utilisateur défini : lookup dans le registre
+            entry = self.registry.get(name)
+            if entry is None:
+                # serveur créé hors du panel depuis la dernière réconciliation ?
+                self.registry.reconcile()
+                entry = self.registry.get(name)
+            path = entry.path if entry else os.path.join(self.base_dir, name)
 
         # Protection path traversal relative à base_dir
         if not os.path.abspath(path).startswith(os.path.abspath(self.base_dir)):
@@ -326,54 +359,8 @@ class ServerManager:
         `base_dir/<username>` contient ses serveurs. Un admin lit tous les
         serveurs.
         """
-        if not os.path.exists(self.base_dir):
-            return []
-
-        servers = []
-
-        def inspect_dir(full_path, name):
-            is_server = (
-                os.path.exists(os.path.join(full_path, "server.jar")) or
-                os.path.exists(os.path.join(full_path, "manager_config.json")) or
-                os.path.exists(os.path.join(full_path, "docker-compose.yml"))
-            )
-            if not is_server:
-                return
-            # filtre propriétaire
-            if owner and owner != "admin":
-                config_path = os.path.join(full_path, "manager_config.json")
-                if os.path.exists(config_path):
-                    try:
-                        with open(config_path, "r") as f:
-                            conf = json.load(f)
-                            if conf.get("owner") != owner:
-                                return
-                    except:
-                        return
-                # if there's no config file we assume the directory structure
-                # (e.g. base_dir/owner/name) already guarantees correct owner
-            servers.append(name)
-
-        # Scenario 1: utilisateur spécifique
-        if owner and owner != "admin":
-            base = os.path.join(self.base_dir, owner)
-            if os.path.isdir(base):
-                for d in os.listdir(base):
-                    inspect_dir(os.path.join(base, d), d)
-            return servers
-
-        # Scenario 2: admin ou sans filtrage -> parcourir base et ses premiers niveaux
-        for entry in os.listdir(self.base_dir):
-            full = os.path.join(self.base_dir, entry)
-            if os.path.isdir(full):
-                # peut-être un serveur à la racine
-                inspect_dir(full, entry)
-                # ou un dossier utilisateur
-                for sub in os.listdir(full):
-                    subfull = os.path.join(full, sub)
-                    if os.path.isdir(subfull):
-                        inspect_dir(subfull, sub)
-        return servers
+        self.registry.reconcile()
+        return [entry.name for entry in self.registry.list(owner)]
 
     def get_available_versions(self):
         """Récupère les versions Paper avec cache persistant (24h) + fallback"""
@@ -731,9 +718,12 @@ class ServerManager:
         
         with requests.get(url, stream=True, timeout=120) as r:
             r.raise_for_status()
-            with open(jar_path, "wb") as f:
+            # Fichier temporaire puis remplacement: un server.jar partagé par
+            # lien physique avec un clone n'est jamais réécrit sur place
+            with open(jar_path + ".part", "wb") as f:
                 for chunk in r.iter_content(8192):
                     f.write(chunk)
+        os.replace(jar_path + ".part", jar_path)
         
         return True
 
@@ -792,9 +782,10 @@ class ServerManager:
         try:
             with requests.get(url, stream=True, timeout=120) as r:
                 r.raise_for_status()
-                with open(jar_path, "wb") as f:
+                with open(jar_path + ".part", "wb") as f:
                     for chunk in r.iter_content(8192):
                         f.write(chunk)
+            os.replace(jar_path + ".part", jar_path)
             return True
         except Exception as e:
             # Fallback: use quilt installer
@@ -829,75 +820,62 @@ class ServerManager:
 
     def find_server_by_id(self, server_id):
         """Trouve un serveur par son ID unique"""
-        servers = self.list_servers()
-        for s in servers:
-            try:
-                cfg = self.get_server_config(s['name'])
-                if str(cfg.get('id', '')) == str(server_id):
-                    return s['name']
-            except:
-                continue
-        return None
+        entry = self.registry.find_by_id(server_id)
+        if entry is None:
+            self.registry.reconcile()
+            entry = self.registry.find_by_id(server_id)
+        return entry.name if entry else None
 
-    def get_server_config(self, name):
-        """Récupère la configuration personnalisée du serveur"""
+    def _load_config_view(self, path):
+        """Vue figée de manager_config.json (None si absent), via le cache."""
+        return self.meta_cache.load(os.path.join(path, "manager_config.json"), parse_json)
+
+    def _load_compose_view(self, path):
+        """Vue figée de docker-compose.yml (None si absent), via le cache."""
+        return self.meta_cache.load(os.path.join(path, "docker-compose.yml"), parse_yaml)
+
+    def _registry_config(self, path):
+        """Loader du registre: réutilise le cache de métadonnées."""
+        return self._load_config_view(path)
+
+    def get_server_config_view(self, name):
+        """Configuration fusionnée en lecture seule (aucune I/O si inchangée).
+
+        À privilégier sur les chemins chauds; utiliser `get_server_config`
+        pour obtenir une copie modifiable avant `save_server_config`.
+        """
         path = self._get_server_path(name)
-        config_path = os.path.join(path, "manager_config.json")
-        default_config = {
-            "ram_min": "1G",
-            "ram_max": "2G",
-            "java_path": "java",
-            "extra_args": [],
-            "auto_restart": False
-        }
-        try:
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, "r", encoding="utf-8") as f:
-                        raw = f.read()
-                    logger.debug(f"get_server_config: raw content of {config_path}: {raw}")
-                    if not raw.strip():
-                        # empty file, rewrite default and avoid JSON error
-                        logger.warning(f"Empty config file for {name}, recreating default")
-                        config = {}
-                        with open(config_path, "w", encoding="utf-8") as f:
-                            json.dump(default_config, f, indent=2)
-                    else:
-                        config = json.loads(raw)
-                except json.JSONDecodeError as jde:
-                    logger.warning(f"Erreur parsing JSON {config_path}: {jde}; resetting to default")
-                    config = {}
-                    try:
-                        with open(config_path, "w", encoding="utf-8") as f:
-                            json.dump(default_config, f, indent=2)
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.warning(f"Erreur lecture de {config_path}: {e}")
-                    config = {}
+        conf = self._load_config_view(path)
+        if conf is None:
+            return self._default_config_view
+        cached = self._merged_configs.get(path)
+        if cached and cached[0] is conf:
+            return cached[1]
+        merged = {**self.DEFAULT_CONFIG, **conf}
+        # Auto-detect server type if missing
+        if "server_type" not in conf:
+            merged["server_type"] = self.detect_server_type(name)
+        view = MappingProxyType(merged)
+        self._merged_configs[path] = (conf, view)
+        return view
 
-                # Auto-detect server type if missing
-                if "server_type" not in config:
-                    config["server_type"] = self.detect_server_type(name)
-                
-                merged = {**default_config, **config}
-                logger.debug(f"get_server_config parsed {name}: {merged}")
-                return merged
+    def get_server_config(self, name):
+        """Récupère la configuration personnalisée du serveur (copie modifiable)"""
+        try:
+            return thaw(self.get_server_config_view(name))
         except Exception as e:
             logger.warning(f"Erreur lecture config {name}: {e}")
-        return default_config
+        return thaw(self._default_config_view)
 
     def get_compose_metadata(self, name) -> dict:
         """Lit les variables d'environnement dans docker-compose.yml et renvoie
         un dictionnaire extrait (version, server_type, loader_version, forge_version).
         """
         path = self._get_server_path(name)
-        compose_path = os.path.join(path, "docker-compose.yml")
-        if not os.path.exists(compose_path):
+        data = self._load_compose_view(path)
+        if not data:
             return {}
         try:
-            with open(compose_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
             env = data.get("services", {}).get("mc", {}).get("environment", {})
             meta = {}
             def handle(k, v):
@@ -910,10 +888,10 @@ class ServerManager:
                     meta["loader_version"] = v
                 elif k == "FORGE_VERSION":
                     meta["forge_version"] = v
-            if isinstance(env, dict):
+            if isinstance(env, Mapping):
                 for k, v in env.items():
                     handle(k, v)
-            elif isinstance(env, list):
+            elif isinstance(env, tuple):
                 for item in env:
                     if isinstance(item, str) and "=" in item:
                         k, v = item.split("=", 1)
@@ -1001,12 +979,14 @@ class ServerManager:
         return "paper"
 
     def save_server_config(self, name, config):
-        """Sauvegarde la configuration du serveur"""
+        """Sauvegarde la configuration du serveur (écriture atomique)"""
         path = self._get_server_path(name)
         config_path = os.path.join(path, "manager_config.json")
         try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump(config, f, indent=2)
+            rendered = json.dumps(config, indent=2)
+            atomic_write(config_path, rendered)
+            self.meta_cache.put(config_path, parse_json(rendered, config_path))
+            self.registry.refresh(path)
             try:
                 # Log a concise debug summary for tracing who/when overwrites config
                 snippet = json.dumps(config, ensure_ascii=False)
@@ -1049,66 +1029,13 @@ class ServerManager:
             s.bind(('', 0))
             return s.getsockname()[1]
 
-    def create_server(self, name, version, ram_min="1G", ram_max="2G", cpu_limit=None, storage_limit=None, base_path=None, server_type="paper", loader_version=None, forge_version=None, owner="admin", port=None):
-        """Crée un nouveau serveur Docker (ou réutilise un répertoire "stale")."""
-        # Utiliser le base_path personnalisé si fourni (ne bypass pas le schéma
-        # utilisateur). Le chemin final prend en compte le propriétaire.
-        if base_path:
-            server_base = os.path.abspath(base_path)
-            os.makedirs(server_base, exist_ok=True)
-        else:
-            # le dossier parent doit être celui de l'owner
-            if owner and owner != "admin":
-                server_base = os.path.join(self.base_dir, owner)
-            else:
-                server_base = self.base_dir
-            os.makedirs(server_base, exist_ok=True)
-        
-        # Valider et déterminer le chemin du serveur
-        name = self._validate_name(name)
-        path = os.path.join(server_base, name)
-        
-        if os.path.exists(path):
-            # Le dossier existe déjà, vérifier s'il s'agit d'un serveur actif
-            markers = ["docker-compose.yml", "manager_config.json", "server.jar"]
-            if any(os.path.exists(os.path.join(path, m)) for m in markers):
-                raise Exception("Ce nom existe déjà")
-            # sinon c'est un répertoire "stale" sans configuration, on le réutilise
-        else:
-            os.makedirs(path)
-        data_dir = os.path.join(path, "data")
-        os.makedirs(data_dir)
-        
-        # Création des dossiers mods/plugins pour que l'utilisateur puisse les voir vide
-        os.makedirs(os.path.join(data_dir, "plugins"), exist_ok=True)
-        os.makedirs(os.path.join(data_dir, "mods"), exist_ok=True)
-
-        logger.info(f"Configuration Docker pour {server_type.title()} {version}...")
-        
-        # Allocation port
-        if port:
-            try:
-                port = int(port)
-                if self._is_port_in_use(port):
-                    logger.warning(f"Port {port} spécifié est déjà utilisé. Recherche d'un autre port...")
-                    port = None
-            except:
-                port = None
-
-        if not port:
-            port = 25565
-            for p in range(25565, 25700):
-                if not self._is_port_in_use(p):
-                    port = p
-                    break
-        
+    def build_compose(self, name, version, server_type, port, owner, server_id, ram_min="1G", ram_max="2G",
+                      cpu_limit=None, loader_version=None, forge_version=None):
+        """docker-compose.yml d'un serveur itzg/minecraft-server (dict)."""
         # UID/GID pour permissions
         uid = os.getuid()
         gid = os.getgid()
         
-        # Generer ID Unique
-        self.server_id = str(uuid.uuid4())[:8]
-
         # Configuration Docker Compose
         compose_config = {
             # 'version' key is no longer required and triggers a warning in newer
@@ -1123,7 +1050,7 @@ class ServerManager:
                     "labels": {
                         "com.mcpanel.owner": owner,
                         "com.mcpanel.server": name,
-                        "com.mcpanel.id": self.server_id
+                        "com.mcpanel.id": server_id
                     },
                     "security_opt": ["no-new-privileges:true"],
                     "cap_drop": ["ALL"],
@@ -1144,7 +1071,9 @@ class ServerManager:
                         "INIT_MEMORY": ram_min,
                         "UID": str(uid),
                         "GID": str(gid),
-                        "TZ": "Europe/Paris"
+                        "TZ": "Europe/Paris",
+                        # Métriques en jeu (TPS, MSPT, chunks, entités) lues par le panel sur le port 9225
+                        "ENABLE_PROMETHEUS_EXPORTER": "true"
                     },
                     "volumes": [
                         "./data:/data"
@@ -1177,10 +1106,75 @@ class ServerManager:
              compose_config["services"]["mc"]["environment"]["FORGE_VERSION"] = forge_version
         elif server_type == "fabric" and loader_version:
              compose_config["services"]["mc"]["environment"]["FABRIC_LOADER_VERSION"] = loader_version
+
+        return compose_config
+
+    def create_server(self, name, version, ram_min="1G", ram_max="2G", cpu_limit=None, storage_limit=None, base_path=None, server_type="paper", loader_version=None, forge_version=None, owner="admin", port=None):
+        """Crée un nouveau serveur Docker (ou réutilise un répertoire "stale")."""
+        # Utiliser le base_path personnalisé si fourni (ne bypass pas le schéma
+        # utilisateur). Le chemin final prend en compte le propriétaire.
+        if base_path:
+            server_base = os.path.abspath(base_path)
+            os.makedirs(server_base, exist_ok=True)
+        else:
+            # le dossier parent doit être celui de l'owner
+            if owner and owner != "admin":
+                server_base = os.path.join(self.base_dir, owner)
+            else:
+                server_base = self.base_dir
+            os.makedirs(server_base, exist_ok=True)
+        
+        # Valider et déterminer le chemin du serveur
+        name = self._validate_name(name)
+        path = os.path.join(server_base, name)
+        
+        prewarmed = False
+        if os.path.exists(path):
+            # Le dossier existe déjà, vérifier s'il s'agit d'un serveur actif
+            markers = ["docker-compose.yml", "manager_config.json", "server.jar"]
+            if any(os.path.exists(os.path.join(path, m)) for m in markers):
+                raise Exception("Ce nom existe déjà")
+            # sinon c'est un répertoire "stale" sans configuration, on le réutilise
+        elif self.warm_pool is not None and not (loader_version or forge_version):
+            # Dossier pré-chauffé: image tirée, jar et librairies déjà téléchargés
+            prewarmed = self.warm_pool.claim(server_type, version, path)
+        data_dir = os.path.join(path, "data")
+        if not prewarmed:
+            os.makedirs(data_dir, exist_ok=True)
+        
+        # Création des dossiers mods/plugins pour que l'utilisateur puisse les voir vide
+        os.makedirs(os.path.join(data_dir, "plugins"), exist_ok=True)
+        os.makedirs(os.path.join(data_dir, "mods"), exist_ok=True)
+
+        logger.info(f"Configuration Docker pour {server_type.title()} {version}...")
+        
+        # Allocation port
+        if port:
+            try:
+                port = int(port)
+                if self._is_port_in_use(port):
+                    logger.warning(f"Port {port} spécifié est déjà utilisé. Recherche d'un autre port...")
+                    port = None
+            except:
+                port = None
+
+        if not port:
+            port = 25565
+            for p in range(25565, 25700):
+                if not self._is_port_in_use(p):
+                    port = p
+                    break
+        
+        # Generer ID Unique
+        self.server_id = str(uuid.uuid4())[:8]
+
+        compose_config = self.build_compose(name, version, server_type, port, owner, self.server_id,
+                                             ram_min, ram_max, cpu_limit, loader_version, forge_version)
         
         # Écriture du docker-compose.yml
-        with open(os.path.join(path, "docker-compose.yml"), "w") as f:
-            yaml.dump(compose_config, f)
+        self._write_compose(path, compose_config)
+        # Le dossier est désormais un serveur: l'indexer avant toute résolution par nom
+        self.registry.refresh(path)
 
         # Si l'utilisateur a demandé un serveur Forge/Fabric, nous téléchargeons
         # aussi le jar correspondant pour garantir que le dossier ressemble à un
@@ -1218,8 +1212,12 @@ class ServerManager:
         if forge_version:
             config["forge_version"] = forge_version
         
+        if prewarmed:
+            config["prewarmed"] = True
+        
         self.save_server_config(name, config)
-        logger.info(f"Serveur {name} créé avec succès (Port: {port})")
+        logger.info(f"Serveur {name} créé avec succès (Port: {port}{', pré-chauffé' if prewarmed else ''})")
+        return config
 
     # Ancienne methode de download supprimee/remplacee par Docker qui gere tout
 
@@ -1251,11 +1249,83 @@ class ServerManager:
         except Exception:
             return False
 
+    def clone_server(self, name, new_name, owner=None):
+        """Clone un serveur sous un nouveau nom (copy-on-write, voir core/clone.py).
+
+        Le clone reçoit un nouvel id, un port libre, son propre conteneur
+        (nom + labels) et *owner* comme propriétaire (celui de la source par
+        défaut). Retourne les compteurs du clonage.
+        """
+        src = self._get_server_path(name)
+        if not os.path.exists(src):
+            raise Exception("Serveur source non trouvé")
+        new_name = self._validate_name(new_name)
+        src_config = self.get_server_config(name)
+        owner = owner or src_config.get("owner") or "admin"
+        dst_base = os.path.join(self.base_dir, owner) if owner != "admin" else self.base_dir
+        dst = os.path.join(dst_base, new_name)
+        if os.path.exists(dst) or self.registry.get(new_name) is not None:
+            raise Exception("Un serveur avec ce nom existe déjà")
+        os.makedirs(dst_base, exist_ok=True)
+
+        # Source en ligne: monde flushé et sauvegardes suspendues pendant le clonage
+        running = self.is_running(name)
+        if running:
+            try:
+                self.send_rcon(name, "save-all flush", timeout=60)
+                self.send_rcon(name, "save-off")
+            except Exception as e:
+                logger.warning(f"Sauvegarde de {name} non suspendue avant clonage: {e}")
+        try:
+            stats = get_clone_engine().clone_tree(src, dst, share_mutable=not running)
+        finally:
+            if running:
+                try:
+                    self.send_rcon(name, "save-on")
+                except Exception:
+                    logger.debug(f"save-on impossible sur {name}", exc_info=True)
+
+        server_id = str(uuid.uuid4())[:8]
+        port = self.find_available_port()
+        compose = self._load_compose_view(dst)
+        if compose:
+            compose = thaw(compose)
+            service = compose["services"]["mc"]
+            service["container_name"] = f"mc-{new_name}"
+            service.setdefault("labels", {}).update({
+                "com.mcpanel.owner": owner,
+                "com.mcpanel.server": new_name,
+                "com.mcpanel.id": server_id,
+            })
+            service["ports"] = [f"{port}:25565" if str(m).rpartition(":")[2].split("/")[0] == "25565" else m
+                                for m in service.get("ports", [])] or [f"{port}:25565"]
+            self._write_compose(dst, compose)
+        else:
+            props_path = os.path.join(dst, "server.properties")
+            if os.path.exists(props_path):
+                props = dict(self.meta_cache.load(props_path, parse_properties) or {})
+                props["server-port"] = str(port)
+                atomic_write(props_path, render_properties(props))
+
+        self.registry.refresh(dst)
+        config = {k: v for k, v in src_config.items() if k not in ("hostnames", "hibernate_after", "prewarmed")}
+        config.update({
+            "id": server_id,
+            "port": port,
+            "owner": owner,
+            "created_at": datetime.now().isoformat(),
+            "cloned_from": name,
+        })
+        self.save_server_config(new_name, config)
+        logger.info(f"Serveur {name} cloné en {new_name} (port {port}): {stats}")
+        return {"name": new_name, "port": port, **stats}
+
     def rename_server(self, old_name, new_name):
         """Renomme un serveur (Dossier + Conteneur + Config)"""
         old_path = self._get_server_path(old_name)
         new_name = self._validate_name(new_name)
-        new_path = os.path.join(self.base_dir, new_name)
+        # Le serveur reste dans le dossier de son propriétaire
+        new_path = os.path.join(os.path.dirname(old_path), new_name)
 
         if os.path.exists(new_path):
             raise Exception(f"Le nom '{new_name}' est déjà utilisé.")
@@ -1273,23 +1343,23 @@ class ServerManager:
         except Exception as e:
             logger.error(f"Erreur renommage dossier: {e}")
             raise Exception(f"Impossible de renommer le dossier: {e}")
+        self.registry.remove(old_path)
+        self.registry.refresh(new_path)
+        self._forget_metadata(old_path)
 
         # 3. Mettre à jour docker-compose.yml si Docker
         compose_path = os.path.join(new_path, "docker-compose.yml")
         if os.path.exists(compose_path):
             try:
-                with open(compose_path, "r") as f:
-                    compose = yaml.safe_load(f)
+                compose = thaw(self._load_compose_view(new_path))
                 
                 # Update container name and labels
                 compose["services"]["mc"]["container_name"] = f"mc-{new_name}"
                 compose["services"]["mc"]["labels"]["com.mcpanel.server"] = new_name
                 
-                with open(compose_path, "w") as f:
-                    compose.pop("version", None)
-                    # remove obsolete version key to avoid warning
-                    compose.pop("version", None)
-                    yaml.dump(compose, f)
+                # remove obsolete version key to avoid warning
+                compose.pop("version", None)
+                self._write_compose(new_path, compose)
             except Exception as e:
                 logger.warning(f"Erreur mise à jour compose pour renommage: {e}")
 
@@ -1312,24 +1382,48 @@ class ServerManager:
         elif action == "stop":
             self.stop(name)
         elif action == "restart":
-            # Optimisation: Utiliser le restart natif Docker si disponible
-            path = self._get_server_path(name)
-            if os.path.exists(os.path.join(path, "docker-compose.yml")):
-                self.webhook_mgr.dispatch("server.restarting", {"server": name})
-                try:
+            self.restart(name)
+        elif action == "kill":
+            self.kill(name)
+
+    @timed_lifecycle("restart")
+    def restart(self, name):
+        # Optimisation: Utiliser le restart natif Docker si disponible
+        path = self._get_server_path(name)
+        if os.path.exists(os.path.join(path, COW_MARKER)):
+            # Régions encore partagées avec un clone: le restart natif
+            # démarrerait le conteneur sans copy-up, start() s'en charge
+            self.stop(name)
+            self._wait_port_free(name)
+            self.start(name)
+        elif os.path.exists(os.path.join(path, "docker-compose.yml")):
+            self.webhook_mgr.dispatch("server.restarting", {"server": name})
+            try:
+                api = self._docker_api()
+                if api:
+                    api.restart(f"mc-{name}")
+                else:
                     self._run_compose(["restart"], cwd=path, check=True)
-                    logger.info(f"Serveur {name} redémarré (Docker Native)")
-                except Exception as e:
-                    logger.error(f"Restart Docker échoué, fallback sur stop/start: {e}")
-                    self.stop(name)
-                    time.sleep(2)
-                    self.start(name)
-            else:
+                logger.info(f"Serveur {name} redémarré (Docker Native)")
+            except Exception as e:
+                logger.error(f"Restart Docker échoué, fallback sur stop/start: {e}")
                 self.stop(name)
-                time.sleep(3)
+                self._wait_port_free(name)
                 self.start(name)
-        elif action == "kill":
-            self.kill(name)
+        else:
+            self.stop(name)
+            self._wait_port_free(name)
+            self.start(name)
+
+    def _wait_port_free(self, name, timeout=5.0):
+        """Attend la libération du port de jeu après un arrêt (au lieu d'un délai fixe)."""
+        try:
+            _, port, _ = self.get_ping_target(name)
+        except Exception:
+            return
+        deadline = time.monotonic() + timeout
+        while self._is_port_in_use(port) and time.monotonic() < deadline:
+            time.sleep(0.2)
 
     def _is_port_in_use(self, port):
         """Vérifie si un port est déjà utilisé"""
@@ -1355,6 +1449,17 @@ class ServerManager:
                 logger.debug(f"Échec démarrage docker avec {cmd}: {e}")
         return False
 
+    def _docker_api(self):
+        """Client de l'API Docker (socket unix) s'il répond, sinon None.
+
+        Les méthodes de cycle de vie et de statut l'utilisent en priorité et
+        se replient sur le CLI `docker` / `docker compose` en son absence.
+        """
+        client = get_docker_client()
+        if client and client.available():
+            return client
+        return None
+
     def _run_compose(self, args, cwd=None, **kwargs):
         """Execute une commande Docker Compose en essayant
         d'abord `docker compose` puis, en cas d'erreur, la
@@ -1394,6 +1499,7 @@ class ServerManager:
             raise last_exc
         return subprocess.CompletedProcess(commands[-1], 0)
 
+    @timed_lifecycle("start")
     def start(self, name):
         """Démarre un serveur (Docker ou Legacy)"""
         self.webhook_mgr.dispatch("server.starting", {"server": name})
@@ -1401,6 +1507,9 @@ class ServerManager:
         path = self._get_server_path(name)
         if not os.path.exists(path):
             raise Exception(f"Le serveur '{name}' n'existe pas")
+        self._release_hibernation(name)
+        # Clone récent: régions encore partagées par lien physique avec un autre serveur
+        copy_up(path)
             
         # 1. Mode Docker (Prioritaire)
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
@@ -1416,7 +1525,18 @@ class ServerManager:
                     os.makedirs(os.path.join(data_dir, "plugins"), exist_ok=True)
                     os.makedirs(os.path.join(data_dir, "mods"), exist_ok=True)
                 
-                # Up -d
+                # Conteneur déjà créé: simple start via l'API
+                api = self._docker_api()
+                if api:
+                    try:
+                        if api.inspect_container(f"mc-{name}") is not None:
+                            api.start(f"mc-{name}")
+                            logger.info(f"Conteneur démarré pour {name}")
+                            return
+                    except Exception as e:
+                        logger.debug(f"Start API Docker impossible pour {name}, repli compose: {e}")
+                
+                # Up -d (création du conteneur depuis docker-compose.yml)
                 self._run_compose(["up", "-d"], 
                     cwd=path, 
                     check=True,
@@ -1487,13 +1607,22 @@ class ServerManager:
             del self.log_files[name]
             raise Exception(f"Erreur démarrage legacy: {e}")
 
+    @timed_lifecycle("stop")
     def stop(self, name):
         self.webhook_mgr.dispatch("server.stop", {"server": name})
         path = self._get_server_path(name)
+        self._release_hibernation(name)
 
         # 1. Docker
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
             try:
+                api = self._docker_api()
+                if api:
+                    try:
+                        api.stop(f"mc-{name}")
+                        return
+                    except Exception as e:
+                        logger.debug(f"Stop API Docker impossible pour {name}, repli compose: {e}")
                 self._run_compose(["stop"], cwd=path, check=False)
             except Exception as e:
                 logger.warning(f"Erreur stop docker {name}: {e}")
@@ -1504,20 +1633,31 @@ class ServerManager:
             try:
                 self.procs[name].stdin.write("stop\n")
                 self.procs[name].stdin.flush()
-                for _ in range(30):
-                    if self.procs[name].poll() is not None: break
-                    time.sleep(1)
-                else:
+                try:
+                    self.procs[name].wait(timeout=30)
+                except subprocess.TimeoutExpired:
                     self.procs[name].kill()
             except Exception:
                 self.procs[name].kill()
             finally:
                 self._cleanup_process(name)
 
+    def _release_hibernation(self, name):
+        """Rend le port tenu par le listener de veille, le cas échéant."""
+        if self.hibernation is not None and self.hibernation.release(name):
+            logger.info(f"Listener de veille de {name} fermé")
+
     def kill(self, name):
         path = self._get_server_path(name)
         # Docker
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
+            api = self._docker_api()
+            if api:
+                try:
+                    api.kill(f"mc-{name}")
+                    return
+                except Exception as e:
+                    logger.debug(f"Kill API Docker impossible pour {name}, repli compose: {e}")
             self._run_compose(["kill"], cwd=path, check=False)
             return
         
@@ -1541,6 +1681,7 @@ class ServerManager:
     def delete_server(self, name):
         path = self._get_server_path(name)
         if not os.path.exists(path): raise Exception("Serveur introuvable")
+        self._release_hibernation(name)
         
         # Docker Down -v (remove volumes)
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
@@ -1551,14 +1692,26 @@ class ServerManager:
         
         time.sleep(1)
         shutil.rmtree(path, ignore_errors=True)
+        self.registry.remove(path)
+        self._forget_metadata(path)
         logger.info(f"Serveur {name} supprimé")
 
     def is_running(self, name):
         # 1. Check Docker
         path = self._get_server_path(name)
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
-            # Check if container mc-<name> is running
-            # Utilisation simple: docker ps -q -f name=mc-<name>
+            # Lecture mémoire si le flux d'événements est synchronisé
+            running = self.state_watcher.is_running(f"mc-{name}")
+            if running is not None:
+                return running
+            api = self._docker_api()
+            if api:
+                try:
+                    info = api.inspect_container(f"mc-{name}")
+                    return bool(info and info.get("State", {}).get("Running"))
+                except Exception as e:
+                    logger.debug(f"Inspect API Docker impossible pour {name}: {e}")
+            # Repli CLI: docker ps -q -f name=mc-<name>
             try:
                 res = subprocess.run(
                     ["docker", "ps", "-q", "-f", f"name=mc-{name}", "-f", "status=running"],
@@ -1573,42 +1726,64 @@ class ServerManager:
 
     def get_status(self, name):
         """Retourne le statut complet du serveur avec métriques"""
-        is_running = self.is_running(name)
+        path = self._get_server_path(name)
+        is_docker = os.path.exists(os.path.join(path, "docker-compose.yml"))
+
+        # Un seul inspect via l'API pour l'état (au lieu d'un `docker ps` séparé)
+        api = self._docker_api() if is_docker else None
+        is_running = self.state_watcher.is_running(f"mc-{name}") if is_docker else None
+        if api and is_running is None:
+            try:
+                info = api.inspect_container(f"mc-{name}")
+                is_running = bool(info and info.get("State", {}).get("Running"))
+            except Exception as e:
+                logger.debug(f"Inspect API Docker impossible pour {name}: {e}")
+                api = None
+        if is_running is None:
+            is_running = self.is_running(name)
+
         status = {
             "status": "online" if is_running else "offline",
             "running": is_running,
             "cpu": 0, "ram": 0, "ram_mb": 0, "pid": None
         }
-        
-        path = self._get_server_path(name)
+        state = self.state_watcher.get(f"mc-{name}") if is_docker else None
+        if state:
+            status["health"] = state.health
+            status["exit_code"] = state.exit_code
+            status["restart_count"] = state.restart_count
+            status["started_at"] = state.started_at
         
         # Docker Stats
-        if os.path.exists(os.path.join(path, "docker-compose.yml")) and is_running:
-            try:
-                # Docker stats --no-stream --format json
-                res = subprocess.run(
-                    ["docker", "stats", f"mc-{name}", "--no-stream", "--format", "{{.CPUPerc}}|{{.MemUsage}}"],
-                    stdout=subprocess.PIPE, text=True
-                )
-                output = res.stdout.strip()
-                if output:
-                    parts = output.split("|")
-                    if len(parts) == 2:
-                        cpu_str = parts[0].replace('%', '')
-                        mem_str = parts[1].split('/')[0].strip() # "100MiB"
-                        
-                        status["cpu"] = float(cpu_str)
-                        # Parsing rapide mem
-                        if "Gc" in mem_str or "GiB" in mem_str:
-                            val = float(re.sub(r'[a-zA-Z]', '', mem_str)) * 1024
-                        elif "Mc" in mem_str or "MiB" in mem_str:
-                            val = float(re.sub(r'[a-zA-Z]', '', mem_str))
-                        else:
-                            val = 0
-                        status["ram_mb"] = val
+        if is_docker and is_running:
+            # 1. cgroup v2 (lecture de fichiers, quelques µs)
+            cg = self.cgroups.read(f"mc-{name}")
+            if cg:
+                status["cpu"] = cg["cpu_percent"]
+                status["ram_mb"] = round(cg["memory_used"] / 1024 / 1024, 1)
+                status["ram_limit_mb"] = round(cg["memory_limit"] / 1024 / 1024, 1) if cg["memory_limit"] else None
+                status["io_read_bytes"] = cg["io_read_bytes"]
+                status["io_write_bytes"] = cg["io_write_bytes"]
+                status["oom_kills"] = cg["memory_events"]["oom_kill"]
+                status["pid"] = "Docker"
+                return status
+            # 2. API Docker (stats one-shot)
+            if api:
+                try:
+                    stats = api.container_stats(f"mc-{name}")
+                    if stats:
+                        cpu = stats.get("cpu_stats") or {}
+                        status["cpu"] = compute_cpu_percent(stats, self._cpu_samples.get(name))
+                        self._cpu_samples[name] = (
+                            (cpu.get("cpu_usage") or {}).get("total_usage", 0),
+                            cpu.get("system_cpu_usage", 0),
+                        )
+                        status["ram_mb"] = round(memory_usage_bytes(stats) / 1024 / 1024, 1)
                         status["pid"] = "Docker"
-            except Exception as e:
-                logger.debug(f"Err stats docker for {name}: {e}")
+                        return status
+                except Exception as e:
+                    logger.debug(f"Stats API Docker impossible pour {name}: {e}")
+            self._docker_cli_stats(name, status)
             return status
 
         # Legacy Stats
@@ -1624,15 +1799,139 @@ class ServerManager:
                 logger.debug(f"Failed to get legacy stats for {name}", exc_info=True)
         
         return status
+
+    def _docker_cli_stats(self, name, status):
+        """Repli: `docker stats --no-stream` lorsque l'API n'est pas joignable."""
+        try:
+            # Docker stats --no-stream --format json
+            res = subprocess.run(
+                ["docker", "stats", f"mc-{name}", "--no-stream", "--format", "{{.CPUPerc}}|{{.MemUsage}}"],
+                stdout=subprocess.PIPE, text=True
+            )
+            output = res.stdout.strip()
+            if output:
+                parts = output.split("|")
+                if len(parts) == 2:
+                    cpu_str = parts[0].replace('%', '')
+                    mem_str = parts[1].split('/')[0].strip() # "100MiB"
+                    
+                    status["cpu"] = float(cpu_str)
+                    # Parsing rapide mem
+                    if "Gc" in mem_str or "GiB" in mem_str:
+                        val = float(re.sub(r'[a-zA-Z]', '', mem_str)) * 1024
+                    elif "Mc" in mem_str or "MiB" in mem_str:
+                        val = float(re.sub(r'[a-zA-Z]', '', mem_str))
+                    else:
+                        val = 0
+                    status["ram_mb"] = val
+                    status["pid"] = "Docker"
+        except Exception as e:
+            logger.debug(f"Err stats docker for {name}: {e}")
     
+    def get_rcon_target(self, name):
+        """(hôte, port, mot de passe) RCON du serveur, ou None si indisponible.
+
+        Docker: IP du conteneur sur son réseau (le port RCON n'est pas publié),
+        mot de passe écrit par l'image dans server.properties.
+        """
+        props = self.get_properties_view(name)
+        password = props.get("rcon.password")
+        if not password or props.get("enable-rcon", "true" if self._is_docker(name) else "false") != "true":
+            return None
+        try:
+            port = int(props.get("rcon.port") or 25575)
+        except ValueError:
+            port = 25575
+        if not self._is_docker(name):
+            return "127.0.0.1", port, password
+        ip = self._container_ip(name)
+        return (ip, port, password) if ip else None
+
+    def get_proxy_target(self, name):
+        """(hôte, port) du port de jeu joignable par le proxy, ou None.
+
+        Docker: IP du conteneur sur son réseau (port interne 25565, sans
+        passer par le port publié). Legacy: server-port en local.
+        """
+        if self._is_docker(name):
+            ip = self._container_ip(name)
+            return (ip, 25565) if ip else None
+        _, port, _ = self.get_ping_target(name)
+        return "127.0.0.1", port
+
+    def _container_ip(self, name):
+        api = self._docker_api()
+        if not api:
+            return None
+        try:
+            info = api.inspect_container(f"mc-{name}")
+        except Exception:
+            return None
+        for net in ((info or {}).get("NetworkSettings") or {}).get("Networks", {}).values():
+            if net.get("IPAddress"):
+                return net["IPAddress"]
+        return None
+
+    def _is_docker(self, name):
+        return os.path.exists(os.path.join(self._get_server_path(name), "docker-compose.yml"))
+
+    def rcon_recently_failed(self, name, target):
+        """Vrai si *target* a échoué il y a moins de RCON_RETRY_AFTER secondes.
+
+        IP de conteneur non routable depuis l'hôte (Docker Desktop): on ne
+        repaie pas le délai de connexion à chaque commande.
+        """
+        failed = self._rcon_failures.get(name)
+        return bool(failed and failed[0] == target and time.monotonic() - failed[1] < RCON_RETRY_AFTER)
+
+    def note_rcon_result(self, name, target, ok):
+        """Met à jour le cache des cibles RCON injoignables après un essai."""
+        if ok:
+            self._rcon_failures.pop(name, None)
+        else:
+            self._rcon_failures[name] = (target, time.monotonic())
+
+    def send_rcon(self, name, cmd, timeout=10.0):
+        """Commande via le pool RCON persistant; retourne la réponse complète.
+
+        Lève une Exception si RCON n'est pas configuré ou injoignable.
+        """
+        target = self.get_rcon_target(name)
+        if not target:
+            raise Exception("RCON non disponible pour ce serveur")
+        if self.rcon_recently_failed(name, target):
+            raise Exception("RCON injoignable (échec récent)")
+        try:
+            result = pooled_command(*target, cmd, timeout=timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.note_rcon_result(name, target, False)
+            raise
+        self.note_rcon_result(name, target, True)
+        return result
+
     def send_command(self, name, cmd):
+        """Envoie une commande console; retourne la réponse si elle est connue (RCON)."""
         if not cmd or not cmd.strip(): return
         
+        # 1. RCON persistant (pas de fork de `docker exec` ni de nouvelle connexion)
+        if self.is_running(name):
+            try:
+                return self.send_rcon(name, cmd.strip())
+            except Exception as e:
+                logger.debug(f"RCON indisponible pour {name}, repli: {e}")
+        
         path = self._get_server_path(name)
         if os.path.exists(os.path.join(path, "docker-compose.yml")):
             if self.is_running(name):
                  # Securite: Utilisation de la liste d'arguments pour eviter l'injection Shell
                  # rcon-cli est inclus dans l'image itzg/minecraft-server
+                 api = self._docker_api()
+                 if api:
+                    try:
+                        _, output = api.exec_run(f"mc-{name}", ["rcon-cli", cmd], timeout=30)
+                        return output
+                    except Exception as e:
+                        logger.debug(f"Exec API Docker impossible pour {name}, repli CLI: {e}")
                  try:
                     subprocess.run(["docker", "exec", "-i", f"mc-{name}", "rcon-cli", cmd], check=False)
                  except Exception as e:
@@ -1646,6 +1945,22 @@ class ServerManager:
             except Exception:
                 logger.debug(f"Failed to send command to legacy server {name}", exc_info=True)
 
+    def _latest_log_path(self, name):
+        """Fichier latest.log du serveur, ou None."""
+        path = self._get_server_path(name)
+        # Docker: data/logs/latest.log ou data/latest.log
+        # Legacy: latest.log
+        candidates = [
+            os.path.join(path, "latest.log"),
+            os.path.join(path, "logs", "latest.log"),
+            os.path.join(path, "data", "latest.log"),
+            os.path.join(path, "data", "logs", "latest.log")
+        ]
+        for c in candidates:
+            if os.path.exists(c):
+                return c
+        return None
+
     def get_logs(self, name, lines=100, filter_type=None, search=None):
         try:
             path = self._get_server_path(name)
@@ -1653,6 +1968,15 @@ class ServerManager:
 
             # 1. Docker Logs
             if os.path.exists(os.path.join(path, "docker-compose.yml")):
+                api = self._docker_api()
+                if api:
+                    try:
+                        out = api.logs(f"mc-{name}", tail=lines)
+                        if out:
+                            logs_content = out.splitlines()
+                    except Exception as e:
+                        logger.debug(f"Logs API Docker impossibles pour {name}: {e}")
+            if not logs_content and os.path.exists(os.path.join(path, "docker-compose.yml")):
                 try:
                     # Récupère les logs du conteneur via Docker CLI
                     # --tail pour optimiser
@@ -1668,21 +1992,7 @@ class ServerManager:
             
             # 2. File Logs (Legacy ou Fallback)
             if not logs_content:
-                # Docker: data/logs/latest.log ou data/latest.log
-                # Legacy: latest.log
-                candidates = [
-                    os.path.join(path, "latest.log"),
-                    os.path.join(path, "logs", "latest.log"),
-                    os.path.join(path, "data", "latest.log"),
-                    os.path.join(path, "data", "logs", "latest.log")
-                ]
-                
-                log_path = None
-                for c in candidates:
-                    if os.path.exists(c):
-                        log_path = c
-                        break
-                
+                log_path = self._latest_log_path(name)
                 if log_path:
                     from collections import deque
                     try:
@@ -1733,27 +2043,48 @@ class ServerManager:
 
         return sorted(files, key=lambda x: x["name"], reverse=True)
 
-    def get_properties(self, name):
-        props = {}
+    def _properties_path(self, path):
+        # Docker path priority
+        props_path = os.path.join(path, "data", "server.properties")
+        if not os.path.exists(props_path):
+             # Fallback Legacy
+             props_path = os.path.join(path, "server.properties")
+        return props_path
+
+    def get_properties_view(self, name):
+        """server.properties en lecture seule (vide si absent), via le cache."""
         try:
             path = self._get_server_path(name)
-            # Docker path priority
-            props_path = os.path.join(path, "data", "server.properties")
-            if not os.path.exists(props_path):
-                 # Fallback Legacy
-                 props_path = os.path.join(path, "server.properties")
-            
-            if os.path.exists(props_path):
-                with open(props_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if "=" in line and not line.startswith("#"):
-                            key, value = line.split("=", 1)
-                            props[key] = value
+            return self.meta_cache.load(self._properties_path(path), parse_properties) or MappingProxyType({})
         except Exception as e:
             logger.warning(f"Erreur lecture properties: {e}")
-        
-        return props
+        return MappingProxyType({})
+
+    def get_properties(self, name):
+        return dict(self.get_properties_view(name))
+
+    def get_ping_target(self, name):
+        """(hôte, port, query_activée) pour le Server List Ping du serveur.
+
+        Docker: port publié sur l'hôte (docker-compose.yml); le port Query UDP
+        n'y est pas publié. Legacy: server-port / enable-query du properties.
+        """
+        path = self._get_server_path(name)
+        props = self.get_properties_view(name)
+        compose = self._load_compose_view(path)
+        if compose:
+            try:
+                for mapping in compose["services"]["mc"].get("ports", ()):
+                    host_port, _, container_port = str(mapping).rpartition(":")
+                    if container_port.split("/")[0] == "25565" and host_port:
+                        return "127.0.0.1", int(host_port.rsplit(":", 1)[-1]), False
+            except (KeyError, TypeError, ValueError):
+                pass
+        try:
+            port = int(props.get("server-port") or self.get_server_config_view(name).get("port") or 25565)
+        except (TypeError, ValueError):
+            port = 25565
+        return "127.0.0.1", port, props.get("enable-query", "false") == "true"
 
     def save_properties(self, name, props):
         try:
@@ -1766,56 +2097,75 @@ class ServerManager:
             else:
                  props_path = os.path.join(path, "server.properties")
             
-            with open(props_path, "w", encoding="utf-8") as f:
-                f.write("# Minecraft Server Properties\n")
-                f.write(f"# Modifié le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                for key, value in props.items():
-                    f.write(f"{key}={value}\n")
+            rendered = render_properties(props, f"Modifié le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            atomic_write(props_path, rendered)
+            # Cache = ce que load() relirait (valeurs en texte), pas le dict brut reçu
+            self.meta_cache.put(props_path, parse_properties(rendered, props_path))
             
             return True
         except Exception as e:
             logger.error(f"Erreur sauvegarde properties: {e}")
             raise Exception(f"Erreur sauvegarde: {e}")
 
-    def backup_server(self, name):
-        """Crée une sauvegarde compressée du serveur (Smart Backup)"""
+    @property
+    def backup_store(self):
+        """Dépôt dédupliqué partagé par tous les serveurs (servers/_backups/store)."""
+        return get_backup_store(os.path.join(self.base_dir, "_backups"))
+
+    @timed_backup
+    def backup_server(self, name, format="zip", level=None):
+        """Crée une sauvegarde du serveur (Smart Backup).
+
+        format "zip": archive complète; "mcpa": archive complète compressée en
+        parallèle (niveau *level*); "dedup": snapshot incrémental dans le
+        dépôt dédupliqué; "chunked": idem, régions .mca découpées par chunk.
+        """
+        if format not in BACKUP_FORMATS:
+            raise ValueError(f"Format de sauvegarde inconnu: {format}")
+        level = parse_level(level)
         path = self._get_server_path(name)
         backup_dir = os.path.join(self.base_dir, "_backups")
         os.makedirs(backup_dir, exist_ok=True)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{name}_{timestamp}.zip"
+        backup_name = f"{name}_{timestamp}.{format}" if format in ("zip", "mcpa") else f"{name}_{timestamp}"
         backup_path = os.path.join(backup_dir, backup_name)
         
-        # 1. Sauvegarde en jeu (Flush to disk)
+        # 1. Copie figée (serveur en marche): l'autosave n'est coupé que le temps du clonage.
+        # Snapshot incrémental: seuls les fichiers modifiés depuis le parent sont copiés
+        frozen, reused = None, {}
         if self.is_running(name):
-            logger.info(f"Forçage de la sauvegarde pour {name}")
-            self.send_command(name, "save-all")
-            # Attendre l'écriture disque
-            time.sleep(5)
-            # Désactiver l'autosave pour éviter les incohérences pendant le zip
-            self.send_command(name, "save-off")
+            parent = None
+            if format in ("dedup", "chunked"):
+                parent_id = self.backup_store.latest(name)
+                parent = self.backup_store.load_manifest(parent_id)["files"] if parent_id else None
+            frozen, reused = self.freeze_server(name, parent)
+        source = frozen or path
         
         try:
-            logger.info(f"Création backup ZIP pour {name}...")
-            with zipfile.ZipFile(backup_path, "w", zipfile.ZIP_DEFLATED) as zf:
-                for root, dirs, files in os.walk(path):
-                     # Exclusions intelligentes (logs archivés, backups récursifs...)
-                     if "logs" in root and root != os.path.join(path, "logs"):
-                         continue # Skip sub-logs
-                     
-                     for file in files:
-                         if file.endswith(".zip") and root == path: 
-                             continue # Skip backups in root
-                         if file.endswith(".log.gz"):
-                             continue # Skip archived logs
-                             
-                         abs_path = os.path.join(root, file)
-                         rel_path = os.path.relpath(abs_path, start=path)
-                         zf.write(abs_path, arcname=rel_path)
-            
-            logger.info(f"Backup ZIP créé: {backup_name}")
-            return {"success": True, "name": backup_name, "path": backup_path}
+            if format in ("dedup", "chunked"):
+                logger.info(f"Création snapshot dédupliqué pour {name}...")
+                snapshot = self.backup_store.snapshot(name, source, snapshot_id=backup_name,
+                                                      split_regions=format == "chunked", reuse=reused)
+                self._catalog_backup(self.backup_catalog.record_snapshot, name, backup_name,
+                                     snapshot["new_bytes"])
+                return {"success": True, "name": backup_name, "format": format, "snapshot": snapshot}
+
+            # Exclusions intelligentes (logs archivés, backups récursifs...)
+            files = ManifestRecorder(iter_backup_files(source))
+            if format == "mcpa":
+                logger.info(f"Création archive parallèle pour {name}...")
+                kwargs = {"level": level} if level is not None else {}
+                stats = Archiver(**kwargs).write(files, backup_path)
+            else:
+                logger.info(f"Création backup ZIP pour {name}...")
+                stats = write_zip(files, backup_path)
+            
+            logger.info(f"Backup {format.upper()} créé: {backup_name}")
+            self._catalog_backup(self.backup_catalog.record, name, backup_name, format, files.entries,
+                                 codec=stats["codec"], stored_bytes=stats["bytes_out"],
+                                 checksum=file_sha256(backup_path))
+            return {"success": True, "name": backup_name, "path": backup_path, "format": format, "stats": stats}
             
         except Exception as e:
             if os.path.exists(backup_path):
@@ -1823,8 +2173,116 @@ class ServerManager:
             raise Exception(f"Erreur backup: {e}")
             
         finally:
-            if self.is_running(name):
-                self.send_command(name, "save-on")
+            if frozen:
+                shutil.rmtree(frozen, ignore_errors=True)
+
+    def _catalog_backup(self, fn, *args, **kwargs):
+        """Enregistre une sauvegarde au catalogue sans faire échouer la sauvegarde elle-même.
+
+        Rotation et restauration ne listent que le catalogue: un échec relance
+        l'indexation depuis le disque pour que la sauvegarde n'y manque pas.
+        """
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"[BACKUP] Catalogue non mis à jour ({fn.__name__} {args[:2]}), réindexation: {e}",
+                         exc_info=True)
+            self.backup_catalog.request_sync()
+
+    def wait_saved(self, name, timeout=60):
+        """Force l'écriture du monde (save-all flush) et attend « Saved the game ».
+
+        La réponse RCON de `save-all flush` n'arrive qu'une fois la sauvegarde
+        terminée (« Saved the game », texte variable selon les serveurs); sans
+        RCON, la confirmation est guettée dans latest.log. Retourne False si
+        elle n'a pas été observée dans le délai.
+        """
+        try:
+            self.send_rcon(name, "save-all flush", timeout=timeout)
+            return True
+        except Exception as e:
+            logger.debug(f"save-all via RCON impossible pour {name}, suivi des logs: {e}")
+
+        log_path = self._latest_log_path(name)
+        offset = os.path.getsize(log_path) if log_path else 0
+        self.send_command(name, "save-all flush")
+        if not log_path:
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
+                    if os.path.getsize(log_path) < offset:
+                        offset = 0  # Rotation du log
+                    f.seek(offset)
+                    if "Saved the game" in f.read():
+                        return True
+            except OSError:
+                pass
+            time.sleep(0.2)
+        return False
+
+    def freeze_server(self, name, parent=None):
+        """Copie figée et cohérente d'un serveur en marche; retourne (dossier, reprises).
+
+        save-off, save-all flush confirmé, clonage (reflink si possible, sinon
+        liens physiques pour les fichiers immuables et copie des régions) puis
+        save-on aussitôt: la compression se fait ensuite depuis la copie.
+        Avec *parent* (fichiers du manifeste du dernier snapshot), les
+        fichiers de même taille et date pendant le save-off ne sont pas
+        copiés: leurs entrées sont retournées dans les reprises
+        {chemin relatif: entrée}. L'appelant supprime le dossier retourné.
+        """
+        path = self._get_server_path(name)
+        frozen = os.path.join(self.base_dir, "_backups", f".freeze-{name}-{uuid.uuid4().hex[:8]}")
+        started = time.monotonic()
+        reused = {}
+
+        def unchanged(rel_path, st):
+            entry = parent.get(rel_path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                reused[rel_path] = entry
+                return True
+            return False
+
+        # Pas d'autosave entre la confirmation et la fin du clonage
+        self.send_command(name, "save-off")
+        try:
+            if not self.wait_saved(name):
+                logger.warning(f"Confirmation de sauvegarde non reçue pour {name}, copie quand même")
+            # Le serveur réécrit ses régions sur place: jamais de liens physiques sur les .mca
+            stats = get_clone_engine().clone_tree(path, frozen, share_mutable=False,
+                                                  skip=unchanged if parent else None)
+        except Exception:
+            shutil.rmtree(frozen, ignore_errors=True)
+            raise
+        finally:
+            self.send_command(name, "save-on")
+        logger.info(f"Copie figée de {name} en {time.monotonic() - started:.1f}s "
+                    f"({stats['bytes_copied'] / 1024 / 1024:.1f} Mo copiés, {stats['skipped']} fichiers inchangés)")
+        return frozen, reused
+
+    def _cleanup_freeze_dirs(self):
+        """Supprime les copies figées laissées par une sauvegarde interrompue (arrêt du panel)."""
+        backup_dir = os.path.join(self.base_dir, "_backups")
+        if not os.path.isdir(backup_dir):
+            return
+        for item in os.listdir(backup_dir):
+            if item.startswith(".freeze-"):
+                shutil.rmtree(os.path.join(backup_dir, item), ignore_errors=True)
+                logger.info(f"Copie figée orpheline supprimée: {item}")
+
+    def _write_compose(self, path, compose):
+        """Écrit docker-compose.yml de façon atomique et met à jour le cache."""
+        compose_path = os.path.join(path, "docker-compose.yml")
+        rendered = yaml.dump(compose)
+        atomic_write(compose_path, rendered)
+        self.meta_cache.put(compose_path, parse_yaml(rendered, compose_path))
+
+    def _forget_metadata(self, path):
+        """Oublie les métadonnées en cache d'un dossier renommé ou supprimé."""
+        self.meta_cache.invalidate_tree(path)
+        self._merged_configs.pop(path, None)
 
     def update_docker_resources(self, name, port=None, ram_max=None, ram_min=None, cpu_limit=None, version=None, server_type=None):
         """Met à jour les ressources Docker (Port, RAM, CPU, Version)"""
@@ -1835,8 +2293,7 @@ class ServerManager:
             raise Exception("Ce serveur n'est pas géré par Docker (legacy)")
 
         try:
-            with open(compose_path, "r") as f:
-                compose = yaml.safe_load(f)
+            compose = thaw(self._load_compose_view(path))
             
             # Update Port
             if port:
@@ -1870,8 +2327,7 @@ class ServerManager:
                      compose["services"]["mc"]["deploy"]["resources"]["limits"]["memory"] = ram_max
 
             # Save docker-compose.yml
-            with open(compose_path, "w") as f:
-                yaml.dump(compose, f)
+            self._write_compose(path, compose)
             
             # Update manager_config.json
             cfg = self.get_server_config(name)
@@ -1886,6 +2342,8 @@ class ServerManager:
             
             # Apply changes immediately
             try:
+                # `up -d` (re)démarre le conteneur: régions partagées d'abord rendues privées
+                copy_up(path)
                 self._run_compose(["up", "-d"], cwd=path, check=True)
                 logger.info(f"Docker compose reload effectué pour {name}")
             except Exception as e:
@@ -1905,8 +2363,7 @@ class ServerManager:
             return {}
 
         try:
-            with open(compose_path, "r") as f:
-                compose = yaml.safe_load(f)
+            compose = self._load_compose_view(path) or {}
             
             mc = compose.get("services", {}).get("mc", {})
             env = mc.get("environment", {})
@@ -1918,7 +2375,7 @@ class ServerManager:
                 p = ports[0]
                 if isinstance(p, str):
                     host_port = p.split(":")[0]
-                elif isinstance(p, dict):
+                elif isinstance(p, Mapping):
                     host_port = p.get("published", "25565")
             
             return {
@@ -1932,37 +2389,76 @@ class ServerManager:
             logger.warning(f"Error reading config for {name}: {e}")
             return {}
 
-    def list_backups(self, name=None):
-        """Liste les sauvegardes disponibles"""
-        backup_dir = os.path.join(self.base_dir, "_backups")
-        if not os.path.exists(backup_dir):
-            return []
-        
-        backups = []
-        for d in os.listdir(backup_dir):
-            if name and not d.startswith(name + "_"):
-                continue
-            full_path = os.path.join(backup_dir, d)
-            if os.path.isfile(full_path) or os.path.isdir(full_path):
-                stat = os.stat(full_path)
-                
-                size_mb = 0
-                if os.path.isdir(full_path):
-                    size_mb = sum(
-                        os.path.getsize(os.path.join(dirpath, filename))
-                        for dirpath, _, filenames in os.walk(full_path)
-                        for filename in filenames
-                    ) / 1024 / 1024
-                else:
-                    size_mb = stat.st_size / 1024 / 1024
+    def list_backups(self, name=None, format=None, since=None, until=None):
+        """Liste les sauvegardes disponibles (catalogue indexé, sans parcourir le disque)"""
+        return self.backup_catalog.list(server=name, format=format, since=since, until=until)
 
-                backups.append({
-                    "name": d,
-                    "date": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    "size_mb": round(size_mb, 1)
-                })
-        
-        return sorted(backups, key=lambda x: x["date"], reverse=True)
+    def _backup_owned(self, name, backup_name):
+        return backup_name.startswith(name + "_") and os.sep not in backup_name and ".." not in backup_name
+
+    def delete_backup(self, name, backup_name, gc=True):
+        """Supprime une sauvegarde (archive, dossier ou snapshot dédupliqué)."""
+        if not self._backup_owned(name, backup_name):
+            return False
+        if self.backup_store.has_snapshot(backup_name):
+            self.backup_store.delete(backup_name)
+            if gc:
+                self.backup_store.gc()
+        else:
+            backup_path = os.path.join(self.base_dir, "_backups", backup_name)
+            if os.path.isdir(backup_path):
+                shutil.rmtree(backup_path)
+            elif os.path.isfile(backup_path):
+                os.remove(backup_path)
+            else:
+                return self.backup_catalog.remove(backup_name)
+        self._catalog_backup(self.backup_catalog.remove, backup_name)
+        return True
+
+    def restore_backup(self, name, backup_name):
+        """Restaure une sauvegarde de servers/_backups (serveur arrêté)."""
+        if not self._backup_owned(name, backup_name):
+            raise Exception("Sauvegarde non trouvée")
+        if self.is_running(name):
+            raise Exception("Arrêtez le serveur avant la restauration")
+        path = self._get_server_path(name)
+        if self.backup_store.has_snapshot(backup_name):
+            result = self.backup_store.restore(backup_name, path)
+        elif backup_name.endswith(".mcpa"):
+            backup_path = os.path.join(self.base_dir, "_backups", backup_name)
+            result = Archiver().extract(backup_path, path)
+            result["id"] = backup_name
+            result["removed"] = self._prune_restored(path, (rel for rel, _, _ in Archiver.entries(backup_path)))
+        else:
+            backup_path = os.path.join(self.base_dir, "_backups", backup_name)
+            if not zipfile.is_zipfile(backup_path):
+                raise Exception("Sauvegarde non trouvée")
+            with zipfile.ZipFile(backup_path, "r") as zf:
+                members = [m for m in zf.namelist() if not m.endswith("/")]
+                for member in members:
+                    target = os.path.abspath(os.path.join(path, member))
+                    if os.path.commonpath([target, os.path.abspath(path)]) != os.path.abspath(path):
+                        raise Exception(f"Chemin invalide dans l'archive: {member}")
+                zf.extractall(path)
+            result = {"id": backup_name, "files": len(members),
+                      "removed": self._prune_restored(path, members)}
+        self._forget_metadata(path)
+        return result
+
+    def _prune_restored(self, path, kept):
+        """Supprime les fichiers qu'une sauvegarde aurait inclus mais absents de l'archive restaurée.
+
+        Même règle que `BackupStore.restore(prune=True)`: après restauration,
+        le serveur ne garde pas de régions ou de données créées après la
+        sauvegarde.
+        """
+        kept = {rel.replace("/", os.sep) for rel in kept}
+        removed = 0
+        for abs_path, rel_path in list(iter_prunable_files(path)):
+            if rel_path not in kept:
+                os.remove(abs_path)
+                removed += 1
+        return removed
     
     # World management
     def list_worlds(self, server_name):
@@ -2022,7 +2518,8 @@ class ServerManager:
                 for file in files:
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, world_path)
-                    zf.write(file_path, arcname)
+                    # Régions, NBT gzippé...: stockés sans redéfler
+                    zf.write(file_path, arcname, compress_type=zip_compress_type(file_path))
         
         return zip_path
     
@@ -2397,22 +2894,17 @@ class ServerManager:
         return True, "Optimisations (Aikar's Flags) appliquées avec succès."
 
     def find_available_port(self, start=25565):
-        import socket
+        # Ports attribués aux serveurs (publiés par Docker ou server-port), même arrêtés
+        assigned = set()
+        for srv in self.list_servers():
+            try:
+                assigned.add(self.get_ping_target(srv)[1])
+            except Exception:
+                continue
         port = start
         while port < 65535:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            result = sock.connect_ex(('127.0.0.1', port))
-            sock.close()
-            if result != 0:
-                # Also check if another server uses it
-                in_use = False
-                for srv in self.list_servers():
-                    props = self.get_properties(srv["name"])
-                    if props.get("server-port") == str(port):
-                        in_use = True
-                        break
-                if not in_use:
-                    return port
+            if port not in assigned and not self._is_port_in_use(port):
+                return port
             port += 1
         return None
 
@@ -0,0 +1,259 @@
+"""
+Client asyncio du protocole de statut Minecraft Java (Server List Ping) et
+du protocole UDP Query.
+
+- `status()` : handshake + requête de statut + ping, retourne joueurs
+  en ligne / max, échantillon de pseudos, MOTD, version, protocole et
+  latence aller-retour.
+- `query()` : protocole Query (enable-query=true) pour la liste complète
+  des joueurs.
+- `ping_many()` / `ping_fleet()` : toute la flotte en une seule passe de
+  boucle d'événements, avec un timeout par cible.
+
+Les helpers VarInt / chaînes sont réutilisés par les autres modules qui
+parlent le protocole Minecraft.
+"""
+import asyncio
+import json
+import logging
+import random
+import struct
+import time
+from typing import Dict, Tuple
+
+from core import aio_loop
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 2.0
+
+
+# ----------------------------------------------------------------------
+# Encodage du protocole
+# ----------------------------------------------------------------------
+def encode_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int = 0) -> Tuple[int, int]:
+    """(valeur, nouvel offset) depuis un buffer."""
+    result = 0
+    for i in range(5):
+        if offset >= len(data):
+            raise ValueError("VarInt tronqué")
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            if result & 0x80000000:
+                result -= 1 << 32
+            return result, offset
+    raise ValueError("VarInt trop long")
+
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    result = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        result |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            if result & 0x80000000:
+                result -= 1 << 32
+            return result
+    raise ValueError("VarInt trop long")
+
+
+def encode_string(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return encode_varint(len(raw)) + raw
+
+
+def decode_string(data: bytes, offset: int = 0) -> Tuple[str, int]:
+    length, offset = decode_varint(data, offset)
+    return data[offset:offset + length].decode("utf-8", errors="replace"), offset + length
+
+
+def packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body = encode_varint(packet_id) + payload
+    return encode_varint(len(body)) + body
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    length = await read_varint(reader)
+    if length <= 0 or length > 2 * 1024 * 1024:
+        raise ValueError(f"Taille de paquet invalide: {length}")
+    data = await reader.readexactly(length)
+    packet_id, offset = decode_varint(data)
+    return packet_id, data[offset:]
+
+
+def handshake(host: str, port: int, next_state: int = 1, protocol: int = -1) -> bytes:
+    return packet(0x00, encode_varint(protocol) + encode_string(host)
+                  + struct.pack(">H", port) + encode_varint(next_state))
+
+
+def flatten_chat(component) -> str:
+    """Texte brut d'un composant de chat JSON (MOTD)."""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(flatten_chat(c) for c in component)
+    if isinstance(component, dict):
+        return component.get("text", "") + "".join(flatten_chat(c) for c in component.get("extra", []))
+    return ""
+
+
+# ----------------------------------------------------------------------
+# Server List Ping (TCP)
+# ----------------------------------------------------------------------
+async def status(host: str, port: int = 25565, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Statut d'un serveur; lève asyncio.TimeoutError / OSError / ValueError en cas d'échec."""
+    return await asyncio.wait_for(_status(host, port), timeout)
+
+
+async def _status(host: str, port: int) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(handshake(host, port) + packet(0x00))
+        await writer.drain()
+        packet_id, payload = await read_packet(reader)
+        if packet_id != 0x00:
+            raise ValueError(f"Réponse de statut inattendue: 0x{packet_id:02x}")
+        raw, _ = decode_string(payload)
+        data = json.loads(raw)
+
+        # Ping / pong pour la latence (certains proxys ne répondent pas: non bloquant)
+        latency = None
+        token = random.getrandbits(63)
+        sent = time.perf_counter()
+        writer.write(packet(0x01, struct.pack(">q", token)))
+        await writer.drain()
+        try:
+            packet_id, payload = await asyncio.wait_for(read_packet(reader), 1.0)
+            if packet_id == 0x01 and struct.unpack(">q", payload[:8])[0] == token:
+                latency = round((time.perf_counter() - sent) * 1000, 2)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    players = data.get("players") or {}
+    version = data.get("version") or {}
+    return {
+        "online": True,
+        "players_online": players.get("online", 0),
+        "players_max": players.get("max", 0),
+        "sample": [p.get("name") for p in players.get("sample") or [] if p.get("name")],
+        "motd": flatten_chat(data.get("description", "")),
+        "version": version.get("name"),
+        "protocol": version.get("protocol"),
+        "latency_ms": latency,
+    }
+
+
+# ----------------------------------------------------------------------
+# Query (UDP)
+# ----------------------------------------------------------------------
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait(data)
+
+    def error_received(self, exc):
+        self.queue.put_nowait(exc)
+
+
+async def query(host: str, port: int = 25565, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Full stat du protocole Query: infos du serveur et liste complète des joueurs."""
+    return await asyncio.wait_for(_query(host, port), timeout)
+
+
+async def _query(host: str, port: int) -> dict:
+    loop = asyncio.get_running_loop()
+    transport, proto = await loop.create_datagram_endpoint(_QueryProtocol, remote_addr=(host, port))
+    try:
+        session = random.getrandbits(32) & 0x0F0F0F0F
+
+        async def receive():
+            data = await proto.queue.get()
+            if isinstance(data, Exception):
+                raise data
+            return data
+
+        transport.sendto(b"\xfe\xfd\x09" + struct.pack(">I", session))
+        data = await receive()
+        token = int(data[5:].split(b"\x00", 1)[0])
+        transport.sendto(b"\xfe\xfd\x00" + struct.pack(">I", session) + struct.pack(">i", token) + b"\x00" * 4)
+        data = await receive()
+    finally:
+        transport.close()
+
+    # 5 octets d'en-tête + 11 octets de remplissage "splitnum\0\x80\0"
+    body = data[16:]
+    kv_part, _, players_part = body.partition(b"\x00\x00\x01player_\x00\x00")
+    items = kv_part.split(b"\x00")
+    info = {}
+    for i in range(0, len(items) - 1, 2):
+        info[items[i].decode("utf-8", errors="replace")] = items[i + 1].decode("utf-8", errors="replace")
+    players = [p.decode("utf-8", errors="replace") for p in players_part.split(b"\x00") if p]
+    return {
+        "online": True,
+        "motd": info.get("hostname", ""),
+        "players_online": int(info.get("numplayers", len(players)) or 0),
+        "players_max": int(info.get("maxplayers", 0) or 0),
+        "players": players,
+        "version": info.get("version"),
+        "map": info.get("map"),
+        "plugins": info.get("plugins", ""),
+    }
+
+
+# ----------------------------------------------------------------------
+# Passe sur toute la flotte
+# ----------------------------------------------------------------------
+async def ping_many(targets: Dict[str, Tuple[str, int]], timeout: float = DEFAULT_TIMEOUT,
+                    with_query: bool = False) -> Dict[str, dict]:
+    """{nom: statut} pour toutes les cibles, en parallèle, timeout par cible."""
+
+    async def one(name, host, port):
+        try:
+            result = await status(host, port, timeout)
+            if with_query and result["players_online"] > len(result["sample"]):
+                try:
+                    q = await query(host, port, timeout)
+                    result["sample"] = q["players"]
+                except Exception:
+                    pass
+            return name, result
+        except Exception as e:
+            return name, {"online": False, "error": type(e).__name__}
+
+    results = await asyncio.gather(*(one(n, h, p) for n, (h, p) in targets.items()))
+    return dict(results)
+
+
+def ping_fleet(targets: Dict[str, Tuple[str, int]], timeout: float = DEFAULT_TIMEOUT,
+               with_query: bool = False) -> Dict[str, dict]:
+    """Version synchrone de `ping_many` (threads Flask / collecteurs)."""
+    if not targets:
+        return {}
+    return aio_loop.run(ping_many(targets, timeout, with_query), timeout=timeout * (3 if with_query else 2) + 5)
+
+
+def ping_server(host: str, port: int, timeout: float = DEFAULT_TIMEOUT, with_query: bool = False) -> dict:
+    return ping_fleet({"_": (host, port)}, timeout, with_query)["_"]
@@ -0,0 +1,383 @@
+"""
+Proxy TCP Minecraft routant par nom d'hôte: toute la flotte derrière un seul
+port public.
+
+Le premier paquet d'une connexion Minecraft (handshake) contient l'adresse
+tapée par le joueur. Le proxy le lit, en extrait le nom d'hôte, résout le
+serveur correspondant (`<serveur>.<MC_PROXY_DOMAIN>` ou un nom d'hôte déclaré
+dans la config du serveur) puis se connecte directement au conteneur sur son
+réseau Docker. Le handshake est rejoué tel quel au backend; ensuite les
+octets sont relayés sans passer par l'espace utilisateur (os.splice via un
+pipe, Linux) ou, à défaut, avec un buffer réutilisé (recv_into).
+
+Compteurs par route (connexions, connexions actives, octets, erreurs)
+exposés par `stats()` et sur /metrics.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from core import aio_loop
+from core.mc_ping import decode_string, decode_varint, encode_string, packet
+
+logger = logging.getLogger(__name__)
+
+MC_PROXY_PORT = int(os.getenv("MC_PROXY_PORT", "0") or 0)
+MC_PROXY_DOMAIN = os.getenv("MC_PROXY_DOMAIN", "").strip(".").lower()
+
+HAS_SPLICE = hasattr(os, "splice")
+SPLICE_FLAGS = getattr(os, "SPLICE_F_MOVE", 1) | getattr(os, "SPLICE_F_NONBLOCK", 2)
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+CHUNK_SIZE = 256 * 1024
+# Handshake + éventuelles données de forwarding (BungeeCord / Forge)
+MAX_HANDSHAKE = 32 * 1024
+UNKNOWN_ROUTE = "_unknown"
+
+
+def parse_handshake(body: bytes) -> Tuple[int, str, int, int]:
+    """(protocole, nom d'hôte, port, état suivant) depuis le corps du handshake."""
+    packet_id, offset = decode_varint(body)
+    if packet_id != 0x00:
+        raise ValueError(f"Paquet de handshake inattendu: 0x{packet_id:02x}")
+    protocol, offset = decode_varint(body, offset)
+    address, offset = decode_string(body, offset)
+    if offset + 2 > len(body):
+        raise ValueError("Handshake tronqué")
+    port = int.from_bytes(body[offset:offset + 2], "big")
+    next_state, _ = decode_varint(body, offset + 2)
+    # Forge ajoute "\0FML\0", le forwarding BungeeCord "\0ip\0uuid..."
+    hostname = address.split("\x00", 1)[0].rstrip(".").lower()
+    return protocol, hostname, port, next_state
+
+
+class HostnameRouter:
+    """Table nom d'hôte -> serveur, reconstruite depuis le registre."""
+
+    def __init__(self, srv_mgr, domain: str = MC_PROXY_DOMAIN, ttl: float = 30.0):
+        self.srv_mgr = srv_mgr
+        self.domain = domain
+        self.ttl = ttl
+        self._routes: Dict[str, str] = {}
+        self._built = 0.0
+        self._targets: Dict[str, Tuple[Tuple[str, int], float]] = {}
+        self._lock = threading.Lock()
+
+    def default_hostname(self, name: str) -> Optional[str]:
+        return f"{name.lower()}.{self.domain}" if self.domain else None
+
+    def is_reserved(self, hostname: str, name: str) -> bool:
+        """Vrai si *hostname* tombe sous le domaine du proxy sans être le nom par défaut de *name*."""
+        return bool(self.domain) and hostname.endswith(f".{self.domain}") \
+            and hostname != self.default_hostname(name)
+
+    def rebuild(self):
+        routes = {}
+        custom = []
+        for entry in self.srv_mgr.registry.list():
+            if self.domain:
+                routes[self.default_hostname(entry.name)] = entry.name
+            try:
+                hostnames = self.srv_mgr.get_server_config_view(entry.name).get("hostnames") or ()
+            except Exception:
+                hostnames = ()
+            custom.extend((str(host).rstrip(".").lower(), entry.name) for host in hostnames)
+        # Les noms déclarés ne détournent jamais le nom par défaut d'un autre serveur
+        for host, name in custom:
+            if not self.is_reserved(host, name):
+                routes.setdefault(host, name)
+        with self._lock:
+            self._routes = routes
+            self._built = time.monotonic()
+
+    def routes(self) -> Dict[str, str]:
+        if time.monotonic() - self._built > self.ttl:
+            self.rebuild()
+        with self._lock:
+            return dict(self._routes)
+
+    def lookup(self, hostname: str) -> Optional[str]:
+        age = time.monotonic() - self._built
+        if age > self.ttl:
+            self.rebuild()
+        with self._lock:
+            name = self._routes.get(hostname)
+        if name is None and age > 5:
+            # Serveur créé ou nom d'hôte ajouté depuis la dernière construction
+            self.rebuild()
+            with self._lock:
+                name = self._routes.get(hostname)
+        return name
+
+    def resolve(self, name: str) -> Optional[Tuple[str, int]]:
+        """Adresse du backend (listener de veille si le serveur hiberne)."""
+        hibernation = self.srv_mgr.hibernation
+        if hibernation is not None and hibernation.is_hibernating(name):
+            _, port, _ = self.srv_mgr.get_ping_target(name)
+            return "127.0.0.1", port
+        cached = self._targets.get(name)
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        target = self.srv_mgr.get_proxy_target(name)
+        if target:
+            self._targets[name] = (target, time.monotonic())
+        return target
+
+    def watch(self, state_watcher):
+        """Oublie l'adresse d'un serveur dès que son conteneur redémarre (nouvelle IP possible)."""
+        state_watcher.subscribe(self._on_container_event)
+
+    def _on_container_event(self, state, action: str):
+        if state.server and action in ("start", "restart", "die", "destroy"):
+            self.invalidate(state.server)
+
+    def invalidate(self, name: Optional[str] = None):
+        if name is None:
+            self._targets.clear()
+            self._built = 0.0
+        else:
+            self._targets.pop(name, None)
+
+
+class _RouteError(Exception):
+    """Connexion non routable (message renvoyé au joueur)."""
+
+
+async def _wait_fd(loop, fd: int, writable: bool):
+    future = loop.create_future()
+    add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+    add(fd, lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        remove(fd)
+
+
+class MinecraftProxy:
+    def __init__(self, router: HostnameRouter, host: str = "0.0.0.0", port: int = MC_PROXY_PORT or 25565,
+                 connect_timeout: float = 5.0, handshake_timeout: float = 5.0, use_splice: bool = HAS_SPLICE):
+        self.router = router
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.handshake_timeout = handshake_timeout
+        self.use_splice = use_splice and HAS_SPLICE
+        self._sock: Optional[socket.socket] = None
+        self._accept_task = None
+        self._stats: Dict[str, dict] = {}
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+    def start(self):
+        aio_loop.run(self._start(), timeout=10)
+        logger.info(f"[PROXY] Proxy Minecraft en écoute sur {self.host}:{self.port} "
+                    f"(relais {'splice' if self.use_splice else 'recv_into'})")
+
+    def stop(self):
+        aio_loop.run(self._stop(), timeout=10)
+
+    async def _start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(512)
+        sock.setblocking(False)
+        self._sock = sock
+        self._accept_task = asyncio.ensure_future(self._accept_loop())
+
+    async def _stop(self):
+        if self._accept_task is not None:
+            self._accept_task.cancel()
+            self._accept_task = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    async def _accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                conn, addr = await loop.sock_accept(self._sock)
+            except asyncio.CancelledError:
+                raise
+            except OSError as e:
+                logger.warning(f"[PROXY] accept: {e}")
+                await asyncio.sleep(0.1)
+                continue
+            asyncio.ensure_future(self._handle(conn, addr))
+
+    # ------------------------------------------------------------------
+    # Métriques
+    # ------------------------------------------------------------------
+    def _route_stats(self, route: str) -> dict:
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = {"connections": 0, "active": 0, "bytes_in": 0,
+                                          "bytes_out": 0, "errors": 0}
+        return stats
+
+    def stats(self) -> Dict[str, dict]:
+        """{route: compteurs} (copie)."""
+        return {route: dict(s) for route, s in list(self._stats.items())}
+
+    # ------------------------------------------------------------------
+    # Connexion
+    # ------------------------------------------------------------------
+    async def _read_handshake(self, loop, conn) -> Tuple[bytes, bytes]:
+        """(octets lus, corps du handshake); les octets en trop sont rejoués au backend."""
+        buf = bytearray()
+        chunk = bytearray(4096)
+        while True:
+            if buf:
+                if buf[0] == 0xFE:
+                    raise ValueError("Ping legacy (pré-1.7) non supporté")
+                try:
+                    length, offset = decode_varint(bytes(buf[:5]))
+                except ValueError:
+                    if len(buf) >= 5:
+                        raise
+                    length = None
+                if length is not None:
+                    if length <= 0 or length > MAX_HANDSHAKE:
+                        raise ValueError(f"Taille de handshake invalide: {length}")
+                    if len(buf) >= offset + length:
+                        return bytes(buf), bytes(buf[offset:offset + length])
+            n = await loop.sock_recv_into(conn, chunk)
+            if not n:
+                raise ConnectionError("Connexion fermée pendant le handshake")
+            buf += chunk[:n]
+
+    async def _disconnect(self, loop, conn, message: str):
+        """Message de déconnexion affiché au joueur (état login)."""
+        try:
+            await loop.sock_sendall(conn, packet(0x00, encode_string(json.dumps({"text": message}))))
+        except OSError:
+            pass
+
+    async def _handle(self, conn: socket.socket, addr):
+        loop = asyncio.get_running_loop()
+        backend = None
+        stats = None
+        next_state = 1
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            raw, body = await asyncio.wait_for(self._read_handshake(loop, conn), self.handshake_timeout)
+            _, hostname, _, next_state = parse_handshake(body)
+
+            name = await loop.run_in_executor(None, self.router.lookup, hostname)
+            if name is None:
+                self._route_stats(UNKNOWN_ROUTE)["connections"] += 1
+                raise _RouteError(f"Serveur inconnu: {hostname}")
+            stats = self._route_stats(name)
+            stats["connections"] += 1
+
+            target = await loop.run_in_executor(None, self.router.resolve, name)
+            if target is None:
+                raise _RouteError(f"{name} n'est pas démarré")
+            backend = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            backend.setblocking(False)
+            backend.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                await asyncio.wait_for(loop.sock_connect(backend, target), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError):
+                # L'IP du conteneur a pu changer (recréé): nouvelle résolution à la prochaine connexion
+                self.router.invalidate(name)
+                raise _RouteError(f"{name} injoignable")
+
+            await loop.sock_sendall(backend, raw)
+            stats["bytes_in"] += len(raw)
+            stats["active"] += 1
+            try:
+                await self._relay(loop, conn, backend, stats)
+            finally:
+                stats["active"] -= 1
+        except _RouteError as e:
+            if stats is not None:
+                stats["errors"] += 1
+            if next_state != 1:
+                await self._disconnect(loop, conn, str(e))
+        except (ValueError, asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"[PROXY] {addr[0]}: connexion interrompue ({e})")
+            if stats is not None:
+                stats["errors"] += 1
+        finally:
+            conn.close()
+            if backend is not None:
+                backend.close()
+
+    async def _relay(self, loop, client: socket.socket, backend: socket.socket, stats: dict):
+        pump = self._pump_splice if self.use_splice else self._pump_copy
+
+        def count(key):
+            def account(n):
+                stats[key] += n
+            return account
+
+        tasks = [
+            asyncio.ensure_future(pump(loop, client, backend, count("bytes_in"))),
+            asyncio.ensure_future(pump(loop, backend, client, count("bytes_out"))),
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        if pending and any(t.exception() for t in done):
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        elif pending:
+            # Demi-fermeture: on attend que l'autre sens se termine aussi
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    @staticmethod
+    def _half_close(sock: socket.socket):
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    async def _pump_copy(self, loop, src, dst, account):
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(buf)
+        while True:
+            n = await loop.sock_recv_into(src, buf)
+            if not n:
+                break
+            await loop.sock_sendall(dst, view[:n])
+            account(n)
+        self._half_close(dst)
+
+    async def _pump_splice(self, loop, src, dst, account):
+        """socket -> pipe -> socket dans le noyau (aucune copie en espace utilisateur)."""
+        pipe_r, pipe_w = os.pipe()
+        try:
+            try:
+                fcntl.fcntl(pipe_w, F_SETPIPE_SZ, CHUNK_SIZE)
+            except OSError:
+                pass
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            pending = 0
+            while True:
+                if not pending:
+                    try:
+                        n = os.splice(src_fd, pipe_w, CHUNK_SIZE, flags=SPLICE_FLAGS)
+                    except BlockingIOError:
+                        await _wait_fd(loop, src_fd, writable=False)
+                        continue
+                    if n == 0:
+                        break
+                    pending = n
+                try:
+                    sent = os.splice(pipe_r, dst_fd, pending, flags=SPLICE_FLAGS)
+                except BlockingIOError:
+                    await _wait_fd(loop, dst_fd, writable=True)
+                    continue
+                pending -= sent
+                account(sent)
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
+        self._half_close(dst)
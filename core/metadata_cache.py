@@ -0,0 +1,134 @@
+"""
+Cache des métadonnées serveur (manager_config.json, docker-compose.yml,
+server.properties) validé par (taille, mtime_ns) du fichier.
+
+Les objets parsés sont conservés sous forme figée (MappingProxyType / tuple)
+et partagés entre les requêtes: un fichier n'est relu et re-parsé que lorsque
+sa signature change sur le disque.
+"""
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+def freeze(value):
+    """Convertit récursivement dict/list en vues en lecture seule."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Copie mutable (dict/list) d'un objet figé par `freeze`."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+def parse_json(raw: str, path: str) -> dict:
+    if not raw.strip():
+        logger.warning(f"Fichier vide: {path}")
+        return {}
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.warning(f"Erreur parsing JSON {path}: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_yaml(raw: str, path: str) -> dict:
+    try:
+        data = yaml.safe_load(raw)
+    except yaml.YAMLError as e:
+        logger.warning(f"Erreur parsing YAML {path}: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_properties(raw: str, path: str) -> dict:
+    props = {}
+    for line in raw.splitlines():
+        line = line.strip()
+        if "=" in line and not line.startswith("#"):
+            key, value = line.split("=", 1)
+            props[key] = value
+    return props
+
+
+def render_properties(props: dict, header: Optional[str] = None) -> str:
+    lines = ["# Minecraft Server Properties"]
+    if header:
+        lines.append(f"# {header}")
+    lines.extend(f"{key}={value}" for key, value in props.items())
+    return "\n".join(lines) + "\n"
+
+
+class MetadataCache:
+    """Cache {chemin: ((size, mtime_ns), objet figé)}."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def load(self, path: str, parser: Callable[[str, str], Any]):
+        """Retourne la vue figée du fichier parsé, ou None s'il n'existe pas."""
+        sig = self._signature(path)
+        if sig is None:
+            self.invalidate(path)
+            return None
+        with self._lock:
+            cached = self._entries.get(path)
+        if cached and cached[0] == sig:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                raw = f.read()
+        except OSError as e:
+            logger.warning(f"Erreur lecture de {path}: {e}")
+            return None
+        value = freeze(parser(raw, path))
+        with self._lock:
+            self._entries[path] = (sig, value)
+        return value
+
+    def put(self, path: str, value):
+        """Enregistre la valeur qui vient d'être écrite dans *path*."""
+        sig = self._signature(path)
+        frozen = freeze(value)
+        with self._lock:
+            if sig is None:
+                self._entries.pop(path, None)
+            else:
+                self._entries[path] = (sig, frozen)
+        return frozen
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def invalidate_tree(self, root: str):
+        """Oublie toutes les entrées situées sous *root* (renommage/suppression)."""
+        prefix = os.path.join(root, "")
+        with self._lock:
+            for p in [p for p in self._entries if p.startswith(prefix)]:
+                del self._entries[p]
@@ -0,0 +1,215 @@
+"""
+Agrégations côté serveur sur les séries de métriques stockées.
+
+`rollup` découpe une série en seaux de `step` secondes sur [start, end] et
+calcule pour chaque seau les agrégations demandées (avg, min, max, sum,
+count, last, pXX, rate). Les calculs sont vectorisés avec NumPy (bincount /
+reduceat sur les données triées par seau); une implémentation Python pure
+sert de repli. La réponse est une liste de valeurs par agrégation, alignée
+sur une grille de timestamps commune, prête pour les graphiques.
+"""
+import math
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+from core.tsdb import TIERS
+
+SUPPORTED_AGGS = ("avg", "min", "max", "sum", "count", "last", "rate")
+MAX_POINTS = 2000
+
+
+def parse_aggs(raw: Optional[str]) -> List[str]:
+    aggs = [a.strip().lower() for a in (raw or "avg").split(",") if a.strip()]
+    for agg in aggs:
+        if agg not in SUPPORTED_AGGS and not (agg.startswith("p") and agg[1:].isdigit() and 0 < int(agg[1:]) < 100):
+            raise ValueError(f"Agrégation inconnue: {agg}")
+    return aggs
+
+
+def choose_tier(start: float, end: float, step: float, now: float) -> str:
+    """Niveau le plus fin dont le pas tient dans *step* et dont la rétention couvre *start*."""
+    chosen = TIERS[-1][0]
+    for name, tier_step, _, retention in reversed(TIERS):
+        if tier_step <= step and start >= now - retention:
+            chosen = name
+    return chosen
+
+
+def _grid(start: float, end: float, step: float) -> int:
+    return max(int(math.ceil((end - start) / step)), 1)
+
+
+def rollup(timestamps: Sequence[float], values: Sequence[float], start: float, end: float,
+           step: float, aggs: Sequence[str]) -> Dict[str, List[Optional[float]]]:
+    """{agg: [valeur par seau]} (None pour un seau vide)."""
+    nbins = _grid(start, end, step)
+    if HAS_NUMPY:
+        return _rollup_numpy(np.asarray(timestamps, dtype=np.float64),
+                             np.asarray(values, dtype=np.float64), start, step, nbins, aggs)
+    return _rollup_python(timestamps, values, start, step, nbins, aggs)
+
+
+def _rollup_numpy(ts, vals, start, step, nbins, aggs):
+    mask = ~np.isnan(vals) & (ts >= start)
+    ts, vals = ts[mask], vals[mask]
+    bins = ((ts - start) // step).astype(np.int64)
+    keep = bins < nbins
+    ts, vals, bins = ts[keep], vals[keep], bins[keep]
+
+    # Tri stable par (seau, temps): chaque seau devient une tranche contiguë
+    order = np.lexsort((ts, bins))
+    ts, vals, bins = ts[order], vals[order], bins[order]
+    counts = np.bincount(bins, minlength=nbins)
+    present = counts > 0
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty_starts = starts[present]
+
+    out = {}
+    for agg in aggs:
+        res = np.full(nbins, np.nan)
+        if vals.size:
+            if agg == "avg":
+                sums = np.bincount(bins, weights=vals, minlength=nbins)
+                res[present] = sums[present] / counts[present]
+            elif agg == "sum":
+                res[present] = np.bincount(bins, weights=vals, minlength=nbins)[present]
+            elif agg == "count":
+                res = counts.astype(np.float64)
+            elif agg == "min":
+                res[present] = np.minimum.reduceat(vals, nonempty_starts)
+            elif agg == "max":
+                res[present] = np.maximum.reduceat(vals, nonempty_starts)
+            elif agg == "last":
+                res[present] = vals[nonempty_starts + counts[present] - 1]
+            elif agg == "rate":
+                first = nonempty_starts
+                last = nonempty_starts + counts[present] - 1
+                dt = ts[last] - ts[first]
+                dv = vals[last] - vals[first]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    rate = np.where(dt > 0, dv / dt, np.nan)
+                # Compteur remis à zéro (redémarrage du conteneur): pas de taux négatif
+                res[present] = np.where(rate < 0, np.nan, rate)
+            else:
+                q = int(agg[1:]) / 100.0
+                # Données triées par seau puis par valeur: interpolation linéaire vectorisée
+                order_v = np.lexsort((vals, bins))
+                sorted_vals = vals[order_v]
+                n = counts[present]
+                k = (n - 1) * q
+                lo = np.floor(k).astype(np.int64)
+                hi = np.minimum(lo + 1, n - 1)
+                frac = k - lo
+                base = nonempty_starts
+                res[present] = sorted_vals[base + lo] + (sorted_vals[base + hi] - sorted_vals[base + lo]) * frac
+        elif agg == "count":
+            res = np.zeros(nbins)
+        out[agg] = [None if math.isnan(v) else round(float(v), 4) for v in res]
+    return out
+
+
+def _rollup_python(timestamps, values, start, step, nbins, aggs):
+    buckets: List[List[tuple]] = [[] for _ in range(nbins)]
+    for t, v in zip(timestamps, values):
+        if v != v or t < start:
+            continue
+        b = int((t - start) // step)
+        if b < nbins:
+            buckets[b].append((t, v))
+    out = {agg: [] for agg in aggs}
+    for points in buckets:
+        points.sort()
+        vals = [v for _, v in points]
+        for agg in aggs:
+            if agg == "count":
+                out[agg].append(float(len(vals)))
+                continue
+            if not vals:
+                out[agg].append(None)
+                continue
+            if agg == "avg":
+                r = sum(vals) / len(vals)
+            elif agg == "sum":
+                r = sum(vals)
+            elif agg == "min":
+                r = min(vals)
+            elif agg == "max":
+                r = max(vals)
+            elif agg == "last":
+                r = vals[-1]
+            elif agg == "rate":
+                dt = points[-1][0] - points[0][0]
+                r = (vals[-1] - vals[0]) / dt if dt > 0 and vals[-1] >= vals[0] else None
+            else:
+                s = sorted(vals)
+                k = (len(s) - 1) * int(agg[1:]) / 100.0
+                lo = int(math.floor(k))
+                hi = min(lo + 1, len(s) - 1)
+                r = s[lo] + (s[hi] - s[lo]) * (k - lo)
+            out[agg].append(None if r is None else round(r, 4))
+    return out
+
+
+def _rollup_tier(data: dict, field: str, start: float, end: float, step: float,
+                 aggs: Sequence[str]) -> Dict[str, List[Optional[float]]]:
+    """Agrégations sur un niveau agrégé, où chaque point résume `<champ>_count` échantillons.
+
+    min/max s'appuient sur les extrêmes du seau; count, sum et avg sont
+    pondérés par le nombre d'échantillons du champ (pas par le nombre de
+    points ni par le total du seau, qui compte aussi les valeurs absentes).
+    """
+    ts, values = data["timestamp"], data[field]
+    out = {}
+    sums = counts = None
+    for agg in aggs:
+        if agg in ("count", "sum", "avg"):
+            if sums is None:
+                # Le point n'a aucun échantillon du champ si sa moyenne est absente
+                samples = [c if v == v and c else math.nan for v, c in zip(values, data[f"{field}_count"])]
+                sums = rollup(ts, [v * c for v, c in zip(values, samples)], start, end, step, ["sum"])["sum"]
+                counts = rollup(ts, samples, start, end, step, ["sum"])["sum"]
+            if agg == "count":
+                out[agg] = [c or 0.0 for c in counts]
+            elif agg == "sum":
+                out[agg] = sums
+            else:
+                out[agg] = [round(s / c, 4) if s is not None and c else None for s, c in zip(sums, counts)]
+        else:
+            column = data.get(f"{field}_{agg}", values) if agg in ("min", "max") else values
+            out.update(rollup(ts, column, start, end, step, [agg]))
+    return out
+
+
+def query(store, keys: Sequence[str], fields: Sequence[str], start: float, end: float,
+          step: float, aggs: Sequence[str], now: float) -> dict:
+    """Requête multi-séries: {"timestamps", "tier", "series": {clé: {champ: {agg: [...]}}}}."""
+    nbins = _grid(start, end, step)
+    if nbins > MAX_POINTS:
+        raise ValueError(f"Trop de points ({nbins}), augmentez step (max {MAX_POINTS})")
+    tier = choose_tier(start, end, step, now)
+    series = {}
+    for key in keys:
+        data = store.query(key, start, end, tier)
+        if data is None:
+            continue
+        series[key] = {}
+        for field in fields:
+            if field not in data:
+                continue
+            values = data[field]
+            if tier != "raw":
+                series[key][field] = _rollup_tier(data, field, start, end, step, aggs)
+            else:
+                series[key][field] = rollup(data["timestamp"], values, start, end, step, aggs)
+    return {
+        "tier": tier,
+        "step": step,
+        "timestamps": [start + i * step for i in range(nbins)],
+        "series": series,
+    }
@@ -6,6 +6,8 @@ import time
 from collections import deque
 from datetime import datetime
 
+from core.ring_buffer import ColumnarRing
+
 # Import notification system
 try:
     import logging
@@ -22,13 +24,28 @@ except Exception as e:
 
 
 class MetricsCollector:
-    def __init__(self, max_history=300):  # 5 minutes à 1 mesure/seconde
+    SYSTEM_FIELDS = ("cpu", "ram_used", "ram_total", "ram_percent", "disk_used", "disk_total", "disk_percent")
+    SERVER_FIELDS = ("cpu", "ram", "ram_mb", "ram_percent", "players", "players_online", "tps",
+                     "mspt", "loaded_chunks", "entities")
+
+    def __init__(self, max_history=300, store=None):  # 5 minutes à 1 mesure/seconde
         self.max_history = max_history
-        self.system_metrics = deque(maxlen=max_history)
-        self.server_metrics = {}  # {server_name: deque}
+        # Stockage persistant optionnel (core.tsdb.TimeSeriesStore) pour l'historique long
+        self.store = store
+        # Historiques colonnaires (float64) au lieu de deques de dicts
+        self.system_metrics = ColumnarRing(self.SYSTEM_FIELDS, max_history)
+        self.server_metrics = {}  # {server_name: ColumnarRing}
         self._running = False
         self._thread = None
         self._lock = threading.Lock()
+        # Dernier échantillon système complet, remplacé d'un bloc à chaque collecte
+        self._latest = None
+        self._process = psutil.Process()
+        self._cpu_count = psutil.cpu_count()
+        self._cpu_count_physical = psutil.cpu_count(logical=False)
+        # Amorce des compteurs CPU: les appels suivants mesurent le delta depuis le précédent
+        psutil.cpu_percent(None)
+        self._process.cpu_percent(None)
         
     def start(self):
         """Démarre la collecte en arrière-plan"""
@@ -59,112 +76,121 @@ class MetricsCollector:
             time.sleep(1)  # Collecte toutes les secondes
     
     def _collect_system(self):
-        """Collecte les métriques système"""
-        with self._lock:
-            cpu = psutil.cpu_percent(interval=0.1)
-            mem = psutil.virtual_memory()
-            disk = psutil.disk_usage("/")
-            
-            self.system_metrics.append({
-                "timestamp": datetime.now().isoformat(),
-                "cpu": cpu,
-                "ram_used": round(mem.used / (1024**3), 2),  # GB
-                "ram_total": round(mem.total / (1024**3), 2),
-                "ram_percent": mem.percent,
-                "disk_used": round(disk.used / (1024**3), 2),
-                "disk_total": round(disk.total / (1024**3), 2),
-                "disk_percent": round(disk.percent, 1)
-            })
-    
-    def update_server_metrics(self, server_name, data):
-        """Met à jour les métriques d'un serveur"""
-        with self._lock:
-            if server_name not in self.server_metrics:
-                self.server_metrics[server_name] = deque(maxlen=self.max_history)
-            
-            self.server_metrics[server_name].append({
-                "timestamp": datetime.now().isoformat(),
-                **data
-            })
-    
-    def get_system_metrics(self, limit=60):
-        """Récupère les dernières métriques système"""
-        with self._lock:
-            data = list(self.system_metrics)
-            return data[-limit:] if len(data) > limit else data
-    
-    def get_current_system(self):
-        """Récupère les métriques système actuelles.
+        """Collecte les métriques système.
 
-        Pour garantir l'exactitude et la cohérence avec l'historique, on retourne
-        la dernière entrée collectée par la boucle `_collect_system` si elle est
-        disponible. Cela évite les mesures ponctuelles qui peuvent diverger
-        (ex: différents intervalles d'échantillonnage ou blocage par `psutil`).
+        CPU mesuré par delta depuis la collecte précédente (sans intervalle
+        bloquant); l'échantillon est construit hors verrou puis publié d'un bloc.
         """
-        with self._lock:
-            if len(self.system_metrics) > 0:
-                last = self.system_metrics[-1]
-                return {
-                    "timestamp": last.get("timestamp", datetime.now().isoformat()),
-                    "cpu": {
-                        "percent": last.get("cpu", 0),
-                        "cores": psutil.cpu_count(),
-                        "cores_physical": psutil.cpu_count(logical=False)
-                    },
-                    "memory": {
-                        "used_gb": last.get("ram_used", 0),
-                        "total_gb": last.get("ram_total", 0),
-                        "available_gb": round((psutil.virtual_memory().available) / (1024**3), 2),
-                        "percent": last.get("ram_percent", 0)
-                    },
-                    "disk": {
-                        "used_gb": last.get("disk_used", 0),
-                        "total_gb": last.get("disk_total", 0),
-                        "free_gb": round((psutil.disk_usage('/').free) / (1024**3), 2),
-                        "percent": last.get("disk_percent", 0)
-                    },
-                    "process": {
-                        "memory_mb": round(psutil.Process().memory_info().rss / (1024**2), 2),
-                        "cpu_percent": psutil.Process().cpu_percent()
-                    }
-                }
-
-        cpu = psutil.cpu_percent(interval=0.1)
+        cpu = psutil.cpu_percent(None)
         mem = psutil.virtual_memory()
         disk = psutil.disk_usage("/")
-        process = psutil.Process()
-        return {
-            "timestamp": datetime.now().isoformat(),
+        now = datetime.now()
+        
+        sample = {
+            "cpu": cpu,
+            "ram_used": round(mem.used / (1024**3), 2),  # GB
+            "ram_total": round(mem.total / (1024**3), 2),
+            "ram_percent": mem.percent,
+            "disk_used": round(disk.used / (1024**3), 2),
+            "disk_total": round(disk.total / (1024**3), 2),
+            "disk_percent": round(disk.percent, 1)
+        }
+        current = {
+            "timestamp": now.isoformat(),
             "cpu": {
                 "percent": cpu,
-                "cores": psutil.cpu_count(),
-                "cores_physical": psutil.cpu_count(logical=False)
+                "cores": self._cpu_count,
+                "cores_physical": self._cpu_count_physical
             },
             "memory": {
-                "used_gb": round(mem.used / (1024**3), 2),
-                "total_gb": round(mem.total / (1024**3), 2),
+                "used_gb": sample["ram_used"],
+                "total_gb": sample["ram_total"],
                 "available_gb": round(mem.available / (1024**3), 2),
                 "percent": mem.percent
             },
             "disk": {
-                "used_gb": round(disk.used / (1024**3), 2),
-                "total_gb": round(disk.total / (1024**3), 2),
+                "used_gb": sample["disk_used"],
+                "total_gb": sample["disk_total"],
                 "free_gb": round(disk.free / (1024**3), 2),
-                "percent": round(disk.percent, 1)
+                "percent": sample["disk_percent"]
             },
             "process": {
-                "memory_mb": round(process.memory_info().rss / (1024**2), 2),
-                "cpu_percent": process.cpu_percent()
+                "memory_mb": round(self._process.memory_info().rss / (1024**2), 2),
+                "cpu_percent": self._process.cpu_percent(None)
             }
         }
+        self.system_metrics.append(sample, timestamp=now.timestamp())
+        self._latest = current
+        if self.store is not None:
+            self.store.append("system", now.timestamp(), sample, self.SYSTEM_FIELDS)
+    
+    def update_server_metrics(self, server_name, data):
+        """Met à jour les métriques d'un serveur"""
+        with self._lock:
+            ring = self.server_metrics.get(server_name)
+            if ring is None:
+                ring = self.server_metrics[server_name] = ColumnarRing(self.SERVER_FIELDS, self.max_history)
+        ts = time.time()
+        ring.append(data, timestamp=ts)
+        if self.store is not None:
+            self.store.append(f"server/{server_name}", ts, data, self.SERVER_FIELDS)
+    
+    def get_system_metrics(self, limit=60):
+        """Récupère les dernières métriques système"""
+        return self.system_metrics.to_records(limit)
+    
+    def get_current_system(self):
+        """Récupère les métriques système actuelles.
+
+        Retourne le dernier échantillon publié par `_collect_system` (aucun
+        appel psutil dans le chemin de la requête), ce qui garantit aussi la
+        cohérence avec l'historique. Une collecte est faite si aucun
+        échantillon n'existe encore.
+        """
+        current = self._latest
+        if current is None:
+            self._collect_system()
+            current = self._latest
+        return current
     
     def get_server_metrics(self, server_name, limit=60):
         """Récupère les métriques d'un serveur"""
-        with self._lock:
-            if server_name not in self.server_metrics:
-                return []
-            data = list(self.server_metrics[server_name])
-            return data[-limit:] if len(data) > limit else data
+        ring = self.server_metrics.get(server_name)
+        if ring is None:
+            return []
+        return ring.to_records(limit)
+
+    def query_history(self, key, start, end=None, tier=None):
+        """Historique persistant sur une plage ("system" ou "server/<nom>").
+
+        Même format que get_system_metrics / get_server_metrics; sur les
+        niveaux agrégés (1m, 1h) chaque point porte la moyenne du seau ainsi
+        que `<champ>_min` / `<champ>_max`.
+        """
+        if self.store is None:
+            return None, []
+        result = self.store.query(key, start, end, tier)
+        if result is None:
+            return tier, []
+        timestamps = result.pop("timestamp")
+        tier = result.pop("tier")
+        result.pop("fields")
+        records = []
+        for k, ts in enumerate(timestamps):
+            record = {"timestamp": datetime.fromtimestamp(ts).isoformat()}
+            for field, values in result.items():
+                v = values[k]
+                if v == v:
+                    record[field] = v
+            records.append(record)
+        return tier, records
+
+    def summarize_server(self, server_name, fields=("cpu", "ram_mb"), limit=60, ops=("mean", "min", "max")):
+        """Réductions (moyenne, min, max, centiles) sur l'historique d'un serveur"""
+        ring = self.server_metrics.get(server_name)
+        if ring is None:
+            return {f: {op: None for op in ops} for f in fields}
+        return ring.summarize(fields, limit, ops)
 
 
 class ServerMonitor:
@@ -188,6 +214,7 @@ class ServerMonitor:
             "disk_percent": 95,
             "tps_min": 15 
         }
+        self._tps_alerted = {}  # {server_name: timestamp dernière alerte TPS}
     
     def set_auto_restart(self, server_name, enabled=True, max_restarts=3):
         """Configure auto-restart for a server"""
@@ -225,6 +252,7 @@ class ServerMonitor:
         while self._running:
             try:
                 self._check_servers()
+                self._check_tps()
                 self._check_system_health()
             except Exception as e:
                 logger.info(f"[MONITOR] Erreur: {e}")
@@ -264,6 +292,20 @@ class ServerMonitor:
             except:
                 pass
     
+    def _check_tps(self):
+        """Alerte sur les serveurs dont le TPS mesuré en jeu est trop bas"""
+        now = time.time()
+        for name, ring in list(self.metrics.server_metrics.items()):
+            summary = ring.summarize(("tps",), limit=3, ops=("mean",))
+            tps = summary["tps"]["mean"]
+            if tps is None or tps >= self.alert_thresholds["tps_min"]:
+                continue
+            # Une alerte par serveur toutes les 10 minutes au plus
+            if now - self._tps_alerted.get(name, 0) < 600:
+                continue
+            self._tps_alerted[name] = now
+            self._add_alert("tps", name, f"TPS bas sur {name}: {tps:.1f}")
+    
     def _check_system_health(self):
         """Vérifie la santé système"""
         current = self.metrics.get_current_system()
@@ -296,7 +338,8 @@ class ServerMonitor:
             "restart": "Auto Restart",
             "cpu": "High CPU",
             "memory": "High Memory",
-            "disk": "Disk Full"
+            "disk": "Disk Full",
+            "tps": "Low TPS"
         }.get(alert_type, "Alert")
         
         notify(
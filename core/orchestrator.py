@@ -0,0 +1,251 @@
+"""
+Orchestration concurrente des actions de cycle de vie (start / stop /
+restart / kill) sur plusieurs serveurs.
+
+Les actions s'exécutent en tâche de fond (JobManager) avec un plafond de
+concurrence. En mode « rolling », les serveurs sont traités par vagues de N:
+la vague suivante ne part qu'une fois les serveurs de la précédente sains
+(conteneur healthy puis réponse au Server List Ping). Les démarrages sont
+ordonnés par RAM demandée et admis seulement si la mémoire de l'hôte le
+permet. L'état de chaque serveur est publié dans `job.result` au fil de l'eau.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import psutil
+
+from core.mc_ping import ping_server
+from core.utils import parse_size_to_mb
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("start", "stop", "restart", "kill")
+DEFAULT_CONCURRENCY = int(os.getenv("MC_LIFECYCLE_CONCURRENCY", "8"))
+HEALTH_TIMEOUT = float(os.getenv("MC_HEALTH_TIMEOUT", "180"))
+# Marge laissée au système et au panel lors de l'admission des démarrages
+HOST_RAM_RESERVE_MB = int(os.getenv("MC_HOST_RAM_RESERVE_MB", "512"))
+# Sans attente de santé, durée maximale de réservation de la RAM d'un démarrage
+RAM_SETTLE_TIMEOUT = float(os.getenv("MC_RAM_SETTLE_TIMEOUT", "60"))
+
+
+class _RamGate:
+    """Admission des démarrages selon la mémoire disponible de l'hôte.
+
+    La RAM d'une JVM n'est allouée que progressivement: la demande d'un
+    serveur reste réservée jusqu'à ce qu'il soit sain, pour ne pas admettre
+    trop de démarrages sur la foi de `available`.
+    """
+
+    def __init__(self):
+        self._reserved = 0
+        self._cond = threading.Condition()
+
+    def _available(self):
+        return psutil.virtual_memory().available // (1024 * 1024) - HOST_RAM_RESERVE_MB
+
+    def acquire(self, mb: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._available() - self._reserved >= mb:
+                    self._reserved += mb
+                    return True
+                # Rien en cours de démarrage: attendre ne libérera rien
+                if self._reserved == 0 or time.monotonic() >= deadline:
+                    return False
+                self._cond.wait(min(2.0, max(deadline - time.monotonic(), 0)))
+
+    def release(self, mb: int):
+        with self._cond:
+            self._reserved = max(0, self._reserved - mb)
+            self._cond.notify_all()
+
+
+class LifecycleOrchestrator:
+    def __init__(self, srv_mgr, job_mgr, concurrency: int = DEFAULT_CONCURRENCY,
+                 health_timeout: float = HEALTH_TIMEOUT):
+        self.srv_mgr = srv_mgr
+        self.job_mgr = job_mgr
+        self.concurrency = concurrency
+        self.health_timeout = health_timeout
+        self._ram = _RamGate()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def submit(self, action: str, servers: List[str], concurrency: Optional[int] = None,
+               wave_size: Optional[int] = None, wait_healthy: Optional[bool] = None):
+        """Lance l'action en tâche de fond; retourne le Job."""
+        self._validate(action, servers)
+        return self.job_mgr.create_job(f"lifecycle-{action}", self._job_target, action, list(servers),
+                                       concurrency, wave_size, wait_healthy)
+
+    def run(self, action: str, servers: List[str], concurrency: Optional[int] = None,
+            wave_size: Optional[int] = None, wait_healthy: Optional[bool] = None, job=None) -> dict:
+        """Exécute l'action et bloque jusqu'à la fin; retourne l'état par serveur."""
+        self._validate(action, servers)
+        concurrency = max(1, concurrency or self.concurrency)
+        # Par défaut, les vagues attendent que leurs serveurs soient sains
+        if wait_healthy is None:
+            wait_healthy = bool(wave_size)
+        if action in ("stop", "kill"):
+            wait_healthy = False
+
+        order = self._order(action, servers)
+        progress = {
+            "action": action,
+            "total": len(order),
+            "done": 0,
+            "servers": {name: {"state": "pending"} for name in order},
+        }
+        if job is not None:
+            job.result = progress
+
+        if wave_size:
+            waves = [order[i:i + wave_size] for i in range(0, len(order), wave_size)]
+            concurrency = min(concurrency, wave_size)
+        else:
+            waves = [order]
+
+        halted = False
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"lifecycle-{action}") as pool:
+            for index, wave in enumerate(waves, 1):
+                if halted or self._cancelled(job):
+                    for name in wave:
+                        progress["servers"][name]["state"] = "cancelled" if not halted else "skipped"
+                    continue
+                if len(waves) > 1:
+                    self._log(job, f"Vague {index}/{len(waves)}: {', '.join(wave)}")
+                futures = [pool.submit(self._one, action, name, wait_healthy, progress, job) for name in wave]
+                wait(futures)
+                if wave_size and any(progress["servers"][n]["state"] == "failed" for n in wave):
+                    # Rolling: on n'enchaîne pas sur un échec
+                    self._log(job, f"Vague {index} en échec, arrêt du déploiement progressif")
+                    halted = True
+
+        summary: Dict[str, int] = {}
+        for entry in progress["servers"].values():
+            summary[entry["state"]] = summary.get(entry["state"], 0) + 1
+        progress["summary"] = summary
+        return progress
+
+    # ------------------------------------------------------------------
+    # Interne
+    # ------------------------------------------------------------------
+    def _validate(self, action, servers):
+        if action not in ACTIONS:
+            raise ValueError(f"Action inconnue: {action}")
+        if not servers:
+            raise ValueError("Aucun serveur sélectionné")
+
+    def _job_target(self, job, action, servers, concurrency, wave_size, wait_healthy):
+        return self.run(action, servers, concurrency, wave_size, wait_healthy, job=job)
+
+    def _cancelled(self, job) -> bool:
+        return job is not None and job.status == "cancelled"
+
+    def _log(self, job, message):
+        if job is not None:
+            self.job_mgr.log(job, message)
+        else:
+            logger.info(f"[LIFECYCLE] {message}")
+
+    def _ram_mb(self, name) -> int:
+        try:
+            return parse_size_to_mb(self.srv_mgr.get_server_config_view(name).get("ram_max"))
+        except Exception:
+            return parse_size_to_mb(None)
+
+    def _order(self, action, servers):
+        servers = list(dict.fromkeys(servers))
+        if action in ("start", "restart"):
+            # Les plus gros d'abord, tant que la mémoire est la moins fragmentée
+            servers.sort(key=self._ram_mb, reverse=True)
+        return servers
+
+    def _one(self, action, name, wait_healthy, progress, job):
+        entry = progress["servers"][name]
+        if self._cancelled(job):
+            entry["state"] = "cancelled"
+            return
+        started = time.monotonic()
+        reserved = 0
+        try:
+            if action == "start" and self.srv_mgr.is_running(name):
+                entry["state"] = "skipped"
+                entry["message"] = "Déjà démarré"
+                return
+            if action == "start":
+                # (un restart libère sa propre mémoire avant de la reprendre)
+                mb = self._ram_mb(name)
+                entry["state"] = "queued"
+                if not self._ram.acquire(mb, self.health_timeout):
+                    raise Exception(f"Mémoire hôte insuffisante ({mb} Mo demandés)")
+                reserved = mb
+
+            entry["state"] = "running"
+            self.srv_mgr.action(name, action)
+
+            if wait_healthy:
+                entry["state"] = "waiting"
+                if not self.wait_healthy(name, self.health_timeout):
+                    raise Exception(f"Serveur non sain après {int(self.health_timeout)}s")
+            entry["state"] = "done"
+            self._log(job, f"{name}: {action} OK")
+        except Exception as e:
+            entry["state"] = "failed"
+            entry["error"] = str(e)
+            self._log(job, f"{name}: {action} échoué ({e})")
+        finally:
+            if reserved and entry["state"] == "done" and not wait_healthy:
+                self._release_when_settled(name, reserved)
+            elif reserved:
+                self._ram.release(reserved)
+            entry["duration"] = round(time.monotonic() - started, 2)
+            with self._lock:
+                progress["done"] += 1
+                if job is not None:
+                    job.progress = int(progress["done"] * 100 / max(1, progress["total"]))
+
+    def _release_when_settled(self, name: str, mb: int):
+        """Libère la réservation une fois le serveur sain, ou après RAM_SETTLE_TIMEOUT.
+
+        La JVM vient à peine de démarrer: libérer tout de suite laisserait le
+        démarrage suivant s'admettre sur une mémoire `available` encore intacte.
+        """
+        def settle():
+            try:
+                self.wait_healthy(name, RAM_SETTLE_TIMEOUT)
+            except Exception as e:
+                logger.debug(f"[LIFECYCLE] Attente de santé de {name} interrompue: {e}")
+            finally:
+                self._ram.release(mb)
+
+        threading.Thread(target=settle, name=f"ram-settle-{name}", daemon=True).start()
+
+    def wait_healthy(self, name: str, timeout: float) -> bool:
+        """Attend que le conteneur soit healthy puis que le serveur réponde au ping."""
+        deadline = time.monotonic() + timeout
+        if self.srv_mgr._is_docker(name):
+            watcher = self.srv_mgr.state_watcher
+            if watcher.connected:
+                watcher.wait_for(
+                    f"mc-{name}",
+                    lambda s: s is not None and (not s.running or s.health != "starting"),
+                    timeout,
+                )
+                state = watcher.get(f"mc-{name}")
+                if state is not None and (not state.running or state.health == "unhealthy"):
+                    return False
+
+        host, port, _ = self.srv_mgr.get_ping_target(name)
+        while time.monotonic() < deadline:
+            if ping_server(host, port, timeout=2.0).get("online"):
+                return True
+            time.sleep(2)
+        return False
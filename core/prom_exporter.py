@@ -0,0 +1,183 @@
+"""
+Exporteur Prometheus de la flotte (/metrics).
+
+Un collecteur personnalisé rend, au moment du scrape, des gauges étiquetées
+`server` / `owner` à partir des données déjà en mémoire (instantané du
+FleetStatsCollector, historique du MetricsCollector, table d'état des
+événements Docker, registre des serveurs): aucun appel Docker ni lecture de
+fichier n'est fait pendant le scrape. Des histogrammes mesurent la durée des
+sauvegardes et des démarrages / arrêts / redémarrages.
+"""
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Histogram, REGISTRY
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    HAS_PROMETHEUS = True
+except ImportError:
+    HAS_PROMETHEUS = False
+
+logger = logging.getLogger(__name__)
+
+if HAS_PROMETHEUS:
+    BACKUP_DURATION = Histogram(
+        "mcpanel_backup_duration_seconds", "Durée des sauvegardes de serveurs",
+        ["status"], buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600),
+    )
+    LIFECYCLE_DURATION = Histogram(
+        "mcpanel_server_lifecycle_duration_seconds", "Durée des démarrages / arrêts / redémarrages",
+        ["action", "status"], buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+    )
+
+
+@contextmanager
+def _timed(histogram_name, **labels):
+    start = time.perf_counter()
+    status = "success"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        if HAS_PROMETHEUS:
+            histogram = BACKUP_DURATION if histogram_name == "backup" else LIFECYCLE_DURATION
+            histogram.labels(status=status, **labels).observe(time.perf_counter() - start)
+
+
+def time_backup():
+    """Contexte mesurant la durée d'une sauvegarde."""
+    return _timed("backup")
+
+
+def time_lifecycle(action):
+    """Contexte mesurant la durée d'un start / stop / restart."""
+    return _timed("lifecycle", action=action)
+
+
+def timed_lifecycle(action):
+    """Décorateur de méthode équivalent à `time_lifecycle`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with time_lifecycle(action):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_backup(fn):
+    """Décorateur de méthode équivalent à `time_backup`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with time_backup():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class FleetCollector:
+    """Collecteur Prometheus rendu depuis l'état en mémoire du panel."""
+
+    def __init__(self, srv_mgr, fleet_stats, metrics_collector):
+        self.srv_mgr = srv_mgr
+        self.fleet_stats = fleet_stats
+        self.metrics = metrics_collector
+
+    def describe(self):
+        # Pas de description anticipée: évite un collect() à l'enregistrement
+        return []
+
+    def collect(self):
+        labels = ["server", "owner"]
+        up = GaugeMetricFamily("mcpanel_server_up", "Serveur en ligne (1) ou arrêté (0)", labels=labels)
+        cpu = GaugeMetricFamily("mcpanel_server_cpu_percent", "CPU du serveur (100 = un cœur)", labels=labels)
+        mem = GaugeMetricFamily("mcpanel_server_memory_bytes", "Mémoire utilisée hors cache", labels=labels)
+        mem_limit = GaugeMetricFamily("mcpanel_server_memory_limit_bytes", "Limite mémoire du conteneur", labels=labels)
+        players = GaugeMetricFamily("mcpanel_server_players_online", "Joueurs connectés", labels=labels)
+        tps = GaugeMetricFamily("mcpanel_server_tps", "Ticks par seconde", labels=labels)
+        restarts = GaugeMetricFamily("mcpanel_server_restart_count", "Redémarrages Docker du conteneur", labels=labels)
+        ooms = CounterMetricFamily("mcpanel_server_oom_kills", "Processus tués par l'OOM killer", labels=labels)
+        io_read = CounterMetricFamily("mcpanel_server_io_read_bytes", "Octets lus sur disque", labels=labels)
+        io_write = CounterMetricFamily("mcpanel_server_io_write_bytes", "Octets écrits sur disque", labels=labels)
+
+        snapshot = self.fleet_stats.snapshot()
+        states = self.srv_mgr.state_watcher.snapshot()
+        for entry in self.srv_mgr.registry.list():
+            name = entry.name
+            stats = snapshot.get(name)
+            owner = entry.owner or (stats or {}).get("owner") or ""
+            lv = [name, owner]
+            up.add_metric(lv, 1 if stats else 0)
+            state = states.get(f"mc-{name}")
+            if state is not None:
+                restarts.add_metric(lv, state.restart_count)
+            if not stats:
+                continue
+            cpu.add_metric(lv, stats.get("cpu", 0))
+            mem.add_metric(lv, stats.get("ram_mb", 0) * 1024 * 1024)
+            if stats.get("ram_limit_mb"):
+                mem_limit.add_metric(lv, stats["ram_limit_mb"] * 1024 * 1024)
+            for family, key in ((ooms, "oom_kills"), (io_read, "io_read_bytes"), (io_write, "io_write_bytes")):
+                if key in stats:
+                    family.add_metric(lv, stats[key])
+            ring = self.metrics.server_metrics.get(name)
+            last = ring.last() if ring is not None else None
+            if last:
+                if "players_online" in last or "players" in last:
+                    players.add_metric(lv, last.get("players_online", last.get("players", 0)))
+                if "tps" in last:
+                    tps.add_metric(lv, last["tps"])
+
+        yield from (up, cpu, mem, mem_limit, players, tps, restarts, ooms, io_read, io_write)
+
+        current = self.metrics.get_current_system()
+        if current:
+            yield GaugeMetricFamily("mcpanel_host_cpu_percent", "CPU de l'hôte", value=current["cpu"]["percent"])
+            yield GaugeMetricFamily("mcpanel_host_memory_percent", "RAM de l'hôte", value=current["memory"]["percent"])
+            yield GaugeMetricFamily("mcpanel_host_disk_percent", "Disque de l'hôte", value=current["disk"]["percent"])
+
+
+def register_fleet_collector(srv_mgr, fleet_stats, metrics_collector):
+    """Enregistre le collecteur de flotte dans le registre Prometheus par défaut."""
+    if not HAS_PROMETHEUS:
+        logger.info("[PROMETHEUS] prometheus_client absent, exporteur de flotte désactivé")
+        return None
+    collector = FleetCollector(srv_mgr, fleet_stats, metrics_collector)
+    REGISTRY.register(collector)
+    return collector
+
+
+class ProxyCollector:
+    """Compteurs par route du proxy Minecraft (core/mc_proxy.py)."""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        labels = ["route"]
+        conns = CounterMetricFamily("mcpanel_proxy_connections", "Connexions routées par le proxy", labels=labels)
+        active = GaugeMetricFamily("mcpanel_proxy_active_connections", "Connexions en cours de relais", labels=labels)
+        bytes_in = CounterMetricFamily("mcpanel_proxy_received_bytes", "Octets client -> serveur", labels=labels)
+        bytes_out = CounterMetricFamily("mcpanel_proxy_sent_bytes", "Octets serveur -> client", labels=labels)
+        errors = CounterMetricFamily("mcpanel_proxy_errors", "Connexions en échec (backend injoignable...)", labels=labels)
+        for route, stats in self.proxy.stats().items():
+            conns.add_metric([route], stats["connections"])
+            active.add_metric([route], stats["active"])
+            bytes_in.add_metric([route], stats["bytes_in"])
+            bytes_out.add_metric([route], stats["bytes_out"])
+            errors.add_metric([route], stats["errors"])
+        yield from (conns, active, bytes_in, bytes_out, errors)
+
+
+def register_proxy_collector(proxy):
+    if not HAS_PROMETHEUS:
+        return None
+    collector = ProxyCollector(proxy)
+    REGISTRY.register(collector)
+    return collector
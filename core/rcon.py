@@ -1,9 +1,31 @@
+import asyncio
+import itertools
 import socket
 import struct
 import logging
+import threading
+import time
+
+from core import aio_loop
 
 logger = logging.getLogger(__name__)
 
+# Types de paquets RCON (protocole Source)
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH = 3
+
+# Un paquet vide de type RESPONSE_VALUE envoyé après la commande: le serveur
+# y répond ("Unknown request 0") une fois tous les fragments de la réponse
+# précédente émis, ce qui marque la fin d'une réponse multi-paquets.
+END_MARKER_TYPE = SERVERDATA_RESPONSE_VALUE
+
+
+def _encode_packet(request_id, ptype, payload):
+    data = struct.pack('<ii', request_id, ptype) + payload.encode('utf-8') + b'\x00\x00'
+    return struct.pack('<i', len(data)) + data
+
+
 class RconClient:
     def __init__(self, host="localhost", port=25575, password=""):
         self.host = host
@@ -11,7 +33,7 @@ class RconClient:
         self.password = password
         self.sock = None
         self.request_id = 0
-    
+
     def connect(self):
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -21,63 +43,85 @@ class RconClient:
         except Exception as e:
             self.sock = None
             return False, str(e)
-    
+
     def _auth(self):
-        resp = self._send(3, self.password)
-        if resp is None:
-            return False, "Auth failed"
-        return True, "OK"
-    
+        self.request_id += 1
+        try:
+            self.sock.sendall(_encode_packet(self.request_id, SERVERDATA_AUTH, self.password))
+            # Certains serveurs envoient un RESPONSE_VALUE vide avant la réponse d'auth
+            while True:
+                packet = self._recv_packet()
+                if packet is None:
+                    return False, "Auth failed"
+                req_id, ptype, _ = packet
+                if req_id == -1:
+                    return False, "Auth failed"
+                if ptype == SERVERDATA_EXECCOMMAND:  # SERVERDATA_AUTH_RESPONSE
+                    return True, "OK"
+        except Exception as e:
+            logger.error(f"RCON Auth error: {e}")
+            return False, str(e)
+
     def _send(self, ptype, payload):
         self.request_id += 1
-        data = struct.pack('<ii', self.request_id, ptype) + payload.encode('utf-8') + b'\x00\x00'
-        packet = struct.pack('<i', len(data)) + data
-        
+        cmd_id = self.request_id
+        self.request_id += 1
+        marker_id = self.request_id
+
         try:
-            self.sock.sendall(packet)
-            return self._recv()
+            self.sock.sendall(_encode_packet(cmd_id, ptype, payload)
+                              + _encode_packet(marker_id, END_MARKER_TYPE, ""))
+            # Réassemble les fragments jusqu'au marqueur de fin
+            parts = []
+            while True:
+                packet = self._recv_packet()
+                if packet is None:
+                    return None
+                req_id, _, body = packet
+                if req_id == marker_id:
+                    return "".join(parts)
+                if req_id == -1:
+                    return None
+                if req_id == cmd_id:
+                    parts.append(body)
         except Exception as e:
             logger.error(f"RCON Send error: {e}")
             return None
-    
-    def _recv(self):
+
+    def _recv_exact(self, n):
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            read = self.sock.recv_into(view[got:], n - got)
+            if not read:
+                return None
+            got += read
+        return bytes(buf)
+
+    def _recv_packet(self):
         try:
-            # Read length
-            length_data = self.sock.recv(4)
-            if len(length_data) < 4:
+            length_data = self._recv_exact(4)
+            if length_data is None:
                 return None
             length = struct.unpack('<i', length_data)[0]
-            
-            # Read rest
-            data = b''
-            while len(data) < length:
-                chunk = self.sock.recv(length - len(data))
-                if not chunk:
-                    break
-                data += chunk
-            
-            if len(data) < 10:
+            data = self._recv_exact(length)
+            if data is None or len(data) < 10:
                 return None
-            
             req_id, resp_type = struct.unpack('<ii', data[:8])
-            body = data[8:-2].decode('utf-8', errors='replace')
-            
-            if req_id == -1:
-                return None
-            
-            return body
-        except:
+            return req_id, resp_type, data[8:-2].decode('utf-8', errors='replace')
+        except Exception:
             return None
-    
+
     def command(self, cmd):
         if not self.sock:
             success, msg = self.connect()
             if not success:
                 return None, msg
-        
-        resp = self._send(2, cmd)
-        return resp, None if resp else "Command failed"
-    
+
+        resp = self._send(SERVERDATA_EXECCOMMAND, cmd)
+        return resp, None if resp is not None else "Command failed"
+
     def close(self):
         if self.sock:
             try:
@@ -87,13 +131,221 @@ class RconClient:
             self.sock = None
 
 
+class RconError(Exception):
+    pass
+
+
+class AsyncRconConnection:
+    """Connexion RCON persistante et authentifiée, avec pipelining.
+
+    Plusieurs commandes peuvent être en vol: chaque réponse est routée vers
+    son appelant par request id, les fragments étant accumulés jusqu'au
+    marqueur de fin propre à la commande.
+    """
+
+    def __init__(self, host, port, password):
+        self.host = host
+        self.port = port
+        self.password = password
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._ids = itertools.count(1)
+        self._pending = {}   # marker_id -> (cmd_id, [fragments], future)
+        self._by_cmd = {}    # cmd_id -> marker_id
+        self._auth_future = None
+        self._connect_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    async def connect(self, timeout=5.0):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout)
+            self._reader_task = asyncio.ensure_future(self._read_loop())
+            loop = asyncio.get_running_loop()
+            self._auth_future = loop.create_future()
+            auth_id = next(self._ids)
+            self._writer.write(_encode_packet(auth_id, SERVERDATA_AUTH, self.password))
+            await self._writer.drain()
+            try:
+                ok = await asyncio.wait_for(self._auth_future, timeout)
+            except Exception:
+                await self.close()
+                raise
+            if not ok:
+                await self.close()
+                raise RconError("Auth failed")
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header = await self._reader.readexactly(4)
+                length = struct.unpack('<i', header)[0]
+                data = await self._reader.readexactly(length)
+                req_id, ptype = struct.unpack('<ii', data[:8])
+                body = data[8:-2].decode('utf-8', errors='replace')
+                self._dispatch(req_id, ptype, body)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self._fail_all(RconError(f"Connexion RCON perdue: {e}"))
+        except asyncio.CancelledError:
+            self._fail_all(RconError("Connexion RCON fermée"))
+            raise
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+
+    def _dispatch(self, req_id, ptype, body):
+        fut = self._auth_future
+        if fut is not None and not fut.done() and ptype == SERVERDATA_EXECCOMMAND:
+            fut.set_result(req_id != -1)
+            return
+        if req_id in self._pending:
+            # Marqueur de fin: la réponse de la commande associée est complète
+            cmd_id, parts, future = self._pending.pop(req_id)
+            self._by_cmd.pop(cmd_id, None)
+            if not future.done():
+                future.set_result("".join(parts))
+            return
+        marker = self._by_cmd.get(req_id)
+        if marker is not None:
+            self._pending[marker][1].append(body)
+
+    def _fail_all(self, exc):
+        if self._auth_future is not None and not self._auth_future.done():
+            self._auth_future.set_exception(exc)
+        for _, _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+        self._by_cmd.clear()
+
+    async def command(self, cmd, timeout=10.0):
+        if not self.connected:
+            await self.connect()
+        cmd_id = next(self._ids)
+        marker_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[marker_id] = (cmd_id, [], future)
+        self._by_cmd[cmd_id] = marker_id
+        self.last_used = time.monotonic()
+        try:
+            self._writer.write(_encode_packet(cmd_id, SERVERDATA_EXECCOMMAND, cmd)
+                               + _encode_packet(marker_id, END_MARKER_TYPE, ""))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(marker_id, None)
+            self._by_cmd.pop(cmd_id, None)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RconPool:
+    """Pool de connexions RCON persistantes par serveur (host, port, password).
+
+    Les commandes sont envoyées sur la connexion la moins chargée du serveur
+    (pipelining); une connexion perdue est recréée et la commande rejouée une
+    fois. Les connexions inactives sont fermées après *idle_timeout*.
+    """
+
+    def __init__(self, size=2, idle_timeout=300.0):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._pools = {}
+        self._last_prune = time.monotonic()
+
+    async def _connection(self, key):
+        conns = self._pools.setdefault(key, [])
+        live = [c for c in conns if c.connected]
+        if len(live) < len(conns):
+            conns[:] = live
+        idle = [c for c in live if c.in_flight == 0]
+        if idle:
+            return idle[0]
+        if len(conns) < self.size:
+            conn = AsyncRconConnection(*key)
+            conns.append(conn)
+            try:
+                await conn.connect()
+            except Exception:
+                conns.remove(conn)
+                raise
+            return conn
+        return min(conns, key=lambda c: c.in_flight)
+
+    async def command(self, host, port, password, cmd, timeout=10.0):
+        key = (host, int(port), password)
+        if time.monotonic() - self._last_prune > 60:
+            self._last_prune = time.monotonic()
+            await self.prune()
+        for attempt in range(2):
+            conn = await self._connection(key)
+            try:
+                return await conn.command(cmd, timeout)
+            except RconError:
+                await conn.close()
+                if attempt:
+                    raise
+            except asyncio.TimeoutError:
+                raise RconError(f"Timeout RCON ({timeout}s) pour '{cmd}'")
+        return None
+
+    async def prune(self):
+        now = time.monotonic()
+        for key, conns in list(self._pools.items()):
+            for conn in list(conns):
+                if not conn.connected or (conn.in_flight == 0 and now - conn.last_used > self.idle_timeout):
+                    await conn.close()
+                    conns.remove(conn)
+            if not conns:
+                del self._pools[key]
+
+    async def forget(self, host, port, password=None):
+        for key in [k for k in self._pools if k[0] == host and k[1] == int(port)
+                    and (password is None or k[2] == password)]:
+            for conn in self._pools.pop(key):
+                await conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_rcon_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RconPool()
+        return _pool
+
+
+def pooled_command(host, port, password, command, timeout=10.0):
+    """Commande via le pool partagé, depuis du code synchrone."""
+    pool = get_rcon_pool()
+    return aio_loop.run(pool.command(host, port, password, command, timeout), timeout=timeout + 5)
+
+
 # Helper for quick commands
 def rcon_command(host, port, password, command):
-    # Deprecated helper: use `RconClient` directly (provides better control over connection)
-    client = RconClient(host, port, password)
+    """Exécute une commande via le pool de connexions persistantes."""
     try:
-        result, error = client.command(command)
-        return result, error
-    finally:
-        client.close()
-
+        return pooled_command(host, port, password, command), None
+    except Exception as e:
+        return None, str(e)
@@ -0,0 +1,286 @@
+"""
+Index en mémoire des serveurs gérés par le panel.
+
+Le registre est construit une seule fois au démarrage puis maintenu à jour
+par le ServerManager (création / renommage / suppression) et par une
+réconciliation peu coûteuse basée sur le mtime des dossiers. Les lookups
+(nom, id, propriétaire) deviennent ainsi des accès dictionnaire au lieu de
+parcours de `base_dir` à chaque appel API.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fichiers dont la présence indique qu'un dossier est un serveur
+SERVER_MARKERS = ("server.jar", "manager_config.json", "docker-compose.yml")
+
+
+@dataclass
+class ServerEntry:
+    name: str
+    path: str
+    parent: Optional[str]  # dossier utilisateur contenant le serveur (None = racine)
+    owner: Optional[str] = None
+    has_config: bool = False
+    id: Optional[str] = None
+    server_type: Optional[str] = None
+    version: Optional[str] = None
+    port: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _read_config(path: str) -> Optional[dict]:
+    """Loader par défaut: lit manager_config.json (None si absent)."""
+    config_path = os.path.join(path, "manager_config.json")
+    if not os.path.exists(config_path):
+        return None
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        # Config illisible: le serveur existe mais sans métadonnées exploitables
+        return {}
+
+
+class ServerRegistry:
+    """Registre nom -> chemin / propriétaire / id / type / version / port."""
+
+    def __init__(self, base_dir: str, config_loader: Callable[[str], Optional[dict]] = None,
+                 reconcile_interval: float = 5.0):
+        self.base_dir = os.path.abspath(base_dir)
+        self.config_loader = config_loader or _read_config
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._by_path: Dict[str, ServerEntry] = {}
+        self._by_name: Dict[str, List[ServerEntry]] = {}
+        self._by_id: Dict[str, ServerEntry] = {}
+        # mtime_ns des dossiers surveillés (base_dir, dossiers de 1er et 2e niveau)
+        self._dir_mtimes: Dict[str, int] = {}
+        self._last_reconcile = 0.0
+        self._loaded = False
+
+    # ------------------------------------------------------------------
+    # Construction / réconciliation
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _is_ignored(entry_name: str) -> bool:
+        # Dossiers internes du panel (_backups, _java, ...) et fichiers cachés
+        return entry_name.startswith("_") or entry_name.startswith(".")
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _list_dirs(self, path: str) -> List[str]:
+        try:
+            with os.scandir(path) as it:
+                return [e.path for e in it if e.is_dir() and not self._is_ignored(e.name)]
+        except OSError:
+            return []
+
+    def build(self):
+        """(Re)construit l'index complet en parcourant base_dir une fois."""
+        with self._lock:
+            self._by_path.clear()
+            self._dir_mtimes.clear()
+            if os.path.isdir(self.base_dir):
+                self._dir_mtimes[self.base_dir] = self._mtime(self.base_dir)
+                for top in self._list_dirs(self.base_dir):
+                    self._scan_top(top)
+            self._reindex()
+            self._loaded = True
+            self._last_reconcile = time.monotonic()
+        logger.info(f"[REGISTRY] {len(self._by_path)} serveur(s) indexé(s)")
+
+    def _scan_top(self, top: str):
+        """Indexe un dossier de premier niveau (serveur racine et/ou dossier utilisateur)."""
+        self._dir_mtimes[top] = self._mtime(top)
+        self._inspect(top, None)
+        parent = os.path.basename(top)
+        for sub in self._list_dirs(top):
+            self._dir_mtimes[sub] = self._mtime(sub)
+            self._inspect(sub, parent)
+
+    def _inspect(self, path: str, parent: Optional[str]):
+        """Ajoute, met à jour ou retire l'entrée correspondant à *path*."""
+        if not any(os.path.exists(os.path.join(path, m)) for m in SERVER_MARKERS):
+            self._by_path.pop(path, None)
+            return
+        entry = ServerEntry(name=os.path.basename(path), path=path, parent=parent)
+        try:
+            conf = self.config_loader(path)
+        except Exception as e:
+            logger.debug(f"[REGISTRY] Lecture config impossible pour {path}: {e}")
+            conf = {}
+        if conf is not None:
+            entry.has_config = True
+            entry.owner = conf.get("owner")
+            entry.id = str(conf["id"]) if conf.get("id") else None
+            entry.server_type = conf.get("server_type")
+            entry.version = conf.get("version")
+            try:
+                entry.port = int(conf["port"]) if conf.get("port") else None
+            except (TypeError, ValueError):
+                entry.port = None
+        elif parent:
+            # Sans config, la structure base_dir/<owner>/<name> fait foi
+            entry.owner = parent
+        self._by_path[path] = entry
+
+    def _reindex(self):
+        by_name: Dict[str, List[ServerEntry]] = {}
+        by_id: Dict[str, ServerEntry] = {}
+        # Les serveurs à la racine sont prioritaires (même ordre que l'ancien lookup)
+        for entry in sorted(self._by_path.values(), key=lambda e: (e.parent is not None, e.path)):
+            by_name.setdefault(entry.name, []).append(entry)
+            if entry.id and entry.id not in by_id:
+                by_id[entry.id] = entry
+        self._by_name = by_name
+        self._by_id = by_id
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.build()
+
+    def reconcile(self, force: bool = False):
+        """Re-synchronise l'index avec le disque.
+
+        Seuls les dossiers dont le mtime a changé sont ré-inspectés; l'appel est
+        limité à une fois toutes les `reconcile_interval` secondes sauf *force*.
+        """
+        with self._lock:
+            if not self._loaded:
+                self.build()
+                return
+            now = time.monotonic()
+            if not force and now - self._last_reconcile < self.reconcile_interval:
+                return
+            self._last_reconcile = now
+            changed = False
+
+            base_mtime = self._mtime(self.base_dir)
+            if base_mtime != self._dir_mtimes.get(self.base_dir):
+                self._dir_mtimes[self.base_dir] = base_mtime
+                current = set(self._list_dirs(self.base_dir))
+                known = {p for p in self._dir_mtimes if os.path.dirname(p) == self.base_dir}
+                for gone in known - current:
+                    self._forget_tree(gone)
+                for new in current - known:
+                    self._scan_top(new)
+                changed = True
+
+            for top in [p for p in list(self._dir_mtimes) if os.path.dirname(p) == self.base_dir]:
+                mtime = self._mtime(top)
+                if mtime == self._dir_mtimes.get(top):
+                    continue
+                changed = True
+                if mtime is None:
+                    self._forget_tree(top)
+                    continue
+                self._dir_mtimes[top] = mtime
+                self._inspect(top, None)
+                parent = os.path.basename(top)
+                current = set(self._list_dirs(top))
+                known = {p for p in self._dir_mtimes if os.path.dirname(p) == top}
+                for gone in known - current:
+                    self._dir_mtimes.pop(gone, None)
+                    self._by_path.pop(gone, None)
+                for sub in current - known:
+                    self._dir_mtimes[sub] = self._mtime(sub)
+                    self._inspect(sub, parent)
+
+            for sub in [p for p in list(self._dir_mtimes)
+                        if os.path.dirname(os.path.dirname(p)) == self.base_dir]:
+                mtime = self._mtime(sub)
+                if mtime != self._dir_mtimes.get(sub):
+                    changed = True
+                    if mtime is None:
+                        self._dir_mtimes.pop(sub, None)
+                        self._by_path.pop(sub, None)
+                    else:
+                        self._dir_mtimes[sub] = mtime
+                        self._inspect(sub, os.path.basename(os.path.dirname(sub)))
+
+            if changed:
+                self._reindex()
+
+    def _forget_tree(self, top: str):
+        for p in [p for p in self._dir_mtimes if p == top or os.path.dirname(p) == top]:
+            self._dir_mtimes.pop(p, None)
+        for p in [p for p in self._by_path if p == top or os.path.dirname(p) == top]:
+            self._by_path.pop(p, None)
+
+    # ------------------------------------------------------------------
+    # Mises à jour explicites (create / rename / delete / save config)
+    # ------------------------------------------------------------------
+    def refresh(self, path: str):
+        """Ré-inspecte un dossier serveur précis (après écriture de sa config)."""
+        path = os.path.abspath(path)
+        parent_dir = os.path.dirname(path)
+        if parent_dir == self.base_dir:
+            parent = None
+        elif os.path.dirname(parent_dir) == self.base_dir:
+            parent = os.path.basename(parent_dir)
+        else:
+            # base_path personnalisé hors de l'arborescence: non indexé
+            return
+        with self._lock:
+            self._ensure_loaded()
+            if os.path.isdir(path):
+                self._dir_mtimes[path] = self._mtime(path)
+                if parent is not None:
+                    self._dir_mtimes[parent_dir] = self._mtime(parent_dir)
+                self._inspect(path, parent)
+            else:
+                self._dir_mtimes.pop(path, None)
+                self._by_path.pop(path, None)
+            self._reindex()
+
+    def remove(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._dir_mtimes.pop(path, None)
+            self._by_path.pop(path, None)
+            self._reindex()
+
+    # ------------------------------------------------------------------
+    # Lookups O(1)
+    # ------------------------------------------------------------------
+    def get(self, name: str, owner: Optional[str] = None) -> Optional[ServerEntry]:
+        with self._lock:
+            self._ensure_loaded()
+            candidates = self._by_name.get(name)
+            if not candidates:
+                return None
+            if owner and owner != "admin":
+                for entry in candidates:
+                    if entry.parent == owner:
+                        return entry
+                return None
+            return candidates[0]
+
+    def find_by_id(self, server_id) -> Optional[ServerEntry]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_id.get(str(server_id))
+
+    def list(self, owner: Optional[str] = None) -> List[ServerEntry]:
+        """Retourne les entrées visibles pour *owner* (toutes pour un admin)."""
+        with self._lock:
+            self._ensure_loaded()
+            entries = list(self._by_path.values())
+        if owner and owner != "admin":
+            return [e for e in entries
+                    if e.parent == owner and (not e.has_config or e.owner == owner)]
+        return entries
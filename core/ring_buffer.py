@@ -0,0 +1,191 @@
+"""
+Buffers circulaires colonnaires pour l'historique des métriques.
+
+Chaque série (timestamp, cpu, ram, ...) est un tableau float64 de taille fixe
+au lieu d'une deque de dicts. Les valeurs sont écrites deux fois (position i
+et i + capacité): toute fenêtre des *n* derniers points est donc une tranche
+contiguë, exposée sans copie. Les réductions (moyenne, min, max, centiles)
+sont vectorisées avec NumPy quand il est installé, en Python pur sinon.
+"""
+import math
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+NAN = float("nan")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Centile par interpolation linéaire (même méthode que numpy par défaut)."""
+    values = sorted(values)
+    if not values:
+        return NAN
+    k = (len(values) - 1) * q / 100.0
+    lo = math.floor(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class ColumnarRing:
+    """Historique à capacité fixe, une colonne float64 par champ."""
+
+    def __init__(self, fields: Iterable[str], capacity: int = 300):
+        self.capacity = capacity
+        self._columns: Dict[str, object] = {}
+        self._size = 0
+        self._head = 0  # prochaine position d'écriture dans [0, capacity)
+        self._lock = threading.Lock()
+        self._add_column("timestamp")
+        for field in fields:
+            self._add_column(field)
+
+    def _new_column(self):
+        if HAS_NUMPY:
+            return np.full(self.capacity * 2, np.nan, dtype=np.float64)
+        return array("d", [NAN]) * (self.capacity * 2)
+
+    def _add_column(self, field: str):
+        if field not in self._columns:
+            self._columns[field] = self._new_column()
+
+    @property
+    def fields(self) -> List[str]:
+        return [f for f in self._columns if f != "timestamp"]
+
+    def __len__(self):
+        return self._size
+
+    def append(self, values: Dict[str, object], timestamp: Optional[float] = None):
+        """Ajoute un point; les champs numériques inconnus créent une colonne."""
+        ts = datetime.now().timestamp() if timestamp is None else timestamp
+        with self._lock:
+            i = self._head
+            j = i + self.capacity
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if field not in self._columns:
+                    self._add_column(field)
+            for field, column in self._columns.items():
+                if field == "timestamp":
+                    value = ts
+                else:
+                    value = values.get(field, NAN)
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        value = NAN
+                column[i] = value
+                column[j] = value
+            self._head = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _bounds(self, limit: Optional[int]):
+        n = self._size if not limit or limit <= 0 else min(limit, self._size)
+        end = self._head + self.capacity
+        return end - n, end
+
+    def window(self, limit: Optional[int] = None) -> Dict[str, object]:
+        """Vues (sans copie) des *limit* derniers points par colonne.
+
+        Les vues restent liées au buffer: les consommer avant le prochain
+        append ou les copier.
+        """
+        with self._lock:
+            start, end = self._bounds(limit)
+            return {f: memoryview(c)[start:end] if not HAS_NUMPY else c[start:end]
+                    for f, c in self._columns.items()}
+
+    def to_records(self, limit: Optional[int] = None) -> List[dict]:
+        """Points au format historique ({"timestamp": iso, champ: valeur, ...})."""
+        with self._lock:
+            start, end = self._bounds(limit)
+            columns = {f: c[start:end].tolist() for f, c in self._columns.items()}
+        timestamps = columns.pop("timestamp")
+        records = []
+        for k, ts in enumerate(timestamps):
+            record = {"timestamp": datetime.fromtimestamp(ts).isoformat()}
+            for field, values in columns.items():
+                v = values[k]
+                if v == v:  # NaN = champ absent pour ce point
+                    record[field] = v
+            records.append(record)
+        return records
+
+    def last(self) -> Optional[dict]:
+        records = self.to_records(1)
+        return records[0] if records else None
+
+    def summarize(self, fields: Iterable[str], limit: Optional[int] = None,
+                  ops: Iterable[str] = ("mean", "min", "max")) -> Dict[str, Dict[str, Optional[float]]]:
+        """Réductions par champ: mean, min, max, pXX (p95, p99...), last.
+
+        Les points sans valeur (NaN) sont ignorés; None si aucun point.
+        """
+        fields = list(fields)
+        ops = list(ops)
+        result = {}
+        with self._lock:
+            start, end = self._bounds(limit)
+            for field in fields:
+                column = self._columns.get(field)
+                if column is None or start == end:
+                    result[field] = {op: None for op in ops}
+                    continue
+                if HAS_NUMPY:
+                    data = column[start:end]
+                    data = data[~np.isnan(data)]
+                    result[field] = self._reduce_numpy(data, ops)
+                else:
+                    data = [v for v in column[start:end] if v == v]
+                    result[field] = self._reduce_python(data, ops)
+        return result
+
+    @staticmethod
+    def _reduce_numpy(data, ops):
+        out = {}
+        for op in ops:
+            if data.size == 0:
+                out[op] = None
+            elif op == "mean":
+                out[op] = float(data.mean())
+            elif op == "min":
+                out[op] = float(data.min())
+            elif op == "max":
+                out[op] = float(data.max())
+            elif op == "last":
+                out[op] = float(data[-1])
+            elif op.startswith("p") and op[1:].isdigit():
+                out[op] = float(np.percentile(data, int(op[1:])))
+            else:
+                raise ValueError(f"Agrégation inconnue: {op}")
+        return out
+
+    @staticmethod
+    def _reduce_python(data, ops):
+        out = {}
+        for op in ops:
+            if not data:
+                out[op] = None
+            elif op == "mean":
+                out[op] = sum(data) / len(data)
+            elif op == "min":
+                out[op] = min(data)
+            elif op == "max":
+                out[op] = max(data)
+            elif op == "last":
+                out[op] = data[-1]
+            elif op.startswith("p") and op[1:].isdigit():
+                out[op] = _percentile(data, int(op[1:]))
+            else:
+                raise ValueError(f"Agrégation inconnue: {op}")
+        return out
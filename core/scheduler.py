@@ -6,6 +6,9 @@ import zipfile
 import logging
 from datetime import datetime, timedelta
 
+from core.archiver import parse_level, zip_compress_type
+from core.backup_store import BACKUP_FORMATS
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -145,8 +148,20 @@ class BackupScheduler:
             "cron": config.get("cron", ""),
             "retention": config.get("retention", 7),  # Garder 7 backups
             "compress": config.get("compress", True),
+            # "zip": archive complète, "mcpa": archive compressée en parallèle,
+            # "dedup": snapshot incrémental dédupliqué,
+            # "chunked": idem avec les régions .mca découpées par chunk
+            "format": config.get("format", "zip"),
+            # Niveau de compression du format "mcpa" (None: défaut de l'archiveur)
+            "level": config.get("level"),
             "notify": config.get("notify", True)
         }
+        if schedules[server_name]["format"] not in BACKUP_FORMATS:
+            return {"success": False, "message": "Format de sauvegarde inconnu"}
+        try:
+            schedules[server_name]["level"] = parse_level(schedules[server_name]["level"])
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
         self._save_schedules(schedules)
         
         if config.get("enabled", True):
@@ -183,6 +198,8 @@ class BackupScheduler:
             "cron": "",
             "retention": 7,
             "compress": True,
+            "format": "zip",
+            "level": None,
             "notify": True
         }
         return schedules.get(server_name, default)
@@ -249,7 +266,8 @@ class BackupScheduler:
         
         try:
             # Créer le backup
-            result = self.srv_mgr.backup_server(server_name)
+            backup_format = config.get("format", "zip")
+            result = self.srv_mgr.backup_server(server_name, format=backup_format, level=config.get("level"))
             
             if not result:
                 logger.info(f"Échec backup {server_name}")
@@ -257,8 +275,8 @@ class BackupScheduler:
             
             backup_path = result.get("path", "")
             
-            # Compression si activée
-            if config.get("compress", True):
+            # Compression si activée (le dépôt dédupliqué compresse ses blocs)
+            if config.get("compress", True) and backup_format == "zip":
                 if backup_path and os.path.isdir(backup_path):
                     zip_path = self._compress_backup(backup_path)
                     if zip_path:
@@ -294,7 +312,7 @@ class BackupScheduler:
                     for file in files:
                         file_path = os.path.join(root, file)
                         arcname = os.path.relpath(file_path, backup_path)
-                        zipf.write(file_path, arcname)
+                        zipf.write(file_path, arcname, compress_type=zip_compress_type(file_path))
             
             # Supprimer le dossier original
             shutil.rmtree(backup_path)
@@ -307,30 +325,19 @@ class BackupScheduler:
     def _rotate_backups(self, server_name, retention):
         """Supprime les vieux backups au-delà de la limite"""
         try:
-            backup_dir = os.path.join(self.srv_mgr.base_dir, "_backups")
-            if not os.path.exists(backup_dir):
-                return
-            
-            # Lister les backups de ce serveur
-            prefix = f"{server_name}_"
-            backups = []
-            
-            for item in os.listdir(backup_dir):
-                if item.startswith(prefix):
-                    path = os.path.join(backup_dir, item)
-                    mtime = os.path.getmtime(path)
-                    backups.append((path, mtime))
-            
-            # Trier par date (plus récent en premier)
-            backups.sort(key=lambda x: x[1], reverse=True)
+            # Catalogue: tous formats confondus, plus récent en premier
+            backups = self.srv_mgr.list_backups(server_name)
             
             # Supprimer les backups excédentaires
-            for path, _ in backups[retention:]:
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-                else:
-                    os.remove(path)
-                logger.info(f"Ancien backup supprimé: {os.path.basename(path)}")
+            deleted_snapshots = False
+            for backup in backups[retention:]:
+                if self.srv_mgr.delete_backup(server_name, backup["name"], gc=False):
+                    deleted_snapshots |= backup["format"] in ("dedup", "chunked")
+                    logger.info(f"Ancien backup supprimé: {backup['name']}")
+            
+            # Les blocs qui ne sont plus référencés par aucun snapshot sont libérés
+            if deleted_snapshots:
+                self.srv_mgr.backup_store.gc()
                 
         except Exception as e:
             logger.error(f"Erreur rotation: {e}")
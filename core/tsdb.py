@@ -0,0 +1,394 @@
+"""
+Stockage persistant des séries de métriques (système et par serveur).
+
+Moteur embarqué append-only: chaque série est découpée en segments de durée
+fixe, fichiers pré-alloués et mappés en mémoire (mmap), contenant des
+enregistrements float64 de taille fixe. Trois niveaux de résolution:
+
+    raw  - échantillons bruts (1 s système, intervalle du collecteur serveurs)
+    1m   - agrégats par minute (count, puis avg/min/max/n par champ, n étant
+           le nombre d'échantillons non vides du champ)
+    1h   - agrégats par heure
+
+Les agrégats sont calculés à la volée à l'écriture; chaque niveau a sa propre
+rétention et les segments expirés sont supprimés. Une requête de plage
+n'ouvre que les segments qui la recouvrent (l'instant de début fait partie du
+nom de fichier).
+
+Taille disque (segments pré-alloués) pour une série serveur de 10 champs:
+brut ≈ 15 Mo sur 2 jours (capacité d'un point par seconde), 1m ≈ 14,5 Mo
+sur 30 jours, 1h ≈ 3,5 Mo sur 400 jours, soit ≈ 33 Mo par serveur avec les
+rétentions par défaut (METRICS_RAW/1M/1H_RETENTION, en secondes).
+
+Format d'un segment (petit-boutiste):
+    en-tête 32 octets: magic b"MCTS", version u16, ncols u16, capacity u32,
+                       count u32, start f64, réservé
+    puis `capacity` enregistrements de `ncols` float64 (colonne 0 = timestamp)
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MCTS"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIId4x")
+RECORD_ITEM = 8  # float64
+
+# (nom, pas en secondes (0 = brut), durée d'un segment, rétention) - surchargeables par env
+TIERS = (
+    ("raw", 0, 3600, int(os.getenv("METRICS_RAW_RETENTION", 2 * 86400))),
+    ("1m", 60, 86400, int(os.getenv("METRICS_1M_RETENTION", 30 * 86400))),
+    ("1h", 3600, 30 * 86400, int(os.getenv("METRICS_1H_RETENTION", 400 * 86400))),
+)
+TIER_NAMES = tuple(t[0] for t in TIERS)
+AGG_STATS = ("avg", "min", "max", "n")
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Segment:
+    """Fichier segment mappé en mémoire (écriture séquentielle)."""
+
+    def __init__(self, path: str, ncols: int, capacity: int, start: float):
+        self.path = path
+        self.ncols = ncols
+        self.capacity = capacity
+        self.start = start
+        self.record_size = ncols * RECORD_ITEM
+        size = HEADER.size + capacity * self.record_size
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists or os.path.getsize(path) < size:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        if exists:
+            magic, version, ncols_disk, capacity_disk, count, start_disk = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or ncols_disk != ncols or capacity_disk != capacity:
+                self.close()
+                raise ValueError(f"Segment incompatible: {path}")
+            self.count = count
+        else:
+            self.count = 0
+            self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.ncols, self.capacity, self.count, self.start)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, values: Sequence[float]):
+        offset = HEADER.size + self.count * self.record_size
+        struct.pack_into(f"<{self.ncols}d", self._mm, offset, *values)
+        self.count += 1
+        # Le compteur est écrit après l'enregistrement: un arrêt brutal ne laisse pas de ligne partielle
+        struct.pack_into("<I", self._mm, 12, self.count)
+
+    def read(self) -> array:
+        """Enregistrements valides sous forme de tableau plat de float64."""
+        data = array("d")
+        data.frombytes(self._mm[HEADER.size:HEADER.size + self.count * self.record_size])
+        return data
+
+    def close(self):
+        try:
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+class _Rollup:
+    """Accumulateur d'un seau d'agrégation (minute ou heure) en cours."""
+
+    __slots__ = ("bucket", "count", "sums", "mins", "maxs", "counts")
+
+    def __init__(self, bucket: float, nfields: int):
+        self.bucket = bucket
+        self.count = 0
+        self.sums = [0.0] * nfields
+        self.counts = [0] * nfields
+        self.mins = [math.inf] * nfields
+        self.maxs = [-math.inf] * nfields
+
+    def add(self, values: Sequence[float], weight: int = 1,
+            mins: Optional[Sequence[float]] = None, maxs: Optional[Sequence[float]] = None,
+            counts: Optional[Sequence[float]] = None):
+        """*counts*: échantillons par champ d'un agrégat (poids propre à chaque moyenne)."""
+        self.count += weight
+        for i, v in enumerate(values):
+            if v != v:
+                continue
+            n = 1 if counts is None else int(counts[i])
+            self.sums[i] += v * n
+            self.counts[i] += n
+            lo = v if mins is None else mins[i]
+            hi = v if maxs is None else maxs[i]
+            if lo < self.mins[i]:
+                self.mins[i] = lo
+            if hi > self.maxs[i]:
+                self.maxs[i] = hi
+
+    def record(self) -> List[float]:
+        row = [self.bucket, float(self.count)]
+        for i in range(len(self.sums)):
+            if self.counts[i]:
+                row += [self.sums[i] / self.counts[i], self.mins[i], self.maxs[i], float(self.counts[i])]
+            else:
+                row += [math.nan, math.nan, math.nan, 0.0]
+        return row
+
+
+class Series:
+    """Une série (champs fixes) et ses trois niveaux de segments."""
+
+    def __init__(self, root: str, fields: Sequence[str]):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        meta_path = os.path.join(root, "meta.json")
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta is not None and meta.get("version", 1) < VERSION:
+            # v1: agrégats sans compte par champ, illisibles en v2 (le brut est inchangé)
+            logger.info(f"[TSDB] Agrégats au format v{meta.get('version', 1)} supprimés: {root}")
+            for tier in TIER_NAMES[1:]:
+                shutil.rmtree(os.path.join(root, tier), ignore_errors=True)
+            fields = meta["fields"]
+            meta = None
+        if meta is not None:
+            self.fields = meta["fields"]
+        else:
+            self.fields = list(fields)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"fields": self.fields, "version": VERSION}, f)
+        self._open: Dict[str, Segment] = {}
+        self._rollups: Dict[str, _Rollup] = {}
+        self._last_ts = -math.inf
+
+    def ncols(self, tier: str) -> int:
+        return 1 + len(self.fields) if tier == "raw" else 2 + len(AGG_STATS) * len(self.fields)
+
+    def _tier_dir(self, tier: str) -> str:
+        return os.path.join(self.root, tier)
+
+    def segments(self, tier: str) -> List[Tuple[float, str]]:
+        """[(début, chemin)] triés des segments d'un niveau."""
+        d = self._tier_dir(tier)
+        if not os.path.isdir(d):
+            return []
+        out = []
+        for entry in os.listdir(d):
+            if entry.endswith(".seg"):
+                try:
+                    out.append((float(entry[:-4]), os.path.join(d, entry)))
+                except ValueError:
+                    continue
+        out.sort()
+        return out
+
+    def _segment_for(self, tier: str, span: int, ts: float) -> Segment:
+        start = ts - (ts % span)
+        seg = self._open.get(tier)
+        if seg is not None and seg.start == start:
+            return seg
+        if seg is not None:
+            seg.close()
+        os.makedirs(self._tier_dir(tier), exist_ok=True)
+        path = os.path.join(self._tier_dir(tier), f"{int(start)}.seg")
+        step = dict((t[0], t[1]) for t in TIERS)[tier]
+        # Capacité: un point par seconde au maximum pour le brut
+        capacity = span if tier == "raw" else span // step
+        seg = Segment(path, self.ncols(tier), capacity, start)
+        self._open[tier] = seg
+        return seg
+
+    def append(self, ts: float, values: Sequence[float]):
+        if ts <= self._last_ts:
+            return  # append-only: on ignore les points hors ordre
+        self._last_ts = ts
+        raw = self._segment_for("raw", TIERS[0][2], ts)
+        if not raw.full:
+            raw.append([ts, *values])
+        self._roll("1m", ts, values)
+
+    def _roll(self, tier: str, ts: float, values, weight=1, mins=None, maxs=None, counts=None):
+        idx = TIER_NAMES.index(tier)
+        _, step, span, _ = TIERS[idx]
+        bucket = ts - (ts % step)
+        acc = self._rollups.get(tier)
+        if acc is not None and acc.bucket != bucket:
+            self._flush(tier, acc)
+            acc = None
+        if acc is None:
+            acc = self._rollups[tier] = _Rollup(bucket, len(self.fields))
+        acc.add(values, weight, mins, maxs, counts)
+
+    def _flush(self, tier: str, acc: _Rollup):
+        idx = TIER_NAMES.index(tier)
+        span = TIERS[idx][2]
+        seg = self._segment_for(tier, span, acc.bucket)
+        row = acc.record()
+        if not seg.full:
+            seg.append(row)
+        # Cascade: l'agrégat minute alimente l'agrégat heure, chaque moyenne
+        # pondérée par son propre nombre d'échantillons
+        if idx + 1 < len(TIERS):
+            self._roll(TIER_NAMES[idx + 1], acc.bucket, row[2::4], weight=acc.count,
+                       mins=row[3::4], maxs=row[4::4], counts=row[5::4])
+
+    def read(self, tier: str, start: float, end: float) -> Tuple[array, int]:
+        """Enregistrements de [start, end] (tableau plat, ncols)."""
+        ncols = self.ncols(tier)
+        span = TIERS[TIER_NAMES.index(tier)][2]
+        out = array("d")
+        for seg_start, path in self.segments(tier):
+            if seg_start + span < start or seg_start > end:
+                continue  # seuls les segments recouvrant la plage sont lus
+            seg = self._open.get(tier)
+            if seg is not None and seg.path == path:
+                data = seg.read()
+            else:
+                try:
+                    seg_ro = Segment(path, ncols, span if tier == "raw" else span // TIERS[TIER_NAMES.index(tier)][1], seg_start)
+                except (ValueError, OSError) as e:
+                    logger.warning(f"[TSDB] Segment ignoré {path}: {e}")
+                    continue
+                try:
+                    data = seg_ro.read()
+                finally:
+                    seg_ro.close()
+            for r in range(0, len(data), ncols):
+                ts = data[r]
+                if start <= ts <= end:
+                    out.extend(data[r:r + ncols])
+        return out, ncols
+
+    def expire(self, now: float):
+        for name, _, span, retention in TIERS:
+            for seg_start, path in self.segments(name):
+                if seg_start + span < now - retention:
+                    seg = self._open.get(name)
+                    if seg is not None and seg.path == path:
+                        seg.close()
+                        del self._open[name]
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def close(self):
+        for seg in self._open.values():
+            seg.close()
+        self._open.clear()
+
+
+class TimeSeriesStore:
+    """Ensemble de séries: "system" et "server/<nom>"."""
+
+    def __init__(self, root: str, expire_interval: float = 3600.0):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.expire_interval = expire_interval
+        self._series: Dict[str, Series] = {}
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+
+    def _path(self, key: str) -> str:
+        kind, _, name = key.partition("/")
+        if name:
+            return os.path.join(self.root, _SAFE_RE.sub("_", kind), _SAFE_RE.sub("_", name))
+        return os.path.join(self.root, _SAFE_RE.sub("_", kind))
+
+    def _get(self, key: str, fields: Optional[Sequence[str]] = None) -> Optional[Series]:
+        series = self._series.get(key)
+        if series is None:
+            path = self._path(key)
+            if fields is None and not os.path.exists(os.path.join(path, "meta.json")):
+                return None
+            series = self._series[key] = Series(path, fields or ())
+        return series
+
+    def append(self, key: str, ts: float, data: Dict[str, object], fields: Sequence[str]):
+        """Ajoute un point; *fields* fixe les colonnes à la création de la série."""
+        with self._lock:
+            try:
+                series = self._get(key, fields)
+                values = []
+                for f in series.fields:
+                    v = data.get(f)
+                    values.append(float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else math.nan)
+                series.append(ts, values)
+                if ts - self._last_expire > self.expire_interval:
+                    self._last_expire = ts
+                    for s in self._series.values():
+                        s.expire(ts)
+            except Exception as e:
+                logger.warning(f"[TSDB] Écriture impossible pour {key}: {e}")
+
+    @staticmethod
+    def pick_tier(start: float, end: float) -> str:
+        """Résolution adaptée à la largeur de la plage demandée."""
+        width = end - start
+        if width <= 3 * 3600:
+            return "raw"
+        if width <= 14 * 86400:
+            return "1m"
+        return "1h"
+
+    def query(self, key: str, start: float, end: Optional[float] = None,
+              tier: Optional[str] = None) -> Optional[dict]:
+        """Colonnes de la série sur [start, end].
+
+        Retourne {"tier", "fields", "timestamp": [...], champ: [...]}; pour
+        les niveaux agrégés, chaque champ donne la moyenne et `champ_min` /
+        `champ_max` / `champ_count` (échantillons du champ) sont ajoutés avec
+        `count` (échantillons du seau).
+        """
+        end = time.time() if end is None else end
+        tier = tier or self.pick_tier(start, end)
+        if tier not in TIER_NAMES:
+            raise ValueError(f"Niveau inconnu: {tier}")
+        with self._lock:
+            series = self._get(key)
+            if series is None:
+                return None
+            data, ncols = series.read(tier, start, end)
+            fields = list(series.fields)
+        result = {"tier": tier, "fields": fields, "timestamp": data[0::ncols].tolist()}
+        if tier == "raw":
+            for i, f in enumerate(fields):
+                result[f] = data[1 + i::ncols].tolist()
+        else:
+            result["count"] = data[1::ncols].tolist()
+            for i, f in enumerate(fields):
+                base = 2 + len(AGG_STATS) * i
+                result[f] = data[base::ncols].tolist()
+                result[f"{f}_min"] = data[base + 1::ncols].tolist()
+                result[f"{f}_max"] = data[base + 2::ncols].tolist()
+                result[f"{f}_count"] = data[base + 3::ncols].tolist()
+        return result
+
+    def series_keys(self, kind: str = "server") -> List[str]:
+        d = os.path.join(self.root, kind)
+        if not os.path.isdir(d):
+            return []
+        return [f"{kind}/{name}" for name in sorted(os.listdir(d))]
+
+    def close(self):
+        with self._lock:
+            for s in self._series.values():
+                s.close()
+            self._series.clear()
@@ -49,3 +49,41 @@ def format_mb_to_human(mb_value: int) -> str:
     if mb_value >= 1024:
         return f"{round(mb_value / 1024, 2)} GB"
     return f"{mb_value} MB"
+
+def atomic_write(path: str, data, encoding: str = "utf-8"):
+    """Écrit *data* dans *path* de façon atomique (fichier temporaire + os.replace).
+
+    Un lecteur concurrent voit soit l'ancien contenu, soit le nouveau, jamais
+    un fichier tronqué. Les droits et le propriétaire du fichier remplacé sont
+    conservés (mkstemp crée en 0600: le conteneur, UID 1000, ne pourrait plus
+    lire server.properties); un nouveau fichier est créé en 0644.
+    """
+    import os
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        mode = "wb" if isinstance(data, (bytes, bytearray)) else "w"
+        with os.fdopen(fd, mode, **({} if mode == "wb" else {"encoding": encoding})) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        else:
+            os.chmod(tmp_path, st.st_mode & 0o7777)
+            if hasattr(os, "chown"):
+                try:
+                    os.chown(tmp_path, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass  # Panel non root: propriétaire inchangeable, les droits suffisent
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,295 @@
+"""
+Pool de serveurs pré-chauffés pour une création quasi instantanée.
+
+Pour les couples (type, version) configurés, le panel garde K dossiers prêts
+sous servers/_warm: l'image itzg/minecraft-server est tirée et le conteneur a
+tourné une fois avec SETUP_ONLY=true (jar du serveur et librairies
+téléchargés, monde non généré), puis a été supprimé. `create_server` en
+réclame un par simple renommage du dossier; le docker-compose.yml définitif
+(nom, labels, port, RAM du propriétaire) est écrit ensuite et le premier
+démarrage ne fait plus que générer le monde.
+
+Le pool se remplit en tâche de fond dans un budget: nombre de pré-chauffes
+simultanées, taille totale du pool, espace disque et RAM libres minimum.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import psutil
+
+from core.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+WARM_DIR = "_warm"
+WARM_STATE_FILE = "warm.json"
+WARM_TIMEOUT = 20 * 60
+RETRY_DELAY = 10 * 60
+
+DEFAULT_POOL_CONFIG = {
+    "enabled": False,
+    # [{"server_type": "paper", "version": "1.21.1", "count": 2}]
+    "targets": [],
+    "max_warming": 1,
+    "max_total": 10,
+    "min_free_disk_mb": 10240,
+    "min_free_ram_mb": 1024,
+}
+
+
+class WarmPool:
+    def __init__(self, srv_mgr, data_dir: str = "data", interval: float = 60.0):
+        self.srv_mgr = srv_mgr
+        self.root = os.path.join(srv_mgr.base_dir, WARM_DIR)
+        self.config_file = os.path.join(data_dir, "warm_pool.json")
+        self.interval = interval
+        self.config = self._load_config()
+        self._entries: Dict[str, dict] = {}  # {id: état}
+        self._failures: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._wakeup = threading.Event()
+        os.makedirs(data_dir, exist_ok=True)
+        os.makedirs(self.root, exist_ok=True)
+        self._scan()
+
+    # ------------------------------------------------------------------
+    # Configuration
+    # ------------------------------------------------------------------
+    def _load_config(self) -> dict:
+        config = dict(DEFAULT_POOL_CONFIG)
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, "r", encoding="utf-8") as f:
+                    config.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"[WARM] Configuration illisible, valeurs par défaut: {e}")
+        return config
+
+    def update_config(self, changes: dict) -> dict:
+        config = {**self.config, **{k: v for k, v in changes.items() if k in DEFAULT_POOL_CONFIG}}
+        targets = []
+        for t in config.get("targets") or []:
+            if not t.get("server_type") or not t.get("version"):
+                raise ValueError("Chaque cible requiert server_type et version")
+            targets.append({"server_type": str(t["server_type"]).lower(), "version": str(t["version"]),
+                            "count": max(0, int(t.get("count", 1)))})
+        config["targets"] = targets
+        atomic_write(self.config_file, json.dumps(config, indent=2))
+        self.config = config
+        self._wakeup.set()
+        return config
+
+    # ------------------------------------------------------------------
+    # État
+    # ------------------------------------------------------------------
+    def _scan(self):
+        """Recharge l'état depuis le disque; les pré-chauffes interrompues sont jetées."""
+        for entry_name in os.listdir(self.root):
+            path = os.path.join(self.root, entry_name)
+            state = None
+            try:
+                with open(os.path.join(path, WARM_STATE_FILE), "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if not state or state.get("state") != "ready":
+                self._discard(path, state.get("id") if state else None)
+                continue
+            state["path"] = path
+            self._entries[state["id"]] = state
+
+    def _save_state(self, entry: dict):
+        data = {k: v for k, v in entry.items() if k != "path"}
+        atomic_write(os.path.join(entry["path"], WARM_STATE_FILE), json.dumps(data, indent=2))
+
+    def status(self) -> dict:
+        with self._lock:
+            entries = [{k: v for k, v in e.items() if k != "path"} for e in self._entries.values()]
+        return {"config": self.config, "entries": entries}
+
+    def _count(self, server_type: str, version: str) -> int:
+        return sum(1 for e in self._entries.values()
+                   if e["server_type"] == server_type and e["version"] == version)
+
+    # ------------------------------------------------------------------
+    # Réclamation
+    # ------------------------------------------------------------------
+    def claim(self, server_type: str, version: str, dest: str) -> bool:
+        """Déplace un dossier prêt vers *dest*; False si aucun ne correspond."""
+        server_type = (server_type or "").lower()
+        with self._lock:
+            entry = next((e for e in self._entries.values()
+                          if e["state"] == "ready" and e["server_type"] == server_type
+                          and e["version"] == version), None)
+            if entry is None:
+                return False
+            del self._entries[entry["id"]]
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.rename(entry["path"], dest)
+        except OSError as e:
+            # Ex. servers/ et _warm sur des systèmes de fichiers différents (EXDEV): le dossier
+            # est intact, il reste dans le pool et la création se fait normalement
+            logger.warning(f"[WARM] Réclamation de {entry['id']} impossible: {e}")
+            if os.path.isdir(entry["path"]):
+                with self._lock:
+                    self._entries[entry["id"]] = entry
+            return False
+        for leftover in (WARM_STATE_FILE, "docker-compose.yml"):
+            try:
+                os.remove(os.path.join(dest, leftover))
+            except OSError:
+                pass
+        logger.info(f"[WARM] {server_type} {version} pré-chauffé réclamé ({entry['id']})")
+        self._wakeup.set()
+        return True
+
+    # ------------------------------------------------------------------
+    # Remplissage
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._loop, daemon=True, name="warm-pool").start()
+        logger.info("[WARM] Pool de serveurs pré-chauffés démarré")
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _loop(self):
+        while self._running:
+            try:
+                if self.config.get("enabled"):
+                    self.refill()
+            except Exception as e:
+                logger.error(f"[WARM] Erreur remplissage: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _within_budget(self) -> bool:
+        warming = sum(1 for e in self._entries.values() if e["state"] == "warming")
+        if warming >= int(self.config.get("max_warming", 1)):
+            return False
+        if len(self._entries) >= int(self.config.get("max_total", 10)):
+            return False
+        if shutil.disk_usage(self.root).free < int(self.config.get("min_free_disk_mb", 0)) * 1024 * 1024:
+            return False
+        return psutil.virtual_memory().available >= int(self.config.get("min_free_ram_mb", 0)) * 1024 * 1024
+
+    def refill(self) -> List[str]:
+        """Lance les pré-chauffes manquantes dans la limite du budget."""
+        started = []
+        now = time.time()
+        for target in self.config.get("targets") or []:
+            key = (target["server_type"], target["version"])
+            if now - self._failures.get(key, 0) < RETRY_DELAY:
+                continue
+            while True:
+                with self._lock:
+                    if self._count(*key) >= int(target.get("count", 1)) or not self._within_budget():
+                        break
+                    entry = self._new_entry(*key)
+                threading.Thread(target=self._warm, args=(entry,), daemon=True,
+                                 name=f"warm-{entry['id']}").start()
+                started.append(entry["id"])
+        return started
+
+    def _new_entry(self, server_type: str, version: str) -> dict:
+        warm_id = uuid.uuid4().hex[:8]
+        entry = {
+            "id": warm_id,
+            "server_type": server_type,
+            "version": version,
+            "state": "warming",
+            "created_at": time.time(),
+            "path": os.path.join(self.root, f"{server_type}-{version}-{warm_id}"),
+        }
+        self._entries[warm_id] = entry
+        return entry
+
+    def _warm(self, entry: dict):
+        path = entry["path"]
+        container = f"mc-warm-{entry['id']}"
+        key = (entry["server_type"], entry["version"])
+        try:
+            os.makedirs(os.path.join(path, "data", "plugins"), exist_ok=True)
+            os.makedirs(os.path.join(path, "data", "mods"), exist_ok=True)
+            compose = self.srv_mgr.build_compose(f"warm-{entry['id']}", entry["version"], entry["server_type"],
+                                                 None, "", entry["id"])
+            service = compose["services"]["mc"]
+            service.pop("ports", None)
+            service.pop("healthcheck", None)
+            # Sans label serveur/propriétaire: invisible pour la flotte, /metrics,
+            # le suivi d'état, la veille et le tableau de bord (qui filtrent dessus)
+            service["labels"] = {"com.mcpanel.warm": "true", "com.mcpanel.id": entry["id"]}
+            # Télécharge jar + librairies puis s'arrête, sans générer de monde
+            service["environment"]["SETUP_ONLY"] = "true"
+            service["restart"] = "no"
+            self.srv_mgr._write_compose(path, compose)
+            self._save_state(entry)
+
+            logger.info(f"[WARM] Pré-chauffe {entry['server_type']} {entry['version']} ({entry['id']})")
+            self.srv_mgr._run_compose(["up", "-d"], cwd=path, check=True,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            exit_code = self._wait_exit(container)
+            if exit_code != 0:
+                raise Exception(f"setup terminé avec le code {exit_code}")
+            self._remove_container(path, container)
+
+            entry["state"] = "ready"
+            entry["ready_at"] = time.time()
+            self._save_state(entry)
+            logger.info(f"[WARM] {entry['id']} prêt en {int(entry['ready_at'] - entry['created_at'])}s")
+        except Exception as e:
+            logger.warning(f"[WARM] Pré-chauffe {entry['id']} échouée: {e}")
+            self._failures[key] = time.time()
+            with self._lock:
+                self._entries.pop(entry["id"], None)
+            self._discard(path, entry["id"])
+
+    def _wait_exit(self, container: str) -> Optional[int]:
+        api = self.srv_mgr._docker_api()
+        deadline = time.monotonic() + WARM_TIMEOUT
+        while time.monotonic() < deadline:
+            if api:
+                info = api.inspect_container(container)
+                state = (info or {}).get("State") or {}
+                if info is not None and not state.get("Running", True):
+                    return state.get("ExitCode")
+            else:
+                res = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}} {{.State.ExitCode}}", container],
+                                     capture_output=True, text=True, timeout=10)
+                running, _, code = res.stdout.strip().partition(" ")
+                if res.returncode == 0 and running == "false":
+                    return int(code or 0)
+            time.sleep(5)
+        raise Exception(f"pré-chauffe non terminée après {WARM_TIMEOUT}s")
+
+    def _remove_container(self, path: str, container: str):
+        api = self.srv_mgr._docker_api()
+        if api:
+            try:
+                api.remove_container(container, force=True)
+                return
+            except Exception as e:
+                logger.debug(f"[WARM] Suppression API de {container} impossible: {e}")
+        self.srv_mgr._run_compose(["rm", "-f", "-s"], cwd=path, check=False,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _discard(self, path: str, warm_id: Optional[str]):
+        if warm_id and os.path.exists(os.path.join(path, "docker-compose.yml")):
+            try:
+                self._remove_container(path, f"mc-warm-{warm_id}")
+            except Exception:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
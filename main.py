@@ -1,5 +1,6 @@
 import logging
 import os
+import re
 import secrets
 import subprocess
 import sys
@@ -18,10 +19,20 @@ from core.file_manager import FileManager
 from core.i18n import i18n
 from core.manager import ServerManager
 from core.monitoring import MetricsCollector, ServerMonitor
+from core.fleet_stats import FleetStatsCollector
+from core.tsdb import TIER_NAMES, TimeSeriesStore
+from core.metrics_query import parse_aggs, query as query_metrics
+from core.prom_exporter import register_fleet_collector, register_proxy_collector
+from core.ingame_metrics import InGameMetricsScraper
+from core.mc_ping import ping_server
+from core.fanout import fanout, select_servers
+from core.hibernation import HibernationManager
+from core.mc_proxy import MC_PROXY_PORT, HostnameRouter, MinecraftProxy
 from core.notifications import notification_manager, notify
 from core.plugins import PluginManager
-from core.rcon import RconClient
 from core.jobs import get_job_manager
+from core.orchestrator import LifecycleOrchestrator
+from core.warm_pool import WarmPool
 from core.scheduler import BackupScheduler
 from core.stats import PlayerStatsManager
 from core.tunnel import TunnelManager, get_tunnel_manager
@@ -320,31 +331,14 @@ except ImportError:
 auth_mgr = AuthManager()
 
 # Initialiser le monitoring
-metrics_collector = MetricsCollector()
+try:
+    metrics_store = TimeSeriesStore(os.path.join("data", "metrics"))
+except Exception as e:
+    logger.warning(f"[WARN] Stockage des métriques indisponible: {e}")
+    metrics_store = None
+metrics_collector = MetricsCollector(store=metrics_store)
 metrics_collector.start()
 
-def collect_server_metrics_task():
-    """Tâche de fond pour collecter les métriques des serveurs actifs"""
-    logger.info("[METRICS] Tâche de collecte des métriques serveurs démarrée")
-    while True:
-        try:
-            # On itère sur les serveurs actifs
-            for name in list(srv_mgr.procs.keys()):
-                try:
-                    status = srv_mgr.get_status(name)
-                    if status.get("status") == "online":
-                        data = {
-                            "cpu": status.get("cpu", 0),
-                            "ram": status.get("ram_mb", 0),
-                            "players_online": status.get("players_online", 0)
-                        }
-                        metrics_collector.update_server_metrics(name, data)
-                except Exception as e:
-                    pass
-        except Exception as e:
-            logger.error(f"[METRICS] Erreur boucle collecte: {e}")
-        time.sleep(15)  # Collecte toutes les 15 secondes
-
 # Initialiser le gestionnaire de tunnel (remplace Playit.gg)
 try:
     tunnel_mgr = get_tunnel_manager(os.path.join(os.path.dirname(__file__), "servers"))
@@ -407,17 +401,62 @@ governance_mgr = GovernanceManager(quota_mgr, srv_mgr)
 billing_mgr.srv_mgr = srv_mgr
 stats_mgr = PlayerStatsManager(srv_mgr.base_dir)
 plugin_mgr = PluginManager(srv_mgr.base_dir)
+srv_mgr.state_watcher.start()
 server_monitor = ServerMonitor(srv_mgr, metrics_collector)
 server_monitor.start()
 backup_scheduler = BackupScheduler(srv_mgr)
+# Indexation des sauvegardes existantes (hachage des archives) hors des requêtes
+srv_mgr.backup_catalog.ensure_synced()
 file_mgr = FileManager(srv_mgr.base_dir)
 config_editor = ConfigEditor(srv_mgr.base_dir)
 
 # Démarrer la collecte des métriques serveurs après initialisation des managers
-threading.Thread(target=collect_server_metrics_task, daemon=True).start()
+fleet_stats = FleetStatsCollector(srv_mgr, metrics_collector)
+fleet_stats.start()
+register_fleet_collector(srv_mgr, fleet_stats, metrics_collector)
+ingame_scraper = InGameMetricsScraper(fleet_stats)
+fleet_stats.ingame = ingame_scraper
+ingame_scraper.start()
+hibernation = HibernationManager(srv_mgr, fleet_stats)
+srv_mgr.hibernation = hibernation
+hibernation.start()
+
+# Actions de cycle de vie groupées (concurrentes / par vagues)
+lifecycle = LifecycleOrchestrator(srv_mgr, job_mgr or get_job_manager())
+
+# Pool de serveurs pré-chauffés (création quasi instantanée)
+warm_pool = WarmPool(srv_mgr)
+srv_mgr.warm_pool = warm_pool
+warm_pool.start()
+
+# Proxy Minecraft par nom d'hôte (un seul port public pour toute la flotte)
+proxy_router = HostnameRouter(srv_mgr)
+proxy_router.watch(srv_mgr.state_watcher)
+mc_proxy = None
+if MC_PROXY_PORT:
+    try:
+        mc_proxy = MinecraftProxy(proxy_router, port=MC_PROXY_PORT)
+        mc_proxy.start()
+        register_proxy_collector(mc_proxy)
+    except Exception as e:
+        logger.error(f"[PROXY] Démarrage du proxy Minecraft impossible: {e}")
+        mc_proxy = None
 
 # ===================== ADMIN EXTENSIONS =====================
 
+@app.route("/api/admin/warm-pool", methods=["GET", "POST"])
+@admin_required
+def warm_pool_config():
+    """État et configuration du pool de serveurs pré-chauffés"""
+    if request.method == "POST":
+        try:
+            warm_pool.update_config(request.json or {})
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        auth_mgr._log_audit(session["user"]["username"], "WARM_POOL_CONFIG", "")
+    return jsonify({"status": "success", **warm_pool.status()})
+
+
 @app.route("/api/admin/maintenance", methods=["POST"])
 @admin_required
 def set_maintenance():
@@ -540,13 +579,91 @@ def api_metrics_history():
     return jsonify({"status": "success", "data": metrics_collector.get_system_metrics(limit)})
 
 
+_RANGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def _parse_time_range():
+    """Plage demandée via ?range=24h|7d ou ?start=&end= (epoch secondes).
+
+    Retourne (start, end, tier) ou None si seul `limit` est utilisé.
+    """
+    tier = request.args.get("tier") or None
+    if tier and tier not in TIER_NAMES:
+        raise ValueError(f"Niveau inconnu: {tier} ({', '.join(TIER_NAMES)})")
+    end = request.args.get("end", type=float) or time.time()
+    rng = request.args.get("range")
+    if rng:
+        unit = _RANGE_UNITS.get(rng[-1:].lower())
+        try:
+            amount = float(rng[:-1]) if unit else float(rng)
+        except ValueError:
+            raise ValueError(f"Plage invalide: {rng}")
+        return end - amount * (unit or 1), end, tier
+    start = request.args.get("start", type=float)
+    if start is not None:
+        return start, end, tier
+    return None
+
+
 @app.route("/api/metrics/server/<name>")
 @login_required
 def api_server_metrics(name):
+    try:
+        time_range = _parse_time_range()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if time_range and metrics_collector.store is not None:
+        start, end, tier = time_range
+        tier, data = metrics_collector.query_history(f"server/{name}", start, end, tier)
+        return jsonify({"status": "success", "tier": tier, "data": data})
     limit = request.args.get("limit", 60, type=int)
     return jsonify({"status": "success", "data": metrics_collector.get_server_metrics(name, limit)})
 
 
+@app.route("/api/metrics/query")
+@login_required
+def api_metrics_query():
+    """Agrégations serveur sur l'historique persistant.
+
+    ?servers=a,b (ou "system") &fields=cpu,ram_mb &range=24h (ou start/end)
+    &step=5m &aggs=avg,max,p95,p99,rate
+    """
+    if metrics_collector.store is None:
+        return jsonify({"status": "error", "message": "Historique persistant indisponible"}), 503
+    try:
+        time_range = _parse_time_range() or (time.time() - 3600, time.time(), None)
+        start, end, _ = time_range
+        step_raw = request.args.get("step", "60")
+        unit = _RANGE_UNITS.get(step_raw[-1:].lower())
+        step = float(step_raw[:-1]) * unit if unit else float(step_raw)
+        if step <= 0 or end <= start:
+            raise ValueError("Plage ou pas invalide")
+        aggs = parse_aggs(request.args.get("aggs"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    user = session["user"]["username"]
+    is_admin = session["user"].get("role") == "admin"
+    requested = [s for s in request.args.get("servers", "").split(",") if s]
+    visible = set(srv_mgr.list_servers("admin" if is_admin else user))
+    keys = []
+    for name in requested or sorted(visible):
+        if name == "system":
+            if is_admin:
+                keys.append("system")
+        elif name in visible:
+            keys.append(f"server/{name}")
+    default_fields = "cpu,ram_percent" if keys == ["system"] else "cpu,ram_mb"
+    fields = [f for f in request.args.get("fields", default_fields).split(",") if f]
+
+    try:
+        result = query_metrics(metrics_collector.store, keys, fields, start, end, step, aggs, time.time())
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    result["series"] = {k.split("/", 1)[-1]: v for k, v in result["series"].items()}
+    return jsonify({"status": "success", **result})
+
+
 @app.route("/api/alerts")
 @login_required
 def api_alerts():
@@ -1369,6 +1486,35 @@ def jobs_logs(job_id):
         return jsonify({"status": "error", "message": str(e)})
 
 
+@app.route("/api/jobs/<job_id>/stream")
+@login_required
+def jobs_stream(job_id):
+    """Progression d'un job en temps réel via SSE (jusqu'à sa fin)"""
+    if job_mgr is None:
+        return jsonify({"status": "error", "message": "Job manager non initialisé"}), 500
+    job = job_mgr.get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job introuvable"}), 404
+
+    def generate():
+        last = None
+        while True:
+            payload = json.dumps({
+                "status": job.status,
+                "progress": job.progress,
+                "result": job.result,
+                "logs": job.logs[-5:],
+            }, default=str)
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            if job.finished_at is not None:
+                break
+            time.sleep(1)
+
+    return Response(generate(), mimetype='text/event-stream')
+
+
 @app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
 @login_required
 def jobs_cancel(job_id):
@@ -1528,7 +1674,7 @@ def create():
             return jsonify({"status": "error", "message": "Nom et version requis"}), 400
         
         # Créer le serveur avec toutes les options
-        srv_mgr.create_server(
+        created = srv_mgr.create_server(
             name=name,
             version=version,
             ram_min=ram_min,
@@ -1585,7 +1731,8 @@ def create():
                 except Exception as e:
                     mods_results.append({"project_id": project_id, "success": False, "message": str(e)})
 
-        return jsonify({"status": "success", "mods": mods_results})
+        return jsonify({"status": "success", "mods": mods_results,
+                        "prewarmed": bool(created and created.get("prewarmed"))})
     except Exception as e:
         logger.exception("Erreur critique lors de la création")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -1614,7 +1761,117 @@ def server_action(name, action):
 @app.route("/api/server/<name>/status")
 @login_required
 def status(name):
-    return jsonify(srv_mgr.get_status(name))
+    if hibernation.is_hibernating(name):
+        return jsonify({"status": "hibernating", "running": False, "cpu": 0, "ram": 0, "ram_mb": 0, "pid": None})
+    return jsonify(fleet_stats.get_status(name))
+
+
+@app.route("/api/server/<name>/hibernation", methods=["GET", "POST"])
+@login_required
+def server_hibernation(name):
+    """Configuration de la mise en veille (minutes sans joueur, 0 = désactivée)"""
+    cfg = srv_mgr.get_server_config(name)
+    user = session.get("user", {}).get("username")
+    role = session.get("user", {}).get("role")
+    if role != "admin" and cfg.get("owner") != user:
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+    
+    if request.method == "POST":
+        data = request.json or {}
+        try:
+            minutes = int(data.get("hibernate_after", 0))
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Durée invalide"}), 400
+        if minutes < 0:
+            return jsonify({"status": "error", "message": "Durée invalide"}), 400
+        cfg["hibernate_after"] = minutes
+        srv_mgr.save_server_config(name, cfg)
+    
+    return jsonify({
+        "status": "success",
+        "hibernate_after": hibernation.idle_minutes(name),
+        "hibernating": hibernation.is_hibernating(name),
+    })
+
+
+@app.route("/api/server/<name>/hostnames", methods=["GET", "POST"])
+@login_required
+def server_hostnames(name):
+    """Noms d'hôte routés vers ce serveur par le proxy Minecraft"""
+    cfg = srv_mgr.get_server_config(name)
+    user = session.get("user", {}).get("username")
+    role = session.get("user", {}).get("role")
+    if role != "admin" and cfg.get("owner") != user:
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+    
+    if request.method == "POST":
+        data = request.json or {}
+        hostnames = data.get("hostnames", [])
+        if not isinstance(hostnames, list):
+            return jsonify({"status": "error", "message": "hostnames doit être une liste"}), 400
+        cleaned = []
+        # Table fraîche: un serveur créé depuis la dernière construction compte aussi
+        proxy_router.rebuild()
+        routes = proxy_router.routes()
+        for host in hostnames:
+            host = str(host).strip().rstrip(".").lower()
+            if not re.match(r"^[a-z0-9]([a-z0-9-]*[a-z0-9])?(\.[a-z0-9]([a-z0-9-]*[a-z0-9])?)+$", host):
+                return jsonify({"status": "error", "message": f"Nom d'hôte invalide: {host}"}), 400
+            if proxy_router.is_reserved(host, name):
+                return jsonify({"status": "error",
+                                "message": f"{host}: les noms en .{proxy_router.domain} sont réservés au proxy"}), 400
+            owner = routes.get(host)
+            if owner and owner != name:
+                return jsonify({"status": "error", "message": f"{host} est déjà utilisé"}), 409
+            cleaned.append(host)
+        cfg["hostnames"] = sorted(set(cleaned))
+        srv_mgr.save_server_config(name, cfg)
+        proxy_router.invalidate()
+    
+    return jsonify({
+        "status": "success",
+        "hostnames": cfg.get("hostnames", []),
+        "default": proxy_router.default_hostname(name),
+    })
+
+
+@app.route("/api/proxy")
+@admin_required
+def proxy_status():
+    """Routes et compteurs du proxy Minecraft"""
+    return jsonify({
+        "status": "success",
+        "enabled": mc_proxy is not None,
+        "port": mc_proxy.port if mc_proxy else None,
+        "domain": proxy_router.domain,
+        "routes": proxy_router.routes(),
+        "stats": mc_proxy.stats() if mc_proxy else {},
+    })
+
+
+@app.route("/api/server/<name>/hibernation/<action>", methods=["POST"])
+@login_required
+def server_hibernation_action(name, action):
+    """Met en veille immédiatement ou réveille un serveur"""
+    cfg = srv_mgr.get_server_config(name)
+    user = session.get("user", {}).get("username")
+    role = session.get("user", {}).get("role")
+    if role != "admin" and cfg.get("owner") != user:
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+    try:
+        if action == "sleep":
+            if hibernation.is_hibernating(name) or not srv_mgr.is_running(name):
+                return jsonify({"status": "error", "message": "Serveur non démarré"}), 400
+            hibernation.hibernate(name, fleet_stats.get_status(name))
+        elif action == "wake":
+            if not hibernation.is_hibernating(name):
+                return jsonify({"status": "error", "message": "Serveur non en veille"}), 400
+            hibernation.wake(name)
+        else:
+            return jsonify({"status": "error", "message": "Action inconnue"}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success"})
 
 
 @app.route("/api/server/<name>/logs")
@@ -1656,18 +1913,15 @@ def rcon_command(name):
     if props.get("enable-rcon", "false") != "true":
         return jsonify({"status": "error", "message": "RCON not enabled"}), 400
     
-    port = int(props.get("rcon.port", 25575))
     password = props.get("rcon.password", "")
     
     if not password:
         return jsonify({"status": "error", "message": "RCON password not set"}), 400
     
-    client = RconClient("localhost", port, password)
-    result, error = client.command(cmd)
-    client.close()
-    
-    if error:
-        return jsonify({"status": "error", "message": error}), 500
+    try:
+        result = srv_mgr.send_rcon(name, cmd)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
     
     auth_mgr._log_audit(session["user"]["username"], "RCON", f"{name}: {cmd}")
     return jsonify({"status": "success", "response": result})
@@ -1808,7 +2062,7 @@ def docker_config(name):
 def server_stats(name):
     """Retourne les statistiques détaillées du serveur"""
     try:
-        status = srv_mgr.get_status(name)
+        status = fleet_stats.get_status(name)
         disk_usage = srv_mgr.get_disk_usage(name) or {}
         plugins = plugin_mgr.list_installed(name) or []
         
@@ -1837,8 +2091,13 @@ def server_stats(name):
             "disk_usage": f"{disk_usage.get('used_mb', 0):.1f} MB" if disk_usage else "--",
             "plugin_count": plugin_count,
             "players_online": status.get("players_online", 0),
-            "max_players": status.get("max_players", 20),
+            "max_players": status.get("max_players") or srv_mgr.get_properties_view(name).get("max-players", 20),
+            "motd": status.get("motd"),
+            "latency_ms": status.get("latency_ms"),
             "tps": status.get("tps", "--"),
+            "mspt": status.get("mspt"),
+            "loaded_chunks": status.get("loaded_chunks"),
+            "entities": status.get("entities"),
             "cpu": status.get("cpu", 0),
             "ram_mb": status.get("ram_mb", 0)
         })
@@ -1856,37 +2115,35 @@ def players(name):
 @app.route("/api/server/<name>/online-players")
 @login_required
 def online_players(name):
-    """Récupère la liste des joueurs actuellement en ligne via RCON ou logs"""
+    """Récupère la liste des joueurs actuellement en ligne (ping, RCON ou logs)"""
     try:
-        # Essayer via RCON d'abord
-        if name in srv_mgr.procs:
-            try:
-                from core.rcon import RconClient
-                config = srv_mgr.get_server_config(name) or {}
-                rcon_port = config.get('rcon_port', 25575)
-                rcon_password = config.get('rcon_password', '')
+        # Server List Ping (+ Query si activé): pas de connexion RCON ni lecture de logs
+        try:
+            host, port, query_enabled = srv_mgr.get_ping_target(name)
+            res = ping_server(host, port, timeout=1.5, with_query=query_enabled)
+            if res.get("online") and len(res["sample"]) >= res["players_online"]:
+                return jsonify({"players": res["sample"], "count": res["players_online"],
+                                "max": res["players_max"]})
+        except Exception as e:
+            logger.debug(f"Ping {name} impossible: {e}")
+        
+        # Sinon RCON (liste complète au-delà de l'échantillon du ping)
+        try:
+            response = srv_mgr.send_rcon(name, "list", timeout=3)
+            if response:
+                # Parser la réponse "There are X of Y players online: player1, player2"
+                import re
+                match = re.search(r':\s*(.+)$', response)
+                if match:
+                    player_names = [p.strip() for p in match.group(1).split(',') if p.strip()]
+                    return jsonify({"players": player_names, "count": len(player_names)})
                 
-                if rcon_password:
-                    rcon = RconClient('localhost', rcon_port, rcon_password)
-                    success, msg = rcon.connect()
-                    if success:
-                        response, error = rcon.command('list')
-                        rcon.close()
-                        
-                        if response:
-                            # Parser la réponse "There are X of Y players online: player1, player2"
-                            import re
-                            match = re.search(r':\s*(.+)$', response)
-                            if match:
-                                player_names = [p.strip() for p in match.group(1).split(',') if p.strip()]
-                                return jsonify({"players": player_names, "count": len(player_names)})
-                            
-                            # Alternative: "There are 0 of Y players online"
-                            match = re.search(r'There are (\d+)', response)
-                            if match and int(match.group(1)) == 0:
-                                return jsonify({"players": [], "count": 0})
-            except Exception as e:
-                logger.warning(f"[WARN] RCON indisponible for {name}: {e}")
+                # Alternative: "There are 0 of Y players online"
+                match = re.search(r'There are (\d+)', response)
+                if match and int(match.group(1)) == 0:
+                    return jsonify({"players": [], "count": 0})
+        except Exception as e:
+            logger.warning(f"[WARN] RCON indisponible for {name}: {e}")
         
         # Fallback: analyser les logs récents
         log_file = os.path.join(srv_mgr.base_dir, name, "logs", "latest.log")
@@ -2172,9 +2429,12 @@ def set_server_meta(name):
 @login_required
 def backup_server(name):
     try:
-        result = srv_mgr.backup_server(name)
+        data = request.get_json(silent=True) or {}
+        result = srv_mgr.backup_server(name, format=data.get("format", "zip"), level=data.get("level"))
         auth_mgr._log_audit(session["user"]["username"], "BACKUP_CREATE", name)
         return jsonify({"status": "success", "backup": result, "message": "Sauvegarde créée"})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         logger.error(f"[ERROR] Erreur backup: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -2183,17 +2443,58 @@ def backup_server(name):
 @app.route("/api/server/<name>/backups")
 @login_required
 def list_backups(name):
-    return jsonify(srv_mgr.list_backups(name))
+    try:
+        since, until = _backup_range()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(srv_mgr.list_backups(name, format=request.args.get("format"), since=since, until=until))
+
+
+def _backup_range():
+    """(depuis, jusqu'à) en datetime depuis ?range= / ?start=&end=, ou (None, None)."""
+    time_range = _parse_time_range()
+    if not time_range:
+        return None, None
+    start, end, _ = time_range
+    return datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+
+
+@app.route("/api/server/<name>/backups/<backup_name>/manifest")
+@login_required
+def backup_manifest(name, backup_name):
+    """Contenu d'une sauvegarde, lu dans le catalogue (sans ouvrir l'archive)"""
+    backup = srv_mgr.backup_catalog.get(backup_name)
+    if not backup or backup["server"] != name:
+        return jsonify({"status": "error", "message": "Sauvegarde non trouvée"}), 404
+    files = srv_mgr.backup_catalog.manifest(backup_name, prefix=request.args.get("path"),
+                                            limit=request.args.get("limit", 10000, type=int))
+    return jsonify({"status": "success", "backup": backup, "files": files})
+
+
+@app.route("/api/backups/catalog")
+@admin_required
+def backup_catalog():
+    """Toutes les sauvegardes du parc (filtres server, format, range) et totaux de stockage"""
+    try:
+        since, until = _backup_range()
+        server = request.args.get("server")
+        backups = srv_mgr.backup_catalog.list(server=server, format=request.args.get("format"),
+                                              since=since, until=until)
+        return jsonify({"status": "success", "backups": backups,
+                        "totals": srv_mgr.backup_catalog.totals(server)})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"[ERROR] Erreur catalogue de sauvegardes: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @app.route("/api/server/<name>/backups/<backup_name>", methods=["DELETE"])
 @login_required
 def delete_backup(name, backup_name):
     try:
-        backup_path = os.path.join("servers", "_backups", backup_name)
-        if os.path.exists(backup_path):
-            import shutil
-            shutil.rmtree(backup_path)
+        if srv_mgr.delete_backup(name, backup_name):
+            auth_mgr._log_audit(session["user"]["username"], "BACKUP_DELETE", f"{name}: {backup_name}")
             return jsonify({"status": "success", "message": "Sauvegarde supprimée"})
         return jsonify({"status": "error", "message": "Sauvegarde non trouvée"}), 404
     except Exception as e:
@@ -2201,6 +2502,24 @@ def delete_backup(name, backup_name):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/backups/store", methods=["GET", "POST"])
+@admin_required
+def backup_store_admin():
+    """Statistiques du dépôt dédupliqué; POST lance la collecte des blocs orphelins."""
+    try:
+        store = srv_mgr.backup_store
+        if request.method == "POST":
+            data = request.get_json(silent=True) or {}
+            # full: recalcule les références depuis les manifestes avant la collecte
+            gc = store.rebuild_refs() if data.get("full") else store.gc()
+            auth_mgr._log_audit(session["user"]["username"], "BACKUP_GC", str(gc["removed"]))
+            return jsonify({"status": "success", "gc": gc, "store": store.stats()})
+        return jsonify({"status": "success", "store": store.stats()})
+    except Exception as e:
+        logger.error(f"[ERROR] Erreur dépôt de sauvegardes: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route("/api/java/info")
 @login_required
 def get_java_info():
@@ -2643,14 +2962,10 @@ def optimize_server_flags(name):
 @login_required
 def system_info():
     """Informations système complètes"""
-    import psutil
     import platform
     
     try:
-        cpu_count = psutil.cpu_count()
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage(os.path.abspath("servers"))
+        current = metrics_collector.get_current_system()
         
         return jsonify({
             "status": "success",
@@ -2661,24 +2976,24 @@ def system_info():
                 "hostname": platform.node()
             },
             "cpu": {
-                "count": cpu_count,
-                "percent": cpu_percent
+                "count": current["cpu"]["cores"],
+                "percent": current["cpu"]["percent"]
             },
             "memory": {
-                "total_gb": round(memory.total / (1024**3), 2),
-                "used_gb": round(memory.used / (1024**3), 2),
-                "available_gb": round(memory.available / (1024**3), 2),
-                "percent": memory.percent
+                "total_gb": current["memory"]["total_gb"],
+                "used_gb": current["memory"]["used_gb"],
+                "available_gb": current["memory"]["available_gb"],
+                "percent": current["memory"]["percent"]
             },
             "disk": {
-                "total_gb": round(disk.total / (1024**3), 2),
-                "used_gb": round(disk.used / (1024**3), 2),
-                "free_gb": round(disk.free / (1024**3), 2),
-                "percent": round(disk.used / disk.total * 100, 1)
+                "total_gb": current["disk"]["total_gb"],
+                "used_gb": current["disk"]["used_gb"],
+                "free_gb": current["disk"]["free_gb"],
+                "percent": current["disk"]["percent"]
             },
             "servers": {
                 "total": len(srv_mgr.list_servers()),
-                "running": len(srv_mgr.procs)
+                "running": len(fleet_stats.snapshot())
             }
         })
     except Exception as e:
@@ -2687,11 +3002,22 @@ def system_info():
 @app.route("/api/system/history")
 @login_required
 def system_history():
-    """Historique des métriques système pour les graphiques"""
+    """Historique des métriques système pour les graphiques
+
+    ?range=24h|7d|30d (ou ?start=&end=) lit l'historique persistant avec la
+    résolution adaptée (brut, minute, heure; forçable via ?tier=).
+    """
     try:
+        time_range = _parse_time_range()
+        if time_range and metrics_collector.store is not None:
+            start, end, tier = time_range
+            tier, data = metrics_collector.query_history("system", start, end, tier)
+            return jsonify({"status": "success", "tier": tier, "history": data})
         limit = int(request.args.get("limit", 60)) # Default 60 points (5 mins approx)
         data = metrics_collector.get_system_metrics(limit)
         return jsonify({"status": "success", "history": data})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -2824,12 +3150,13 @@ def get_player_stats(name, player):
 def server_performance(name):
     """Métriques de performance détaillées"""
     try:
-        status = srv_mgr.get_status(name)
-        metrics = metrics_collector.get_server_metrics(name, 30)
+        status = fleet_stats.get_status(name)
+        metrics = metrics_collector.get_server_metrics(name, 10)
         
-        # Calculer les moyennes
-        avg_cpu = sum(m.get("cpu", 0) for m in metrics) / len(metrics) if metrics else 0
-        avg_ram = sum(m.get("ram_mb", 0) for m in metrics) / len(metrics) if metrics else 0
+        # Calculer les moyennes (vectorisées sur l'historique colonnaire)
+        summary = metrics_collector.summarize_server(name, ("cpu", "ram_mb"), 30, ("mean",))
+        avg_cpu = summary["cpu"]["mean"] or 0
+        avg_ram = summary["ram_mb"]["mean"] or 0
         
         return jsonify({
             "status": "success",
@@ -2837,13 +3164,14 @@ def server_performance(name):
                 "cpu": status.get("cpu", 0),
                 "ram_mb": status.get("ram_mb", 0),
                 "tps": status.get("tps", 20),
+                "mspt": status.get("mspt"),
                 "players": status.get("players_online", 0)
             },
             "average": {
                 "cpu": round(avg_cpu, 1),
                 "ram_mb": round(avg_ram, 0)
             },
-            "history": metrics[-10:] if metrics else []
+            "history": metrics
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -2905,32 +3233,14 @@ def search_logs(name):
 @app.route("/api/server/<name>/clone", methods=["POST"])
 @admin_required
 def clone_server(name):
-    """Clone un serveur existant"""
-    import shutil
+    """Clone un serveur existant (copy-on-write: reflinks / liens physiques)"""
     data = request.json or {}
     new_name = data.get("new_name", f"{name}_clone")
     
     try:
-        src = os.path.join(srv_mgr.base_dir, name)
-        dst = os.path.join(srv_mgr.base_dir, new_name)
-        
-        if not os.path.exists(src):
-            return jsonify({"status": "error", "message": "Serveur source non trouvé"}), 404
-        if os.path.exists(dst):
-            return jsonify({"status": "error", "message": "Un serveur avec ce nom existe déjà"}), 400
-        
-        shutil.copytree(src, dst)
-        
-        # Modifier le port pour éviter les conflits
-        props_path = os.path.join(dst, "server.properties")
-        if os.path.exists(props_path):
-            props = srv_mgr.get_properties(new_name)
-            old_port = int(props.get("server-port", 25565))
-            props["server-port"] = str(old_port + 1)
-            srv_mgr.save_properties(new_name, props)
-        
+        result = srv_mgr.clone_server(name, new_name, owner=data.get("owner"))
         auth_mgr._log_audit(session["user"]["username"], "SERVER_CLONE", f"{name} -> {new_name}")
-        return jsonify({"status": "success", "message": f"Serveur cloné: {new_name}"})
+        return jsonify({"status": "success", "message": f"Serveur cloné: {new_name}", "clone": result})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -3004,13 +3314,14 @@ def global_stats():
     """Statistiques globales de tous les serveurs"""
     try:
         servers = srv_mgr.list_servers()
+        snapshot = fleet_stats.snapshot()
         total_players = 0
         total_ram = 0
         running_count = 0
         
-        for srv in servers:
-            status = srv_mgr.get_status(srv["name"])
-            if status.get("status") == "online":
+        for name in servers:
+            status = snapshot.get(name)
+            if status and status.get("status") == "online":
                 running_count += 1
                 total_players += status.get("players_online", 0)
                 total_ram += status.get("ram_mb", 0)
@@ -3037,16 +3348,48 @@ def broadcast_message():
     if not message:
         return jsonify({"status": "error", "message": "Message requis"}), 400
     
-    sent_to = []
-    for name, proc in srv_mgr.procs.items():
-        try:
-            srv_mgr.send_command(name, f"say [Broadcast] {message}")
-            sent_to.append(name)
-        except:
-            pass
+    targets = select_servers(srv_mgr)
+    result = fanout(srv_mgr, targets, f"say [Broadcast] {message}")
+    sent_to = sorted(n for n, r in result["results"].items() if r["status"] == "ok")
     
     auth_mgr._log_audit(session["user"]["username"], "BROADCAST", message[:50])
-    return jsonify({"status": "success", "sent_to": sent_to})
+    return jsonify({"status": "success", "sent_to": sent_to, **result})
+
+
+@app.route("/api/fanout", methods=["POST"])
+@admin_required
+def fanout_command():
+    """Exécute une commande (ou un script) sur une sélection de serveurs en parallèle"""
+    data = request.json or {}
+    commands = data.get("commands") or data.get("command")
+    if isinstance(commands, str):
+        commands = [line for line in commands.splitlines() if line.strip()]
+    if not commands:
+        return jsonify({"status": "error", "message": "Commande requise"}), 400
+    if len(commands) > 20:
+        return jsonify({"status": "error", "message": "Script trop long (20 commandes max)"}), 400
+    
+    try:
+        concurrency = max(1, min(int(data.get("concurrency", 64)), 256))
+        deadline = max(1.0, min(float(data.get("deadline", 15)), 120.0))
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Paramètres invalides"}), 400
+    
+    targets = select_servers(
+        srv_mgr,
+        owner=data.get("owner"),
+        tag=data.get("tag"),
+        server_type=data.get("type"),
+        names=data.get("servers"),
+        only_running=data.get("only_running", True),
+    )
+    if not targets:
+        return jsonify({"status": "error", "message": "Aucun serveur ne correspond à la sélection"}), 404
+    
+    result = fanout(srv_mgr, targets, commands, concurrency=concurrency, deadline=deadline)
+    auth_mgr._log_audit(session["user"]["username"], "FANOUT",
+                        f"{len(targets)} serveurs: {commands[0][:50]}")
+    return jsonify({"status": "success", **result})
 
 
 # Amélioration 10: Liste des ports utilisés
@@ -3202,12 +3545,11 @@ def dashboard():
     """Données du tableau de bord"""
     try:
         servers = srv_mgr.list_servers()
-        running = len(srv_mgr.procs)
+        snapshot = fleet_stats.snapshot()
+        running = sum(1 for name in servers if name in snapshot)
         
-        # Métriques système
-        import psutil
-        cpu = psutil.cpu_percent()
-        mem = psutil.virtual_memory()
+        # Métriques système (dernier échantillon du collecteur)
+        current = metrics_collector.get_current_system()
         
         # Alertes récentes
         alerts = list(server_monitor.alerts)[:5] if hasattr(server_monitor, 'alerts') else []
@@ -3220,9 +3562,9 @@ def dashboard():
                 "stopped": len(servers) - running
             },
             "system": {
-                "cpu_percent": cpu,
-                "ram_percent": mem.percent,
-                "ram_used_gb": round(mem.used / (1024**3), 2)
+                "cpu_percent": current["cpu"]["percent"],
+                "ram_percent": current["memory"]["percent"],
+                "ram_used_gb": current["memory"]["used_gb"]
             },
             "alerts": alerts
         })
@@ -3242,16 +3584,16 @@ def batch_action():
     if not action or not server_names:
         return jsonify({"status": "error", "message": "Action et serveurs requis"}), 400
     
-    results = {}
-    for name in server_names:
-        try:
-            srv_mgr.action(name, action)
-            results[name] = "success"
-        except Exception as e:
-            results[name] = str(e)
+    try:
+        concurrency = int(data["concurrency"]) if data.get("concurrency") else None
+        wave_size = int(data["wave_size"]) if data.get("wave_size") else None
+        job = lifecycle.submit(action, server_names, concurrency=concurrency, wave_size=wave_size,
+                               wait_healthy=data.get("wait_healthy"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     
     auth_mgr._log_audit(session["user"]["username"], f"BATCH_{action.upper()}", ", ".join(server_names))
-    return jsonify({"status": "success", "results": results})
+    return jsonify({"status": "success", "job_id": job.id})
 
 
 # Amélioration 19: Planification d'arrêt
@@ -3661,19 +4003,9 @@ def search_modrinth():
 def detailed_backups(name):
     """Liste des backups avec plus de détails"""
     try:
-        backups = srv_mgr.list_backups(name)
-        detailed = []
-        
-        for backup in backups:
-            backup_path = os.path.join(srv_mgr.base_dir, name, "backups", backup.get("filename", ""))
-            if os.path.exists(backup_path):
-                size = os.path.getsize(backup_path)
-                detailed.append({
-                    **backup,
-                    "size_mb": round(size / (1024**2), 2)
-                })
-        
-        return jsonify({"status": "success", "backups": detailed})
+        # Catalogue: format, codec, parent, checksum et nombre de fichiers déjà indexés
+        return jsonify({"status": "success", "backups": srv_mgr.list_backups(name),
+                        "totals": srv_mgr.backup_catalog.totals(name)})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -3685,27 +4017,16 @@ def restore_backup(name, backup_name):
     """Restaure un backup"""
     try:
         # Vérifier que le serveur est arrêté
-        if name in srv_mgr.procs:
+        if srv_mgr.is_running(name):
             return jsonify({"status": "error", "message": "Arrêtez le serveur avant la restauration"}), 400
         
-        backup_path = os.path.join(srv_mgr.base_dir, name, "backups", backup_name)
-        if not os.path.exists(backup_path):
+        if not any(b["name"] == backup_name for b in srv_mgr.list_backups(name)):
             return jsonify({"status": "error", "message": "Backup non trouvé"}), 404
         
-        import zipfile
-        import shutil
-        
-        # Sauvegarder le monde actuel
-        world_path = os.path.join(srv_mgr.base_dir, name, "world")
-        if os.path.exists(world_path):
-            shutil.rmtree(world_path)
-        
-        # Extraire le backup
-        with zipfile.ZipFile(backup_path, 'r') as zip_ref:
-            zip_ref.extractall(os.path.join(srv_mgr.base_dir, name))
+        result = srv_mgr.restore_backup(name, backup_name)
         
         auth_mgr._log_audit(session["user"]["username"], "BACKUP_RESTORE", f"{name}: {backup_name}")
-        return jsonify({"status": "success", "message": "Backup restauré"})
+        return jsonify({"status": "success", "message": "Backup restauré", "restore": result})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -3716,9 +4037,7 @@ def restore_backup(name, backup_name):
 def delete_backup_v2(name, backup_name):
     """Supprime un backup (version alternative)"""
     try:
-        backup_path = os.path.join(srv_mgr.base_dir, name, "backups", backup_name)
-        if os.path.exists(backup_path):
-            os.remove(backup_path)
+        if srv_mgr.delete_backup(name, backup_name):
             auth_mgr._log_audit(session["user"]["username"], "BACKUP_DELETE", f"{name}: {backup_name}")
             return jsonify({"status": "success", "message": "Backup supprimé"})
         return jsonify({"status": "error", "message": "Backup non trouvé"}), 404
@@ -4118,9 +4437,10 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("[INFO] Arrêt en cours...")
         try:
-            for name in list(srv_mgr.procs.keys()):
-                logger.info(f"[INFO] Arrêt du serveur: {name}")
-                srv_mgr.stop(name)
+            running = list(srv_mgr.procs.keys())
+            if running:
+                logger.info(f"[INFO] Arrêt des serveurs: {', '.join(running)}")
+                lifecycle.run("stop", running, concurrency=len(running))
             metrics_collector.stop()
             server_monitor.stop()
         except Exception: 
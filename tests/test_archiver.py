@@ -0,0 +1,68 @@
+"""Archives .mcpa: aller-retour, contrôle d'intégrité et niveau de compression."""
+import os
+
+import pytest
+
+from core.archiver import MAX_LEVEL, Archiver, parse_level
+
+
+@pytest.fixture
+def archive(tmp_path):
+    src = tmp_path / "survie"
+    files = {
+        "server.properties": b"motd=Survie\n" * 200,
+        "world/region/r.0.0.mca": os.urandom(50_000),
+        "plugins/config.yml": b"",
+    }
+    for rel, data in files.items():
+        path = src / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    dest = str(tmp_path / "survie.mcpa")
+    Archiver(level=3, workers=2, block_size=16_384).write(
+        [(str(src / rel), rel) for rel in files], dest)
+    return dest, files
+
+
+def test_roundtrip_restores_contents(archive, tmp_path):
+    path, files = archive
+    out = tmp_path / "out"
+    stats = Archiver().extract(path, str(out))
+    assert stats["files"] == len(files)
+    for rel, data in files.items():
+        assert (out / rel).read_bytes() == data
+    assert sorted(rel for rel, _, _ in Archiver.entries(path)) == sorted(files)
+
+
+def test_corrupted_block_fails_crc(archive, tmp_path):
+    path, _ = archive
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        # Premier bloc de la région (stockée telle quelle): un octet inversé
+        offset = data.index(b"world/region/r.0.0.mca") + 200
+        data[offset] ^= 0xFF
+        f.seek(0)
+        f.write(data)
+    with pytest.raises(Exception, match="CRC invalide pour world/region/r.0.0.mca"):
+        Archiver().extract(path, str(tmp_path / "out"))
+
+
+def test_truncated_archive_is_reported(archive, tmp_path):
+    path, _ = archive
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 100)
+    with pytest.raises(Exception, match="tronquée"):
+        Archiver().extract(path, str(tmp_path / "out"))
+    with pytest.raises(Exception, match="tronquée"):
+        Archiver.entries(path)
+
+
+@pytest.mark.parametrize("raw, expected", [(None, None), ("", None), ("1", 1), (7, 7), (str(MAX_LEVEL), MAX_LEVEL)])
+def test_parse_level_accepts_valid_levels(raw, expected):
+    assert parse_level(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [0, -3, MAX_LEVEL + 1, "abc", "2.5", True, [3]])
+def test_parse_level_rejects_out_of_range(raw):
+    with pytest.raises(ValueError):
+        parse_level(raw)
@@ -0,0 +1,119 @@
+"""Dépôt dédupliqué: snapshots incrémentaux, rétention et restauration."""
+import os
+
+import pytest
+
+from core.anvil import read_chunk, read_header, write_region
+from core.backup_store import BackupStore
+
+
+def _write(root, rel, data, mtime=None):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _tree(root):
+    out = {}
+    for base, _, files in os.walk(root):
+        for f in files:
+            path = os.path.join(base, f)
+            with open(path, "rb") as fh:
+                out[os.path.relpath(path, root)] = (fh.read(), os.stat(path).st_mtime_ns)
+    return out
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BackupStore(str(tmp_path / "backups"), chunk_size=1024, max_workers=2)
+    yield store
+    store.close()
+
+
+def test_restore_child_after_parent_is_deleted_and_collected(store, tmp_path):
+    server = str(tmp_path / "survie")
+    _write(server, "server.jar", os.urandom(5000), mtime=1_600_000_000)
+    _write(server, "world/level.dat", os.urandom(3000), mtime=1_600_000_000)
+    _write(server, "ops.json", b"[]", mtime=1_600_000_000)
+    first = store.snapshot("survie", server, snapshot_id="survie_1")
+    assert first["parent"] is None
+
+    # Seul level.dat change: le reste est repris du parent sans être relu
+    _write(server, "world/level.dat", os.urandom(3000), mtime=1_600_000_100)
+    os.remove(os.path.join(server, "ops.json"))
+    second = store.snapshot("survie", server, snapshot_id="survie_2")
+    assert second["parent"] == "survie_1"
+    assert second["changed_files"] == 1
+    assert second["new_bytes"] > 0
+
+    expected = _tree(server)
+    assert store.delete("survie_1")
+    collected = store.gc()
+    # Blocs de l'ancien level.dat et de ops.json, plus cités par aucun snapshot
+    assert collected["removed"] == 4
+
+    dest = str(tmp_path / "restored")
+    _write(dest, "stale.txt", b"absent du snapshot")
+    result = store.restore("survie_2", dest)
+    assert result["written"] == 2 and result["removed"] == 1
+    assert _tree(dest) == expected
+    assert store.rebuild_refs()["removed"] == 0
+
+
+def _chunk(payload):
+    """Chunk Anvil: longueur (compression incluse), type 2 (zlib) puis données."""
+    return (len(payload) + 1).to_bytes(4, "big") + b"\x02" + payload
+
+
+def _region_chunks(path):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        locations, timestamps = read_header(f)
+        return {i: (timestamps[i], read_chunk(f, loc, size)) for i, loc in enumerate(locations) if loc}
+
+
+def test_chunked_restore_rebuilds_identical_regions(store, tmp_path):
+    server = str(tmp_path / "survie")
+    region = os.path.join(server, "world", "region", "r.0.0.mca")
+    os.makedirs(os.path.dirname(region))
+    chunks = {i: (1_700_000_000 + i, _chunk(os.urandom(500 + 3000 * (i % 3)))) for i in (0, 1, 31, 500, 1023)}
+    write_region(region, [(i, ts, data) for i, (ts, data) in chunks.items()])
+    os.utime(region, (1_600_000_000, 1_600_000_000))
+    store.snapshot("survie", server, snapshot_id="survie_1", split_regions=True)
+
+    # Le serveur réécrit un seul chunk: seul celui-ci est relu et stocké
+    chunks[31] = (1_700_100_000, _chunk(os.urandom(700)))
+    write_region(region, [(i, ts, data) for i, (ts, data) in chunks.items()])
+    os.utime(region, (1_600_000_100, 1_600_000_100))
+    second = store.snapshot("survie", server, snapshot_id="survie_2", split_regions=True)
+    assert second["new_bytes"] < 2000
+    entry = store.load_manifest("survie_2")["files"][os.path.join("world", "region", "r.0.0.mca")]
+    assert [c[0] for c in entry["region"]] == sorted(chunks)
+
+    store.delete("survie_1")
+    store.gc()
+    dest = str(tmp_path / "restored")
+    store.restore("survie_2", dest)
+    restored = os.path.join(dest, "world", "region", "r.0.0.mca")
+    assert _region_chunks(restored) == chunks
+    with open(region, "rb") as a, open(restored, "rb") as b:
+        assert a.read() == b.read()
+    assert os.stat(restored).st_mtime_ns == os.stat(region).st_mtime_ns
+
+
+def test_prune_keeps_what_a_frozen_copy_never_contains(store, tmp_path):
+    server = str(tmp_path / "survie")
+    _write(server, "world/level.dat", b"level")
+    store.snapshot("survie", server, snapshot_id="survie_1")
+
+    for rel in ("logs/latest.log", "crash-reports/crash-1.txt", "debug/profile.txt",
+                "world/session.lock", "world/region/r.9.9.mca"):
+        _write(server, rel, b"x")
+    result = store.restore("survie_1", server)
+    assert result["removed"] == 1
+    assert not os.path.exists(os.path.join(server, "world/region/r.9.9.mca"))
+    for rel in ("logs/latest.log", "crash-reports/crash-1.txt", "debug/profile.txt", "world/session.lock"):
+        assert os.path.exists(os.path.join(server, rel)), rel
@@ -0,0 +1,69 @@
+"""Clonage copy-on-write: une écriture dans le clone ne touche jamais la source."""
+import os
+
+import pytest
+
+from core.clone import COW_MARKER, CloneEngine, copy_up
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def source(tmp_path):
+    src = tmp_path / "source"
+    for rel, data in {
+        "data/plugins/EssentialsX.jar": b"plugin v1",
+        "data/mods/sodium.jar": b"mod v1",
+        "data/libraries/com/lib.jar": b"library",
+        "data/server.jar": b"server",
+        "data/world/region/r.0.0.mca": b"region v1",
+        "data/logs/latest.log": b"log",
+        "data/world/session.lock": b"lock",
+    }.items():
+        _write(str(src / rel), data)
+    return str(src)
+
+
+def test_clone_shares_only_immutable_files(source, tmp_path):
+    dst = str(tmp_path / "clone")
+    stats = CloneEngine(use_reflink=False).clone_tree(source, dst)
+
+    def shared(rel):
+        return os.stat(os.path.join(dst, rel)).st_ino == os.stat(os.path.join(source, rel)).st_ino
+
+    assert shared("data/libraries/com/lib.jar")
+    assert shared("data/server.jar")
+    assert shared("data/world/region/r.0.0.mca")
+    assert not shared("data/plugins/EssentialsX.jar")
+    assert not shared("data/mods/sodium.jar")
+    assert not os.path.exists(os.path.join(dst, "data/logs"))
+    assert not os.path.exists(os.path.join(dst, "data/world/session.lock"))
+    assert os.path.exists(os.path.join(dst, COW_MARKER))
+    assert stats["hardlinked"] == 3 and stats["copied"] == 2
+
+
+def test_writes_into_clone_leave_source_unchanged(source, tmp_path):
+    dst = str(tmp_path / "clone")
+    CloneEngine(use_reflink=False).clone_tree(source, dst)
+
+    # Ré-upload d'un plugin / mod: écriture sur place ("wb") comme les routes d'upload
+    _write(os.path.join(dst, "data/plugins/EssentialsX.jar"), b"plugin v2")
+    _write(os.path.join(dst, "data/mods/sodium.jar"), b"mod v2")
+    # Démarrage du clone: copy-up des régions puis réécriture sur place par le serveur
+    assert copy_up(dst) == 1
+    with open(os.path.join(dst, "data/world/region/r.0.0.mca"), "r+b") as f:
+        f.write(b"REGION")
+
+    assert _read(os.path.join(source, "data/plugins/EssentialsX.jar")) == b"plugin v1"
+    assert _read(os.path.join(source, "data/mods/sodium.jar")) == b"mod v1"
+    assert _read(os.path.join(source, "data/world/region/r.0.0.mca")) == b"region v1"
+    assert not os.path.exists(os.path.join(dst, COW_MARKER))
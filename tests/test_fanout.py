@@ -0,0 +1,52 @@
+"""Fan-out de commandes: repli console quand la cible RCON est injoignable."""
+import socket
+
+from core.fanout import fanout
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeServerManager:
+    def __init__(self, target):
+        self.target = target
+        self.failures = {}
+        self.console = []
+
+    def get_rcon_target(self, name):
+        return self.target
+
+    def rcon_recently_failed(self, name, target):
+        return self.failures.get(name) == target
+
+    def note_rcon_result(self, name, target, ok):
+        if ok:
+            self.failures.pop(name, None)
+        else:
+            self.failures[name] = target
+
+    def send_command(self, name, cmd):
+        self.console.append((name, cmd))
+        return f"console:{cmd}"
+
+
+def test_unreachable_rcon_falls_back_to_console_and_is_remembered():
+    target = ("127.0.0.1", _closed_port(), "secret")
+    srv_mgr = FakeServerManager(target)
+
+    first = fanout(srv_mgr, ["survie"], ["say a", "say b"], deadline=5)["results"]["survie"]
+    assert first["status"] == "ok"
+    assert first["via"] == "console"
+    assert first["responses"] == ["console:say a", "console:say b"]
+    assert srv_mgr.failures == {"survie": target}
+
+    # Échec mémorisé: pas de nouvelle tentative de connexion
+    srv_mgr.target = ("203.0.113.1", 25575, "secret")
+    srv_mgr.failures["survie"] = srv_mgr.target
+    second = fanout(srv_mgr, ["survie"], "list", deadline=5)["results"]["survie"]
+    assert second["via"] == "console"
+    assert second["latency_ms"] < 1000
+    assert srv_mgr.console[-1] == ("survie", "list")
@@ -0,0 +1,85 @@
+"""Mise en veille: reprise du port et réveil unique sur connexions répétées."""
+import socket
+import threading
+
+import pytest
+
+from core import hibernation
+from core.hibernation import HibernationManager
+
+
+class FakeServerManager:
+    def __init__(self, tmp_path, port):
+        self.port = port
+        self.path = str(tmp_path)
+        self.started = []
+        self.stopped = []
+        self.start_gate = threading.Event()
+        self.webhook_mgr = type("Webhooks", (), {"dispatch": lambda *a, **k: None})()
+
+    def get_ping_target(self, name):
+        return "127.0.0.1", self.port, False
+
+    def _get_server_path(self, name):
+        return self.path
+
+    def _wait_port_free(self, name, timeout=5.0):
+        pass
+
+    def stop(self, name):
+        self.stopped.append(name)
+
+    def start(self, name):
+        self.started.append(name)
+        self.start_gate.wait(5)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    srv_mgr = FakeServerManager(tmp_path, _free_port())
+    mgr = HibernationManager(srv_mgr, fleet_stats=None, data_dir=str(tmp_path))
+    yield mgr
+    for name in mgr.hibernating():
+        mgr.release(name)
+
+
+def test_repeated_wake_starts_the_server_once(manager):
+    srv_mgr = manager.srv_mgr
+    manager.hibernate("survie")
+    assert manager.is_hibernating("survie")
+
+    for _ in range(5):
+        manager.wake("survie")
+    srv_mgr.start_gate.set()
+    for thread in [t for t in threading.enumerate() if t.name == "wake-survie"]:
+        thread.join(5)
+    assert srv_mgr.started == ["survie"]
+
+    # Démarrage terminé (sans release ici): un nouveau réveil est de nouveau possible
+    srv_mgr.start_gate.clear()
+    manager.wake("survie")
+    srv_mgr.start_gate.set()
+    for thread in [t for t in threading.enumerate() if t.name == "wake-survie"]:
+        thread.join(5)
+    assert srv_mgr.started == ["survie", "survie"]
+
+
+def test_failed_bind_restarts_the_server(manager, monkeypatch):
+    monkeypatch.setattr(hibernation, "BIND_ATTEMPTS", 2)
+    monkeypatch.setattr(hibernation, "BIND_RETRY_DELAY", 0.01)
+    srv_mgr = manager.srv_mgr
+    srv_mgr.start_gate.set()
+    with socket.socket() as squatter:
+        squatter.bind(("0.0.0.0", srv_mgr.port))
+        squatter.listen(1)
+        with pytest.raises(OSError):
+            manager.hibernate("survie")
+    assert srv_mgr.stopped == ["survie"]
+    assert srv_mgr.started == ["survie"]
+    assert not manager.is_hibernating("survie")
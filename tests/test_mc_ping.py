@@ -0,0 +1,144 @@
+"""Server List Ping et Query contre de faux serveurs locaux."""
+import asyncio
+import json
+import socket
+import struct
+
+import pytest
+
+from core import mc_ping
+from core.mc_ping import (decode_string, decode_varint, encode_string, encode_varint, packet, ping_server,
+                          read_packet)
+
+STATUS = {
+    "version": {"name": "1.21.1", "protocol": 767},
+    "players": {"max": 20, "online": 3, "sample": [{"name": "alice", "id": "0"}, {"name": "bob", "id": "1"}]},
+    "description": {"text": "Salut ", "extra": [{"text": "monde"}]},
+}
+
+
+async def _start_status_server(answer_ping=True):
+    handshakes = []
+
+    async def handle(reader, writer):
+        packet_id, payload = await read_packet(reader)
+        handshakes.append((packet_id, payload))
+        packet_id, _ = await read_packet(reader)
+        assert packet_id == 0x00
+        writer.write(packet(0x00, encode_string(json.dumps(STATUS))))
+        await writer.drain()
+        if answer_ping:
+            packet_id, payload = await read_packet(reader)
+            writer.write(packet(packet_id, payload))
+            await writer.drain()
+        else:
+            await asyncio.sleep(1.5)
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], handshakes
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 25565, 2 ** 31 - 1, -1])
+def test_varint_round_trip(value):
+    assert decode_varint(encode_varint(value)) == (value, len(encode_varint(value)))
+
+
+def test_string_round_trip():
+    assert decode_string(encode_string("é-monde") + b"rest") == ("é-monde", len(encode_string("é-monde")))
+
+
+def test_status_reads_players_motd_and_latency():
+    async def scenario():
+        server, port, handshakes = await _start_status_server()
+        async with server:
+            return await mc_ping.status("127.0.0.1", port, timeout=2.0), port, handshakes
+
+    result, port, handshakes = asyncio.run(scenario())
+    assert result["online"] is True
+    assert result["players_online"] == 3
+    assert result["players_max"] == 20
+    assert result["sample"] == ["alice", "bob"]
+    assert result["motd"] == "Salut monde"
+    assert result["version"] == "1.21.1"
+    assert result["protocol"] == 767
+    assert result["latency_ms"] is not None
+    # Handshake: protocole -1, hôte, port, état suivant 1 (statut)
+    packet_id, payload = handshakes[0]
+    assert packet_id == 0x00
+    protocol, offset = decode_varint(payload)
+    host, offset = decode_string(payload, offset)
+    assert (protocol, host) == (-1, "127.0.0.1")
+    assert struct.unpack(">H", payload[offset:offset + 2])[0] == port
+    assert decode_varint(payload, offset + 2)[0] == 1
+
+
+def test_status_without_pong_has_no_latency():
+    async def scenario():
+        server, port, _ = await _start_status_server(answer_ping=False)
+        async with server:
+            return await mc_ping.status("127.0.0.1", port, timeout=3.0)
+
+    result = asyncio.run(scenario())
+    assert result["players_online"] == 3
+    assert result["latency_ms"] is None
+
+
+class _FakeQueryServer(asyncio.DatagramProtocol):
+    TOKEN = 9513307
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        assert data[:2] == b"\xfe\xfd"
+        kind, session = data[2], data[3:7]
+        if kind == 0x09:
+            self.transport.sendto(b"\x09" + session + str(self.TOKEN).encode() + b"\x00", addr)
+        elif kind == 0x00:
+            assert struct.unpack(">i", data[7:11])[0] == self.TOKEN
+            kv = b"".join(k + b"\x00" + v + b"\x00" for k, v in (
+                (b"hostname", b"Un serveur"), (b"version", b"1.21.1"), (b"map", b"world"),
+                (b"numplayers", b"2"), (b"maxplayers", b"20")))
+            players = b"alice\x00bob\x00\x00"
+            self.transport.sendto(b"\x00" + session + b"splitnum\x00\x80\x00" + kv
+                                  + b"\x00\x01player_\x00\x00" + players, addr)
+
+
+def test_query_lists_all_players():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(_FakeQueryServer, local_addr=("127.0.0.1", 0))
+        try:
+            return await mc_ping.query("127.0.0.1", transport.get_extra_info("sockname")[1], timeout=2.0)
+        finally:
+            transport.close()
+
+    result = asyncio.run(scenario())
+    assert result["players"] == ["alice", "bob"]
+    assert result["players_online"] == 2
+    assert result["players_max"] == 20
+    assert result["motd"] == "Un serveur"
+    assert result["map"] == "world"
+
+
+def test_ping_many_reports_offline_targets():
+    async def scenario():
+        server, port, _ = await _start_status_server()
+        async with server:
+            return await mc_ping.ping_many({"up": ("127.0.0.1", port), "down": ("127.0.0.1", _free_port())},
+                                           timeout=2.0)
+
+    results = asyncio.run(scenario())
+    assert results["up"]["online"] is True
+    assert results["down"] == {"online": False, "error": "ConnectionRefusedError"}
+
+
+def test_ping_server_runs_on_shared_loop():
+    assert ping_server("127.0.0.1", _free_port(), timeout=1.0)["online"] is False
@@ -0,0 +1,216 @@
+"""Proxy Minecraft par nom d'hôte: relais vers de faux backends et déconnexions."""
+import json
+import os
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.docker_events import ContainerState
+from core.mc_ping import decode_string, decode_varint, handshake
+from core.mc_proxy import HAS_SPLICE, UNKNOWN_ROUTE, HostnameRouter, MinecraftProxy, parse_handshake
+
+
+class FakeServerManager:
+    def __init__(self, targets, hostnames=None):
+        self.targets = targets
+        self.hostnames = hostnames or {}
+        self.hibernation = None
+        self.registry = SimpleNamespace(list=lambda: [SimpleNamespace(name=n) for n in targets])
+        self.resolved = []
+
+    def get_server_config_view(self, name):
+        return {"hostnames": self.hostnames.get(name, [])}
+
+    def get_proxy_target(self, name):
+        self.resolved.append(name)
+        return self.targets.get(name)
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+
+class EchoBackend:
+    """Backend TCP qui renvoie tout ce qu'il reçoit puis ferme à la fin du flux."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.address = self.sock.getsockname()
+        self.received = bytearray()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                    self.received += data
+                    conn.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return b"".join(chunks)
+        chunks.append(data)
+
+
+@pytest.fixture
+def backend():
+    server = EchoBackend()
+    yield server
+    server.close()
+
+
+def _start_proxy(router, use_splice):
+    proxy = MinecraftProxy(router, host="127.0.0.1", port=0, connect_timeout=1.0, handshake_timeout=2.0,
+                           use_splice=use_splice)
+    proxy.start()
+    return proxy, proxy._sock.getsockname()[1]
+
+
+def _connect(port, hostname, next_state, payload=b""):
+    client = socket.create_connection(("127.0.0.1", port), timeout=5)
+    client.sendall(handshake(hostname, 25565, next_state=next_state) + payload)
+    client.shutdown(socket.SHUT_WR)
+    return client
+
+
+def test_parse_handshake_strips_forge_marker():
+    body = handshake("Survie.Example.org.\x00FML\x00", 25565, next_state=2)
+    _, offset = decode_varint(body)
+    assert parse_handshake(body[offset:]) == (-1, "survie.example.org", 25565, 2)
+
+
+@pytest.mark.parametrize("use_splice", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not HAS_SPLICE, reason="os.splice indisponible")),
+])
+def test_relay_forwards_handshake_and_payload(backend, use_splice):
+    router = HostnameRouter(FakeServerManager({"survie": backend.address}), domain="mc.test")
+    proxy, port = _start_proxy(router, use_splice)
+    try:
+        payload = os.urandom(600 * 1024)
+        with _connect(port, "survie.mc.test", 2, payload) as client:
+            echoed = _recv_all(client)
+    finally:
+        proxy.stop()
+
+    sent = handshake("survie.mc.test", 25565, next_state=2) + payload
+    assert bytes(backend.received) == sent
+    assert echoed == sent
+    stats = proxy.stats()["survie"]
+    assert stats["connections"] == 1
+    assert stats["active"] == 0
+    assert stats["bytes_in"] == len(sent)  # octets rejoués avec le handshake + relais
+    assert stats["bytes_out"] == len(sent)
+    assert stats["errors"] == 0
+
+
+def test_declared_hostname_routes_to_server(backend):
+    router = HostnameRouter(FakeServerManager({"lobby": backend.address}, {"lobby": ["play.example.org"]}))
+    proxy, port = _start_proxy(router, use_splice=False)
+    try:
+        with _connect(port, "PLAY.example.org", 1, b"ping") as client:
+            assert _recv_all(client).endswith(b"ping")
+    finally:
+        proxy.stop()
+
+
+def _disconnect_text(data):
+    length, offset = decode_varint(data)
+    packet_id, offset = decode_varint(data, offset)
+    assert packet_id == 0x00
+    return json.loads(decode_string(data, offset)[0])["text"]
+
+
+def test_unknown_host_gets_login_disconnect():
+    router = HostnameRouter(FakeServerManager({}), domain="mc.test")
+    proxy, port = _start_proxy(router, use_splice=False)
+    try:
+        with _connect(port, "inconnu.mc.test", 2) as client:
+            data = _recv_all(client)
+        with _connect(port, "inconnu.mc.test", 1) as client:
+            status_data = _recv_all(client)
+    finally:
+        proxy.stop()
+
+    assert _disconnect_text(data) == "Serveur inconnu: inconnu.mc.test"
+    # État statut (liste des serveurs): pas de paquet de login, simple fermeture
+    assert status_data == b""
+    assert proxy.stats()[UNKNOWN_ROUTE]["connections"] == 2
+
+
+def test_unreachable_backend_disconnects_and_forgets_target():
+    srv_mgr = FakeServerManager({"survie": ("127.0.0.1", _closed_port())})
+    router = HostnameRouter(srv_mgr, domain="mc.test")
+    proxy, port = _start_proxy(router, use_splice=False)
+    try:
+        with _connect(port, "survie.mc.test", 2) as client:
+            data = _recv_all(client)
+        with _connect(port, "survie.mc.test", 2) as client:
+            _recv_all(client)
+    finally:
+        proxy.stop()
+
+    assert _disconnect_text(data) == "survie injoignable"
+    assert proxy.stats()["survie"]["errors"] == 2
+    assert srv_mgr.resolved == ["survie", "survie"]
+
+
+def test_container_restart_invalidates_cached_target(backend):
+    srv_mgr = FakeServerManager({"survie": backend.address})
+    router = HostnameRouter(srv_mgr, domain="mc.test")
+    watcher = FakeWatcher()
+    router.watch(watcher)
+
+    assert router.resolve("survie") == backend.address
+    assert router.resolve("survie") == backend.address
+    assert srv_mgr.resolved == ["survie"]
+
+    for callback in watcher.subscribers:
+        callback(ContainerState(name="mc-survie", server="survie"), "health_status: healthy")
+    router.resolve("survie")
+    assert srv_mgr.resolved == ["survie"]
+
+    for callback in watcher.subscribers:
+        callback(ContainerState(name="mc-survie", server="survie"), "restart")
+    router.resolve("survie")
+    assert srv_mgr.resolved == ["survie", "survie"]
+
+
+def test_declared_hostname_cannot_take_another_servers_default():
+    srv_mgr = FakeServerManager({"lobby": None, "survie": None},
+                                {"lobby": ["survie.mc.test", "lobby.mc.test", "play.example.org"]})
+    router = HostnameRouter(srv_mgr, domain="mc.test")
+    assert router.is_reserved("survie.mc.test", "lobby")
+    assert router.is_reserved("autre.mc.test", "lobby")
+    assert not router.is_reserved("lobby.mc.test", "lobby")
+    assert not router.is_reserved("play.example.org", "lobby")
+    assert router.routes() == {"lobby.mc.test": "lobby", "survie.mc.test": "survie",
+                               "play.example.org": "lobby"}
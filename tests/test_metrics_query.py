@@ -0,0 +1,34 @@
+"""Requêtes /api/metrics/query: agrégations sur les niveaux agrégés du stockage."""
+import pytest
+
+from core import metrics_query
+from core.tsdb import TimeSeriesStore
+
+FIELDS = ("cpu", "tps")
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def numpy_mode(request, monkeypatch):
+    if request.param and not metrics_query.HAS_NUMPY:
+        pytest.skip("NumPy indisponible")
+    monkeypatch.setattr(metrics_query, "HAS_NUMPY", request.param)
+
+
+def test_rollup_tier_weights_fields_by_their_own_samples(tmp_path, numpy_mode):
+    store = TimeSeriesStore(str(tmp_path))
+    # 120 échantillons sur 2 minutes, tps présent dans 70 seulement
+    for i in range(120):
+        tps = 20.0 if i < 60 else (0.0 if i < 70 else None)
+        store.append("server/survie", T0 + i, {"cpu": 1.0, "tps": tps}, FIELDS)
+    store.append("server/survie", T0 + 600, {"cpu": 1.0}, FIELDS)  # clôt la seconde minute
+
+    # Plage plus ancienne que la rétention du brut: lecture sur le niveau 1m
+    result = metrics_query.query(store, ["server/survie"], FIELDS, T0, T0 + 120, 120,
+                                 ["avg", "count", "sum", "min", "max"], now=T0 + 3 * 86400)
+    assert result["tier"] == "1m"
+    tps = result["series"]["server/survie"]["tps"]
+    assert tps == {"avg": [17.1429], "count": [70.0], "sum": [1200.0], "min": [0.0], "max": [20.0]}
+    cpu = result["series"]["server/survie"]["cpu"]
+    assert (cpu["avg"], cpu["count"]) == ([1.0], [120.0])
+    store.close()
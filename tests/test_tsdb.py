@@ -0,0 +1,42 @@
+"""Séries persistantes: agrégats minute/heure pondérés par champ."""
+import math
+
+from core.tsdb import TimeSeriesStore
+
+FIELDS = ("cpu", "tps")
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+def _fill(store, minutes, tps_minutes):
+    """Un point toutes les 2 s; tps n'est renseigné que pendant *tps_minutes*."""
+    for m in range(minutes):
+        for k in range(30):
+            tps = (20.0 if m % 2 else 10.0) if m < tps_minutes else None
+            store.append("server/survie", T0 + m * 60 + k * 2, {"cpu": 1.0, "tps": tps}, FIELDS)
+
+
+def _close_buckets(store):
+    """Points tardifs: clôturent les seaux minute puis heure en cours."""
+    for h in (3, 5):
+        store.append("server/survie", T0 + h * 3600, {"cpu": 1.0}, FIELDS)
+
+
+def test_hour_rollup_weights_each_field_by_its_own_samples(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    _fill(store, 120, 70)
+    # Seconde heure: tps présent 10 minutes sur 60, plus un dernier point isolé
+    store.append("server/survie", T0 + 2 * 3600 - 1, {"cpu": 1.0, "tps": 20.0}, FIELDS)
+    _close_buckets(store)
+
+    minute = store.query("server/survie", T0, T0 + 7199, "1m")
+    assert minute["tps_count"][0] == 30
+    assert minute["tps_count"][70] == 0
+    assert math.isnan(minute["tps"][70])
+
+    hour = store.query("server/survie", T0, T0 + 7199, "1h")
+    assert hour["count"] == [1800, 1801]
+    assert hour["cpu_count"] == [1800, 1801]
+    assert hour["tps_count"] == [1800, 301]
+    assert hour["tps"][1] == (150 * 10 + 150 * 20 + 20) / 301
+    assert (hour["tps_min"][1], hour["tps_max"][1]) == (10.0, 20.0)
+    store.close()
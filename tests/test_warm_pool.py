@@ -0,0 +1,49 @@
+"""Pool pré-chauffé: une réclamation ratée ne perd pas le dossier prêt."""
+import errno
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from core import warm_pool
+from core.warm_pool import WARM_DIR, WARM_STATE_FILE, WarmPool
+
+
+def _ready_entry(base_dir, warm_id="abcd1234"):
+    path = os.path.join(base_dir, WARM_DIR, f"paper-1.21.1-{warm_id}")
+    os.makedirs(os.path.join(path, "data"))
+    with open(os.path.join(path, WARM_STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"id": warm_id, "server_type": "paper", "version": "1.21.1", "state": "ready"}, f)
+    return path
+
+
+@pytest.fixture
+def pool(tmp_path):
+    base_dir = str(tmp_path / "servers")
+    path = _ready_entry(base_dir)
+    return WarmPool(SimpleNamespace(base_dir=base_dir), data_dir=str(tmp_path / "data")), path
+
+
+def test_claim_moves_the_ready_folder(pool, tmp_path):
+    pool, path = pool
+    dest = str(tmp_path / "servers" / "survie")
+    assert pool.claim("Paper", "1.21.1", dest)
+    assert os.path.isdir(os.path.join(dest, "data"))
+    assert not os.path.exists(os.path.join(dest, WARM_STATE_FILE))
+    assert not os.path.exists(path)
+    assert pool.status()["entries"] == []
+
+
+def test_failed_rename_keeps_the_entry_in_the_pool(pool, tmp_path, monkeypatch):
+    pool, path = pool
+
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(warm_pool.os, "rename", cross_device)
+    assert not pool.claim("paper", "1.21.1", str(tmp_path / "servers" / "survie"))
+    assert os.path.isdir(path)
+    assert [e["id"] for e in pool.status()["entries"]] == ["abcd1234"]